@@ -25,6 +25,11 @@ from alembic import context
 from backend.app.models.message import Message
 from backend.app.models.user import User
 from backend.app.models.summary import Summary
+from backend.app.models.slack_directory import SlackDirectoryEntry, SlackDirectorySnapshot
+from backend.app.models.slack_message import SlackChannelWatermark, SlackMessage, SlackThreadState
+from backend.app.models.summary_job import SummaryJob
+from backend.app.models.llm_summary_cache import LLMSummaryCacheEntry
+from backend.app.models.thread_summary import SlackThreadSummary
 
 from sqlmodel import create_engine
 
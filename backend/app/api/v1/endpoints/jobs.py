@@ -0,0 +1,9 @@
+from fastapi import APIRouter, Depends
+from backend.app.jobs.queue import summary_job_queue
+from backend.security.authorization import require_authenticated_session
+
+router = APIRouter(dependencies=[Depends(require_authenticated_session)])
+
+@router.get("/summary/stats")
+def get_summary_job_stats():
+  return summary_job_queue.stats()
@@ -0,0 +1,16 @@
+from fastapi import APIRouter, HTTPException, Depends
+from sqlmodel import Session
+from backend.app.dependencies.database import get_sync_db
+from backend.app.models.summary import Summary
+from backend.app.summarizer.digests import DigestStore
+from backend.security.authorization import require_authenticated_session
+
+# digests hold the content of private conversations, so only logged-in sessions may read them
+router = APIRouter(dependencies=[Depends(require_authenticated_session)])
+
+@router.get("/slack/{slack_user_id}/latest", response_model=Summary)
+def get_latest_summary(slack_user_id: str, session: Session = Depends(get_sync_db)):
+  summary = DigestStore(session).latest(slack_user_id)
+  if not summary:
+    raise HTTPException(status_code=404, detail="Summary not found")
+  return summary
@@ -6,7 +6,8 @@ from backend.app.core.config import get_settings
 parser = argparse.ArgumentParser(description="Run the FastAPI application.")
 parser.add_argument("--mode", choices=["dev", "prod"], default="dev", help="Run mode: 'dev' or 'prod'")
 parser.add_argument("--host", default="127.0.0.1", help="Host IP address")
-args = parser.parse_args()
+# other entry points, such as the job worker and the benchmarks, bring their own arguments
+args, _ = parser.parse_known_args()
 
 # Initialize and update settings
 settings = get_settings(args.mode)
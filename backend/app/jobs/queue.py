@@ -0,0 +1,242 @@
+import random
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, or_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import select
+
+from backend.app.dependencies.database import SyncSessionLocal
+from backend.app.models.summary_job import SummaryJob
+
+# a running job not finished within this time is handed to another worker
+VISIBILITY_TIMEOUT = timedelta(minutes=15)
+RETRY_BASE_DELAY = timedelta(seconds=30)
+RETRY_MAX_DELAY = timedelta(minutes=30)
+MAX_ATTEMPTS = 5
+# window of finished jobs the latency stats are computed over
+STATS_WINDOW = timedelta(hours=1)
+# a team batch also takes the team's jobs due within this window
+TEAM_BATCH_WINDOW = timedelta(minutes=15)
+TEAM_BATCH_SIZE = 50
+
+
+def retry_delay(attempts: int) -> timedelta:
+  """
+  Exponential backoff with full jitter for the given number of failed attempts.
+  """
+  delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempts - 1))
+  return delay * random.uniform(0.5, 1.0)
+
+
+class SummaryJobQueue:
+  """
+  Postgres-backed queue of summary runs, one job per (team, user, run_date).
+
+  Workers claim jobs with `SELECT ... FOR UPDATE SKIP LOCKED`, so any number of
+  worker threads and processes can poll the same table without handing a job to
+  two of them. A claimed job is invisible to other workers until `locked_until`;
+  if its worker dies, the job is claimed again after the visibility timeout. Failed
+  jobs are retried with exponential backoff until `max_attempts` is reached.
+  """
+
+  def __init__(self, session_factory=SyncSessionLocal, visibility_timeout=VISIBILITY_TIMEOUT):
+    self.session_factory = session_factory
+    self.visibility_timeout = visibility_timeout
+
+  def enqueue(self, team_id: str, user_id: str, run_date: date = None, run_after: datetime = None) -> bool:
+    """
+    Queue the summary of a user for a day. Returns False if that job already exists.
+    """
+    db = self.session_factory()
+    try:
+      statement = insert(SummaryJob).values(
+        team_id=team_id,
+        user_id=user_id,
+        run_date=run_date or date.today(),
+        status='queued',
+        attempts=0,
+        max_attempts=MAX_ATTEMPTS,
+        run_after=run_after or datetime.now(),
+        created_at=datetime.now(),
+      ).on_conflict_do_nothing(index_elements=['team_id', 'user_id', 'run_date'])
+      created = db.execute(statement).rowcount > 0
+      db.commit()
+      return created
+    finally:
+      db.close()
+
+  def claim(self, worker_id: str) -> SummaryJob:
+    """
+    Lock the next due job for `worker_id`, or return None when nothing is due.
+    """
+    now = datetime.now()
+    next_job_id = select(SummaryJob.id).where(
+      SummaryJob.attempts < SummaryJob.max_attempts,
+      or_(
+        (SummaryJob.status == 'queued') & (SummaryJob.run_after <= now),
+        (SummaryJob.status == 'running') & (SummaryJob.locked_until < now),
+      ),
+    ).order_by(SummaryJob.run_after).limit(1).with_for_update(skip_locked=True).scalar_subquery()
+
+    db = self.session_factory()
+    try:
+      job = db.scalars(
+        update(SummaryJob).where(SummaryJob.id == next_job_id).values(
+          status='running',
+          attempts=SummaryJob.attempts + 1,
+          locked_until=now + self.visibility_timeout,
+          locked_by=worker_id,
+          started_at=now,
+        ).returning(SummaryJob)
+      ).first()
+      if job is not None:
+        db.expunge(job)
+      db.commit()
+      return job
+    finally:
+      db.close()
+
+  def claim_team(self, worker_id: str, window: timedelta = TEAM_BATCH_WINDOW, limit: int = TEAM_BATCH_SIZE) -> list:
+    """
+    Lock the next due job and the other queued jobs of its team due within `window`.
+
+    The jobs of a team share one fetch of their followed channels, so taking the
+    ones due shortly is cheaper than running them one by one.
+    """
+    job = self.claim(worker_id)
+    if job is None:
+      return []
+
+    now = datetime.now()
+    team_job_ids = select(SummaryJob.id).where(
+      SummaryJob.team_id == job.team_id,
+      SummaryJob.status == 'queued',
+      SummaryJob.attempts < SummaryJob.max_attempts,
+      SummaryJob.run_after <= now + window,
+    ).order_by(SummaryJob.run_after).limit(limit - 1).with_for_update(skip_locked=True)
+
+    db = self.session_factory()
+    try:
+      jobs = list(db.scalars(
+        update(SummaryJob).where(SummaryJob.id.in_(team_job_ids.scalar_subquery())).values(
+          status='running',
+          attempts=SummaryJob.attempts + 1,
+          locked_until=now + self.visibility_timeout,
+          locked_by=worker_id,
+          started_at=now,
+        ).returning(SummaryJob)
+      ))
+      for team_job in jobs:
+        db.expunge(team_job)
+      db.commit()
+    finally:
+      db.close()
+    return [job] + jobs
+
+  def extend(self, jobs: list, worker_id: str) -> set:
+    """
+    Push back the visibility timeout of jobs `worker_id` still holds, and return their ids.
+
+    A batch runs its users one after another, so the locks of the later jobs are renewed
+    before each user instead of expiring while the earlier ones run.
+    """
+    now = datetime.now()
+    db = self.session_factory()
+    try:
+      held = set(db.scalars(
+        update(SummaryJob).where(
+          SummaryJob.id.in_([job.id for job in jobs]),
+          SummaryJob.status == 'running',
+          SummaryJob.locked_by == worker_id,
+        ).values(locked_until=now + self.visibility_timeout).returning(SummaryJob.id)
+      ))
+      db.commit()
+      return held
+    finally:
+      db.close()
+
+  def complete(self, job: SummaryJob, worker_id: str):
+    self._finish(job, worker_id, status='succeeded', finished_at=datetime.now(), locked_until=None, last_error=None)
+
+  def fail(self, job: SummaryJob, worker_id: str, error: str):
+    if job.attempts >= job.max_attempts:
+      self._finish(job, worker_id, status='failed', finished_at=datetime.now(), locked_until=None, last_error=error)
+    else:
+      self._finish(job, worker_id, status='queued', run_after=datetime.now() + retry_delay(job.attempts), locked_until=None, last_error=error)
+
+  def _finish(self, job: SummaryJob, worker_id: str, **values):
+    db = self.session_factory()
+    try:
+      # a worker that lost its lock to the visibility timeout must not overwrite the new owner
+      db.execute(
+        update(SummaryJob).where(
+          SummaryJob.id == job.id,
+          SummaryJob.status == 'running',
+          SummaryJob.locked_by == worker_id,
+        ).values(**values)
+      )
+      db.commit()
+    finally:
+      db.close()
+
+  def reap(self) -> int:
+    """
+    Mark running jobs that timed out on their last attempt as failed.
+    """
+    now = datetime.now()
+    db = self.session_factory()
+    try:
+      reaped = db.execute(
+        update(SummaryJob).where(
+          SummaryJob.status == 'running',
+          SummaryJob.locked_until < now,
+          SummaryJob.attempts >= SummaryJob.max_attempts,
+        ).values(status='failed', finished_at=now, locked_until=None, last_error='visibility timeout')
+      ).rowcount
+      db.commit()
+      return reaped
+    finally:
+      db.close()
+
+  def stats(self) -> dict:
+    """
+    Queue depth and job latency, for deciding how many workers to run.
+    """
+    now = datetime.now()
+    db = self.session_factory()
+    try:
+      counts = dict(db.execute(select(SummaryJob.status, func.count()).group_by(SummaryJob.status)).all())
+      due, oldest_due = db.execute(
+        select(func.count(), func.min(SummaryJob.run_after)).where(SummaryJob.status == 'queued', SummaryJob.run_after <= now)
+      ).one()
+
+      wait = func.extract('epoch', SummaryJob.started_at - SummaryJob.run_after)
+      duration = func.extract('epoch', SummaryJob.finished_at - SummaryJob.started_at)
+      finished = db.execute(
+        select(
+          func.count(),
+          func.avg(wait),
+          func.percentile_cont(0.95).within_group(wait),
+          func.avg(duration),
+          func.percentile_cont(0.95).within_group(duration),
+        ).where(SummaryJob.status == 'succeeded', SummaryJob.finished_at >= now - STATS_WINDOW)
+      ).one()
+    finally:
+      db.close()
+
+    return {
+      'queued': counts.get('queued', 0),
+      'due': due,
+      'running': counts.get('running', 0),
+      'succeeded': counts.get('succeeded', 0),
+      'failed': counts.get('failed', 0),
+      'oldest_due_age_seconds': (now - oldest_due).total_seconds() if oldest_due else 0.0,
+      'finished_last_hour': finished[0],
+      'mean_wait_seconds': float(finished[1] or 0),
+      'p95_wait_seconds': float(finished[2] or 0),
+      'mean_duration_seconds': float(finished[3] or 0),
+      'p95_duration_seconds': float(finished[4] or 0),
+    }
+
+
+summary_job_queue = SummaryJobQueue()
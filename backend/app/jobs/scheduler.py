@@ -0,0 +1,140 @@
+"""
+Scheduler that queues every user's summary ahead of their delivery time.
+
+Run with `python -m backend.app.jobs.scheduler`. Running more than one is harmless:
+a user gets at most one job per day.
+"""
+import time
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlmodel import select
+
+from backend.app.dependencies.database import SyncSessionLocal
+from backend.app.jobs.queue import summary_job_queue
+from backend.app.models.user import User
+from backend.app.oauth.v2.endpoints.install import installation_store
+
+DAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+MINUTES_PER_DAY = 24 * 60
+
+# the defaults of the settings modal, for users who never saved it
+DEFAULT_DAYS_TO_SEND = DAYS[:5]
+DEFAULT_TIME_TO_SEND = "09:00"
+DEFAULT_TIMEZONE = "America/Los_Angeles"
+
+# jobs are queued this long before delivery, and start at most DELIVERY_SPREAD before it
+ENQUEUE_LEAD = timedelta(hours=1)
+DELIVERY_SPREAD = timedelta(minutes=45)
+RELOAD_INTERVAL = timedelta(minutes=10)
+# after a restart, minutes older than this are not caught up on
+MAX_CATCH_UP = timedelta(hours=1)
+
+
+def parse_time(value: str) -> int:
+  hours, minutes = value.split(':')
+  return int(hours) * 60 + int(minutes)
+
+
+def local_minute_of_week(instant: datetime, tz: ZoneInfo) -> int:
+  local = instant.astimezone(tz)
+  return local.weekday() * MINUTES_PER_DAY + local.hour * 60 + local.minute
+
+
+def spread_offset(user_id: str) -> timedelta:
+  """
+  How long before the delivery time a user's job starts; stable per user, so digests arrive at the same time every day.
+  """
+  return DELIVERY_SPREAD * (zlib.crc32(user_id.encode()) % 1000 / 1000)
+
+
+class DeliveryScheduler:
+  """
+  Timing wheel of users keyed by their local delivery minute of the week.
+
+  There is one sparse wheel per timezone, so daylight saving changes need no
+  rebuild. Every minute, the slot `ENQUEUE_LEAD` ahead is read in every timezone.
+  Each user in it gets a job whose start is spread over `DELIVERY_SPREAD` before
+  delivery, so Slack and OpenAI load is spread out instead of peaking on the hour.
+  """
+
+  def __init__(self, session_factory=SyncSessionLocal, queue=summary_job_queue):
+    self.session_factory = session_factory
+    self.queue = queue
+    # timezone -> local minute of week -> [(team_id, user_id)]
+    self.wheels = {}
+    self.loaded_at = None
+    self._last_tick = None
+
+  def load_users(self) -> list:
+    """
+    (team_id, slack_user_id, settings) of every installed user.
+    """
+    installations = installation_store.installations
+    db = self.session_factory()
+    try:
+      rows = db.execute(
+        select(installations.c.team_id, User.slack_user_id, User.slack_installation_settings)
+        .join(installations, installations.c.user_id == User.slack_user_id)
+      ).all()
+    finally:
+      db.close()
+    # a reinstall adds another installation row for the same user
+    return list({(team_id, user_id): (team_id, user_id, settings or {}) for team_id, user_id, settings in rows}.values())
+
+  def build(self, users):
+    wheels = defaultdict(lambda: defaultdict(list))
+    for team_id, user_id, settings in users:
+      try:
+        tz_name = settings.get('timezone') or DEFAULT_TIMEZONE
+        ZoneInfo(tz_name)
+        minute_of_day = parse_time(settings.get('time_to_send') or DEFAULT_TIME_TO_SEND)
+      except (ZoneInfoNotFoundError, ValueError) as e:
+        print(f"Invalid delivery settings of {user_id}, using defaults: {e}")
+        tz_name, minute_of_day = DEFAULT_TIMEZONE, parse_time(DEFAULT_TIME_TO_SEND)
+      days_to_send = settings.get('days_to_send', DEFAULT_DAYS_TO_SEND)
+      for day in days_to_send:
+        if day in DAYS:
+          wheels[tz_name][DAYS.index(day) * MINUTES_PER_DAY + minute_of_day].append((team_id, user_id))
+    self.wheels = {ZoneInfo(tz_name): dict(slots) for tz_name, slots in wheels.items()}
+
+  def reload(self):
+    self.build(self.load_users())
+    self.loaded_at = datetime.now(timezone.utc)
+    print(f"Scheduled {sum(len(users) for slots in self.wheels.values() for users in slots.values())} deliveries in {len(self.wheels)} timezones")
+
+  def tick(self, now: datetime = None) -> int:
+    """
+    Queue the jobs of every minute since the last tick. Returns the number of newly queued jobs.
+    """
+    now = (now or datetime.now(timezone.utc)).replace(second=0, microsecond=0)
+    if self._last_tick is None or now - self._last_tick > MAX_CATCH_UP:
+      self._last_tick = now - timedelta(minutes=1)
+
+    queued = 0
+    minute = self._last_tick + timedelta(minutes=1)
+    while minute <= now:
+      delivery_at = minute + ENQUEUE_LEAD
+      for tz, slots in self.wheels.items():
+        for team_id, user_id in slots.get(local_minute_of_week(delivery_at, tz), []):
+          run_after = (delivery_at - spread_offset(user_id)).astimezone().replace(tzinfo=None)
+          if self.queue.enqueue(team_id, user_id, delivery_at.astimezone(tz).date(), run_after):
+            queued += 1
+      minute += timedelta(minutes=1)
+    self._last_tick = now
+    return queued
+
+  def run(self):
+    while True:
+      if self.loaded_at is None or datetime.now(timezone.utc) - self.loaded_at > RELOAD_INTERVAL:
+        self.reload()
+      queued = self.tick()
+      if queued:
+        print(f"Queued {queued} summary jobs")
+      time.sleep(60 - datetime.now().second)
+
+
+if __name__ == "__main__":
+  DeliveryScheduler().run()
@@ -0,0 +1,156 @@
+"""
+Worker that runs queued summary jobs.
+
+Run with `python -m backend.app.jobs.worker [--processes 2] [--concurrency 4] [--team-batch]`. Every
+process runs `concurrency` jobs at once; start more processes, here or on other hosts, to scale out.
+With `--team-batch`, a worker takes the jobs of a team due soon together and fetches
+their followed channels once.
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import traceback
+
+from backend.app.jobs.queue import VISIBILITY_TIMEOUT, summary_job_queue
+from backend.app.summarizer.summarizer import summarize_for_slack_user, summarize_team
+
+POLL_INTERVAL = 5.0
+REAP_INTERVAL = 60.0
+# locks of running jobs are renewed well before the visibility timeout runs out
+LOCK_RENEW_INTERVAL = VISIBILITY_TIMEOUT.total_seconds() / 3
+
+
+class LockHeartbeat:
+  """
+  Renews the locks of the jobs a worker is running, in a background thread, until the block exits.
+
+  A summary run can take longer than the visibility timeout, e.g. when Slack's rate
+  limits slow it down, and must not be claimed and sent a second time meanwhile.
+  """
+
+  def __init__(self, jobs: list, worker_id: str):
+    self.jobs = jobs
+    self.worker_id = worker_id
+    self._stopped = threading.Event()
+    self._thread = threading.Thread(target=self._run, name=f"lock-heartbeat-{worker_id}", daemon=True)
+
+  def __enter__(self):
+    self._thread.start()
+    return self
+
+  def __exit__(self, *exc_info):
+    self._stopped.set()
+    self._thread.join()
+
+  def _run(self):
+    while not self._stopped.wait(LOCK_RENEW_INTERVAL):
+      try:
+        summary_job_queue.extend(self.jobs, self.worker_id)
+      except Exception as e:
+        print(f"{self.worker_id} could not renew its job locks: {e}")
+
+
+def work(worker_id: str, stopped: threading.Event):
+  while not stopped.is_set():
+    try:
+      job = summary_job_queue.claim(worker_id)
+    except Exception as e:
+      print(f"{worker_id} could not claim a job: {e}")
+      job = None
+    if job is None:
+      stopped.wait(POLL_INTERVAL)
+      continue
+
+    print(f"{worker_id} summarizing {job.team_id}/{job.user_id} for {job.run_date} (attempt {job.attempts})")
+    try:
+      # a retry re-sends a digest an earlier attempt stored before failing
+      with LockHeartbeat([job], worker_id):
+        summarize_for_slack_user(job.team_id, job.user_id, resend_since=job.created_at if job.attempts > 1 else None)
+    except Exception as e:
+      traceback.print_exc()
+      summary_job_queue.fail(job, worker_id, f"{type(e).__name__}: {e}")
+    else:
+      summary_job_queue.complete(job, worker_id)
+
+
+def work_team_batches(worker_id: str, stopped: threading.Event):
+  while not stopped.is_set():
+    try:
+      jobs = summary_job_queue.claim_team(worker_id)
+    except Exception as e:
+      print(f"{worker_id} could not claim jobs: {e}")
+      jobs = []
+    if not jobs:
+      stopped.wait(POLL_INTERVAL)
+      continue
+
+    team_id = jobs[0].team_id
+    jobs_by_user = {job.user_id: job for job in jobs}
+
+    def renew_lock(user_id):
+      # skip a user whose job was handed to another worker, so the digest is not sent twice
+      return jobs_by_user[user_id].id in summary_job_queue.extend(jobs, worker_id)
+
+    print(f"{worker_id} summarizing {len(jobs)} users of {team_id}")
+    try:
+      with LockHeartbeat(jobs, worker_id):
+        errors = summarize_team(
+          team_id,
+          list(jobs_by_user),
+          before_user=renew_lock,
+          resend_since={job.user_id: job.created_at for job in jobs if job.attempts > 1},
+        )
+    except Exception as e:
+      traceback.print_exc()
+      errors = {job.user_id: e for job in jobs}
+    for job in jobs:
+      error = errors.get(job.user_id)
+      if error is None:
+        summary_job_queue.complete(job, worker_id)
+      else:
+        summary_job_queue.fail(job, worker_id, f"{type(error).__name__}: {error}")
+
+
+def run_process(concurrency: int, team_batch: bool = False):
+  worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+  stopped = threading.Event()
+  threads = [
+    threading.Thread(target=work_team_batches if team_batch else work, args=(f"{worker_prefix}:{index}", stopped), name=f"summary-worker-{index}")
+    for index in range(concurrency)
+  ]
+  for thread in threads:
+    thread.start()
+
+  try:
+    while True:
+      reaped = summary_job_queue.reap()
+      if reaped:
+        print(f"{worker_prefix} marked {reaped} timed out jobs as failed")
+      time.sleep(REAP_INTERVAL)
+  except KeyboardInterrupt:
+    stopped.set()
+    for thread in threads:
+      thread.join()
+
+
+def parse_args():
+  parser = argparse.ArgumentParser(description="Run queued summary jobs.")
+  parser.add_argument('--processes', type=int, default=1)
+  parser.add_argument('--concurrency', type=int, default=4, help="jobs run at once by each process")
+  parser.add_argument('--team-batch', action='store_true', help="run the due jobs of a team together, fetching shared channels once")
+  return parser.parse_args()
+
+
+if __name__ == "__main__":
+  args = parse_args()
+  if args.processes == 1:
+    run_process(args.concurrency, args.team_batch)
+  else:
+    processes = [multiprocessing.Process(target=run_process, args=(args.concurrency, args.team_batch)) for _ in range(args.processes)]
+    for process in processes:
+      process.start()
+    for process in processes:
+      process.join()
@@ -13,7 +13,12 @@ from backend.app.api.v1.endpoints import message, doc, base
 from backend.app.dependencies.database import get_sync_db, init_db, AsyncSessionLocal
 from backend.data.init_data import models_data
 from backend.app.oauth.v2.endpoints import install, callback
-from backend.app.api.v1.endpoints import users
+from backend.app.api.v1.endpoints import users, jobs, summaries
+from backend.app.rendering.views import SETTINGS_MODAL_VIEW_JSON, home_view_json
+from backend.app.summarizer.digests import DigestStore
+from backend.app.summarizer.directory_cache import TeamDirectoryCache
+from backend.app.summarizer.message_ingest import message_ingest_buffer
+from backend.app.summarizer.slack_transport import slack_transport
 from slack_bolt.adapter.fastapi import SlackRequestHandler
 from slack_bolt.oauth.oauth_settings import OAuthSettings
 from slack_bolt.adapter.socket_mode import SocketModeHandler
@@ -27,6 +32,8 @@ async def lifespan(app: FastAPI):
   # Initialize the database connection
   init_db()
   yield
+  message_ingest_buffer.close()
+  slack_transport.close()
 
 # Start of Slack Bolt setup
 slack_bolt_app = App(
@@ -64,9 +71,9 @@ def handle_message_event(message, say):
   )
 
 @slack_bolt_app.event("message")
-def handle_message(body, say, logger):
-  logger.info(body)
-  say("Message!! 👋")
+def handle_message(body, event, logger):
+  # store the message locally so digests can be built without crawling history
+  message_ingest_buffer.add_event(body["team_id"], event)
 
 @slack_bolt_app.event("app_mention")
 def handle_app_mention_events(body, say, logger):
@@ -74,232 +81,29 @@ def handle_app_mention_events(body, say, logger):
   logger.info(body)
   say("App mention!! 👋")
 
+# Keep the cached workspace directory current between full crawls
+@slack_bolt_app.event("user_change")
+@slack_bolt_app.event("team_join")
+def handle_directory_user_event(event, context, logger):
+  try:
+    TeamDirectoryCache(context["db"], context.team_id).apply_user(event["user"])
+  except Exception as e:
+    logger.exception(f"Failed to update directory cache: {e}")
+
+@slack_bolt_app.event("subteam_updated")
+def handle_directory_user_group_event(event, context, logger):
+  try:
+    TeamDirectoryCache(context["db"], context.team_id).apply_user_group(event["subteam"])
+  except Exception as e:
+    logger.exception(f"Failed to update directory cache: {e}")
+
 # The open_modal shortcut listens to a shortcut with the callback_id "change_settings_open_modal"
 @slack_bolt_app.shortcut('change_settings_open_modal')
 def open_change_settings_modal(ack, shortcut, client):
     # Acknowledge the shortcut request
     ack()
     # Call the views_open method using the built-in WebClient
-    client.views_open(
-        trigger_id=shortcut["trigger_id"],
-        # A simple view payload for a modal
-        view={
-          "title": {
-            "type": "plain_text",
-            "text": "Ketchup Settings"
-          },
-          "submit": {
-            "type": "plain_text",
-            "text": "Submit",
-          },
-          "type": "modal",
-          "close": {
-            "type": "plain_text",
-            "text": "Cancel",
-          },
-          "blocks": [
-            {
-              "type": "input",
-              "block_id": "main_settings",
-              "element": {
-                "type": "checkboxes",
-                "initial_options": [
-                  {
-                    "text": {
-                      "type": "plain_text",
-                      "text": "The Direct Messages that I am in",
-                    },
-                    "value": "direct_messages"
-                  },
-                  {
-                    "text": {
-                      "type": "plain_text",
-                      "text": "Messages that I am directly mentioned in",
-                    },
-                    "value": "direct_mentions"
-                  },
-                  {
-                    "text": {
-                      "type": "plain_text",
-                      "text": "Messages that I am mentioned in via a User Group",
-                    },
-                    "value": "user_group_mentions"
-                  }
-                ],
-                "options": [
-                  {
-                    "text": {
-                      "type": "plain_text",
-                      "text": "The Direct Messages that I am in",
-                    },
-                    "value": "direct_messages"
-                  },
-                  {
-                    "text": {
-                      "type": "plain_text",
-                      "text": "Messages that I am directly mentioned in",
-                    },
-                    "value": "direct_mentions"
-                  },
-                  {
-                    "text": {
-                      "type": "plain_text",
-                      "text": "Messages that I am mentioned in via a User Group",
-                    },
-                    "value": "user_group_mentions"
-                  }
-                ]
-              },
-              "label": {
-                "type": "plain_text",
-                "text": "Tick the checkboxes on what you want to get a summary of:",
-              }
-            },
-            {
-              "type": "section",
-              "block_id": "followed_channels",
-              "text": {
-                "type": "mrkdwn",
-                "text": ":speech_balloon: *Channels I want to follow*"
-              },
-              "accessory": {
-                "type": "multi_channels_select",
-                "max_selected_items": 10,
-                "placeholder": {
-                  "type": "plain_text",
-                  "text": "Select channels"
-                }
-              }
-            },
-            {
-              "type": "section",
-              "block_id": "followed_users",
-              "text": {
-                "type": "mrkdwn",
-                "text": ":busts_in_silhouette: *People I want to follow*"
-              },
-              "accessory": {
-                "type": "multi_users_select",
-                "max_selected_items": 5,
-                "placeholder": {
-                  "type": "plain_text",
-                  "text": "Select users"
-                }
-              }
-            },
-            {
-              "type": "divider"
-            },
-            {
-              "type": "section",
-              "block_id": "days_to_send",
-              "text": {
-                "type": "mrkdwn",
-                "text": ":timer_clock: *How often and when would you like to receive the summary?*"
-              },
-              "accessory": {
-                "type": "multi_static_select",
-                "placeholder": {
-                  "type": "plain_text",
-                  "text": "Select days"
-                },
-                "initial_options": [
-                  {
-                    "text": {
-                      "type": "plain_text",
-                      "text": "Monday",
-                    },
-                    "value": "monday"
-                  },
-                  {
-                    "text": {
-                      "type": "plain_text",
-                      "text": "Tuesday"
-                    },
-                    "value": "tuesday"
-                  },
-                  {
-                    "text": {
-                      "type": "plain_text",
-                      "text": "Wednesday"
-                    },
-                    "value": "wednesday"
-                  },
-                  {
-                    "text": {
-                      "type": "plain_text",
-                      "text": "Thursday"
-                    },
-                    "value": "thursday"
-                  },
-                  {
-                    "text": {
-                      "type": "plain_text",
-                      "text": "Friday"
-                    },
-                    "value": "friday"
-                  }
-                ],
-                "options": [
-                  {
-                    "text": {
-                      "type": "plain_text",
-                      "text": "Monday",
-                    },
-                    "value": "monday"
-                  },
-                  {
-                    "text": {
-                      "type": "plain_text",
-                      "text": "Tuesday"
-                    },
-                    "value": "tuesday"
-                  },
-                  {
-                    "text": {
-                      "type": "plain_text",
-                      "text": "Wednesday"
-                    },
-                    "value": "wednesday"
-                  },
-                  {
-                    "text": {
-                      "type": "plain_text",
-                      "text": "Thursday"
-                    },
-                    "value": "thursday"
-                  },
-                  {
-                    "text": {
-                      "type": "plain_text",
-                      "text": "Friday"
-                    },
-                    "value": "friday"
-                  }
-                ]
-              }
-            },
-            {
-              "type": "section",
-              "block_id": "time_to_send",
-              "text": {
-                "type": "mrkdwn",
-                "text": "Time"
-              },
-              "accessory": {
-                "type": "timepicker",
-                "timezone": "America/Los_Angeles",
-                "action_id": "timepicker123",
-                "initial_time": "09:00",
-                "placeholder": {
-                  "type": "plain_text",
-                  "text": "Select a time"
-                }
-              }
-            }
-          ]
-        }
-    )
+    client.views_open(trigger_id=shortcut["trigger_id"], view=SETTINGS_MODAL_VIEW_JSON)
 
 @slack_bolt_app.view("change_settings")
 def handle_submission(ack, body, client, view, logger, context):
@@ -339,123 +143,8 @@ def handle_submission(ack, body, client, view, logger, context):
       logger.exception(f"Failed to post a message {e}")
 
 
-def publish_home_view(user_id, user_settings, client, logger):
-   client.views_publish(
-      type="home",
-      user_id=user_id,
-      view={
-        "type": "home",
-        "blocks": [
-          {
-            "type": "header",
-            "text": {
-              "type": "plain_text",
-              "text": ":wave: Welcome to Ketchup!"
-            }
-          },
-          {
-            "type": "section",
-            "text": {
-              "type": "plain_text",
-              "text": "Lorem Ipsum is simply dummy text of the printing and typesetting industry. Lorem Ipsum has been the industry's standard dummy text ever since the 1500s, when an unknown printer took a galley of type and scrambled it to make a type specimen book. It has survived not only five centuries, but also the leap into electronic typesetting, remaining essentially unchanged. It was popularised in the 1960s with the release of Letraset sheets containing Lorem Ipsum passages, and more recently with desktop publishing software like Aldus PageMaker including versions of Lorem Ipsum"
-            }
-          },
-          {
-            "type": "header",
-            "text": {
-              "type": "plain_text",
-              "text": "Your Current Settings"
-            }
-          },
-          {
-            "type": "divider"
-          },
-          {
-            "type": "section",
-            "text": {
-              "type": "plain_text",
-              "text": ":white_tick: I want to summarize my Direct messages."
-            }
-          },
-          {
-            "type": "section",
-            "text": {
-              "type": "plain_text",
-              "text": ":white_tick: I want to summarize the messages and threads that I am directly mentioned in."
-            }
-          },
-          {
-            "type": "section",
-            "text": {
-              "type": "plain_text",
-              "text": ":white_tick: I want to summarize the messages and threads that I indirectly mentioned via user groups."
-            }
-          },
-          {
-            "type": "section",
-            "text": {
-              "type": "plain_text",
-              "text": ":white_tick: I want to follow the following channels: #product, #engineering…"
-            }
-          },
-          {
-            "type": "section",
-            "text": {
-              "type": "plain_text",
-              "text": ":white_tick: I want to follow the following teammates: @abc"
-            }
-          },
-          {
-            "type": "section",
-            "text": {
-              "type": "plain_text",
-              "text": ":timer: I will receive the summaries via DM on: \nMonday, Tuesday, Wednesday, Thursday, Friday @ 9:00AM"
-            }
-          },
-          {
-            "type": "actions",
-            "elements": [
-              {
-                "type": "button",
-                "text": {
-                  "type": "plain_text",
-                  "text": ":gear: Change Settings",
-                },
-                "action_id": "change_settings_open_modal"
-              }
-            ]
-          },
-          {
-            "type": "header",
-            "text": {
-              "type": "plain_text",
-              "text": "Other actions"
-            }
-          },
-          {
-            "type": "actions",
-            "elements": [
-              {
-                "type": "button",
-                "text": {
-                  "type": "plain_text",
-                  "text": ":heavy_plus_symbol: Invite Teammates",
-                },
-                "action_id": "invite_teammates_open_modal"
-              },
-              {
-                "type": "button",
-                "text": {
-                  "type": "plain_text",
-                  "text": ":question: Give us Feedback",
-                },
-                "action_id": "give-feedback"
-              }
-            ]
-          }
-        ]
-      }
-    )
+def publish_home_view(user_id, user_settings, client, logger, latest_summary=None):
+  client.views_publish(user_id=user_id, view=home_view_json(latest_summary))
 
 @slack_bolt_app.event("app_home_opened")
 def update_home_tab(client, event, logger, context):
@@ -467,8 +156,11 @@ def update_home_tab(client, event, logger, context):
     user = callback.get_user_by_slack_user_id(user_id, context["db"])
     user_settings = user.slack_installation_settings
     
+    # the latest digest is read from the summaries table instead of being generated again
+    latest_summary = DigestStore(context["db"]).latest(user_id)
+
     # publish home view
-    publish_home_view(user_id, user_settings, client, logger)
+    publish_home_view(user_id, user_settings, client, logger, latest_summary)
   except Exception as e:
     logger.error(f"Error publishing home tab: {e}")
 
@@ -514,6 +206,8 @@ app.include_router(base.router, prefix="", tags=["main"])
 app.include_router(doc.router, prefix="", tags=["doc"])
 app.include_router(message.router, prefix="/api/v1", tags=["message"])
 app.include_router(users.router, prefix="/api/v1/users", tags=["user_settings"])
+app.include_router(jobs.router, prefix="/api/v1/jobs", tags=["jobs"])
+app.include_router(summaries.router, prefix="/api/v1/summaries", tags=["summaries"])
 app.include_router(install.router, prefix="/oauth/v2", tags=["install"])
 app.include_router(callback.router, prefix="/oauth/v2", tags=["callback"])
 
@@ -529,9 +223,6 @@ async def install(req: Request, db = Depends(get_sync_db)):
 async def oauth_redirect(req: Request, db = Depends(get_sync_db)):
   return await app_handler.handle(req, {"db": db})
 
-from slack_sdk import WebClient
-client = WebClient()
-
 if __name__ == "__main__":
   # mounting at the root path
   uvicorn.run(
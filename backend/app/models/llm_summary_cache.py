@@ -0,0 +1,14 @@
+from datetime import datetime
+from sqlmodel import SQLModel, Field
+
+
+class LLMSummaryCacheEntry(SQLModel, table=True):
+  __tablename__ = "llm_summary_cache"
+  # sha256 of the prompt version, the model and the formatted conversation text
+  key: str = Field(primary_key=True)
+  model: str
+  prompt_version: str
+  summary: str
+  created_at: datetime = Field(default_factory=datetime.now)
+  last_used_at: datetime = Field(default_factory=datetime.now, index=True)
+  hits: int = Field(default=0)
@@ -0,0 +1,21 @@
+from datetime import datetime
+from sqlalchemy import Index
+from sqlmodel import SQLModel, Field, JSON
+
+
+class SlackDirectorySnapshot(SQLModel, table=True):
+  __tablename__ = "slack_directory_snapshots"
+  team_id: str = Field(primary_key=True)
+  fetched_at: datetime = Field(default_factory=datetime.now)
+
+
+class SlackDirectoryEntry(SQLModel, table=True):
+  __tablename__ = "slack_directory_entries"
+  # worker processes read the entries changed by directory events since their last look
+  __table_args__ = (Index("ix_slack_directory_entries_team_id_updated_at", "team_id", "updated_at"),)
+  team_id: str = Field(primary_key=True)
+  # 'user' or 'user_group'
+  kind: str = Field(primary_key=True)
+  entry_id: str = Field(primary_key=True)
+  data: dict = Field(nullable=False, sa_type=JSON)
+  updated_at: datetime = Field(default_factory=datetime.now)
@@ -0,0 +1,41 @@
+from datetime import datetime
+from sqlmodel import SQLModel, Field
+from typing import Optional
+
+
+class SlackMessage(SQLModel, table=True):
+  __tablename__ = "slack_messages"
+  team_id: str = Field(primary_key=True)
+  channel_id: str = Field(primary_key=True)
+  ts: str = Field(primary_key=True)
+  thread_ts: Optional[str] = Field(default=None, index=True)
+  # thread replies are only returned by conversations.replies, not by conversations.history
+  is_reply: bool = Field(default=False)
+  user: Optional[str] = Field(default=None)
+  bot_id: Optional[str] = Field(default=None)
+  subtype: Optional[str] = Field(default=None)
+  text: str = Field(default="")
+  reply_count: Optional[int] = Field(default=None)
+  latest_reply: Optional[str] = Field(default=None)
+  updated_at: datetime = Field(default_factory=datetime.now)
+
+
+class SlackChannelWatermark(SQLModel, table=True):
+  __tablename__ = "slack_channel_watermarks"
+  team_id: str = Field(primary_key=True)
+  channel_id: str = Field(primary_key=True)
+  # the mirror holds every top-level message in (covered_from_ts, high_water_ts]
+  covered_from_ts: str
+  high_water_ts: str
+  updated_at: datetime = Field(default_factory=datetime.now)
+  # last conversations.history sync; the event stream only keeps a watermark fresh for a while after it
+  synced_at: Optional[datetime] = Field(default=None, nullable=True)
+
+
+class SlackThreadState(SQLModel, table=True):
+  __tablename__ = "slack_thread_states"
+  team_id: str = Field(primary_key=True)
+  channel_id: str = Field(primary_key=True)
+  thread_ts: str = Field(primary_key=True)
+  latest_reply: Optional[str] = Field(default=None)
+  synced_at: datetime = Field(default_factory=datetime.now)
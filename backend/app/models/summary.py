@@ -1,4 +1,4 @@
-from sqlmodel import SQLModel, Field, JSON
+from sqlmodel import SQLModel, Field, Index, JSON
 import uuid
 from datetime import datetime
 from typing import Dict, List, Optional
@@ -6,8 +6,12 @@ from typing import Dict, List, Optional
 
 class Summary(SQLModel, table=True):
   __tablename__ = "summaries"
-  id: uuid.UUID = Field(default=uuid.uuid4, primary_key=True)
-  created_at: datetime = Field(default=datetime.now)
+  # the latest digest of a user is read on every home tab open
+  __table_args__ = (Index("ix_summaries_user_id_created_at", "user_id", "created_at"),)
+  id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+  created_at: datetime = Field(default_factory=datetime.now)
   user_id: uuid.UUID = Field(foreign_key="users.id")
   content: Optional[dict] = Field(nullable=False, sa_type=JSON)
-
+  title: Optional[str] = Field(default=None)
+  # Block Kit rendering of the content, as sent in the DM
+  blocks: Optional[list] = Field(default=None, sa_type=JSON)
@@ -0,0 +1,26 @@
+from datetime import date, datetime
+from sqlmodel import SQLModel, Field, UniqueConstraint
+from typing import Optional
+
+
+class SummaryJob(SQLModel, table=True):
+  __tablename__ = "summary_jobs"
+  # one digest per user and day, however often the job is enqueued
+  __table_args__ = (UniqueConstraint("team_id", "user_id", "run_date"),)
+  id: Optional[int] = Field(default=None, primary_key=True)
+  team_id: str
+  user_id: str
+  run_date: date
+  # queued -> running -> succeeded | failed, back to queued for a retry
+  status: str = Field(default="queued", index=True)
+  attempts: int = Field(default=0)
+  max_attempts: int = Field(default=5)
+  # a queued job is not picked up before run_after
+  run_after: datetime = Field(default_factory=datetime.now, index=True)
+  # a running job whose lock expired is picked up again by another worker
+  locked_until: Optional[datetime] = Field(default=None)
+  locked_by: Optional[str] = Field(default=None)
+  last_error: Optional[str] = Field(default=None)
+  created_at: datetime = Field(default_factory=datetime.now)
+  started_at: Optional[datetime] = Field(default=None)
+  finished_at: Optional[datetime] = Field(default=None)
@@ -0,0 +1,15 @@
+from datetime import datetime
+from sqlmodel import SQLModel, Field
+
+
+class SlackThreadSummary(SQLModel, table=True):
+  __tablename__ = "slack_thread_summaries"
+  team_id: str = Field(primary_key=True)
+  channel_id: str = Field(primary_key=True)
+  thread_ts: str = Field(primary_key=True)
+  summary: str
+  # ts of the newest message the summary covers; later replies are folded in incrementally
+  last_reply_ts: str
+  model: str
+  prompt_version: str
+  updated_at: datetime = Field(default_factory=datetime.now)
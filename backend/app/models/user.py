@@ -5,7 +5,7 @@ from typing import  Optional
 
 class User(SQLModel, table=True):
   __tablename__ = "users"
-  id: uuid.UUID = Field(default=str(uuid.uuid4()), primary_key=True)
-  created_at: datetime = Field(default=datetime.now())
+  id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+  created_at: datetime = Field(default_factory=datetime.now)
   slack_user_id: str = Field(unique=True)
   slack_installation_settings: Optional[dict] = Field(nullable=True, sa_type=JSON, default={})
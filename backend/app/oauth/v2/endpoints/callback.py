@@ -1,7 +1,6 @@
-from slack_sdk.web import WebClient
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import PlainTextResponse
-from slack_sdk.web import WebClient
+from backend.app.summarizer.slack_transport import get_slack_client, slack_transport
 from backend.app.oauth.v2.endpoints.install import oauth_state_store, installation_store
 from slack_sdk.oauth.installation_store import Installation
 from backend.app.models.user import User
@@ -47,7 +46,7 @@ async def oauth_callback(request: Request, db = Depends(get_sync_db)):
     if oauth_state_store.consume(state):
       oauth_response = await complete_installation(code)
       installation_store.delete_installation(user_id=oauth_response.get("authed_user").get("id"), enterprise_id=oauth_response.get("enterprise").get("id"), team_id=oauth_response.get("team").get("id"))
-      installation = create_installation(oauth_response)
+      installation = await create_installation(oauth_response)
       installation_store.save(installation)
       await create_user_and_link_to_slack(installation.user_id)
       return PlainTextResponse("Installation successful!")
@@ -65,16 +64,16 @@ async def get_installation(user_id: str, team_id: str, db = Depends(get_sync_db)
   return installation
 
 async def complete_installation(code: str) -> dict:
-  client = WebClient()
-  oauth_response = client.oauth_v2_access(
+  client = get_slack_client()
+  oauth_response = await slack_transport.run_async(client.oauth_v2_access(
     client_id=os.getenv('SLACK_CLIENT_ID'),
     client_secret=os.getenv('SLACK_CLIENT_SECRET'),
     redirect_uri=os.getenv('SLACK_REDIRECT_URI'),
     code=code
-  )
+  ))
   return oauth_response
 
-def create_installation(oauth_response: dict) -> Installation:
+async def create_installation(oauth_response: dict) -> Installation:
   installed_enterprise = oauth_response.get("enterprise") or {}
   is_enterprise_install = oauth_response.get("is_enterprise_install")
   installed_team = oauth_response.get("team") or {}
@@ -84,8 +83,8 @@ def create_installation(oauth_response: dict) -> Installation:
   bot_id = None
   enterprise_url = None
   if bot_token is not None:
-    client = WebClient()
-    auth_test = client.auth_test(token=bot_token)
+    client = get_slack_client(bot_token)
+    auth_test = await slack_transport.run_async(client.auth_test())
     bot_id = auth_test["bot_id"]
     if is_enterprise_install is True:
         enterprise_url = auth_test.get("url")
@@ -0,0 +1,105 @@
+"""
+Block Kit rendering of digests.
+
+The blocks that are the same in every digest are built once at import. Topics
+are rendered by a single function for both lists, and user ids are turned into
+mentions with one compiled-regex pass per field. `render_digest_json` returns
+the blocks already serialized, which is what the Slack client sends.
+"""
+import json
+import re
+
+# bare user ids written by the model, e.g. U01L15W16EP; ids already inside <@...> are left alone
+# (the leading literal U lets the regex engine skip ahead to candidates)
+USER_ID_PATTERN = re.compile(r"U(?<![@\w]U)[A-Z0-9]{8,}\b")
+
+PRIORITY_LABELS = {
+  'Low': ':large_green_circle: Low',
+  'Medium': ':large_yellow_circle: Medium',
+  'High': ':red_circle: High',
+}
+
+DIVIDER = {"type": "divider"}
+DIGEST_HEADER = {
+  "type": "header",
+  "text": {
+    "type": "plain_text",
+    "text": ":newspaper:  Your Daily Ketchup Summary :newspaper:"
+  }
+}
+ACTIONABLES_HEADER = {
+  "type": "header",
+  "text": {
+    "type": "plain_text",
+    "text": ":dart: Actionables"
+  }
+}
+CATCH_UP_HEADER = {
+  "type": "header",
+  "text": {
+    "type": "plain_text",
+    "text": ":bee: To catch up on"
+  }
+}
+
+
+def _mention(match) -> str:
+  return f"<@{match.group(0)}>"
+
+
+def mention_user_ids(text: str) -> str:
+  return USER_ID_PATTERN.sub(_mention, text)
+
+
+def render_topic(number: int, topic: dict) -> dict:
+  action_items = topic.get('action_items') or []
+  action_items_text = "\n".join(f"• {mention_user_ids(action_item)}" for action_item in action_items) if action_items else 'None'
+  links_text = f"• <{topic['link_to_slack_message']}|Original message>\n"
+  links_text += "\n".join(f"• <{link['url']}|{link['link_summary']}>" for link in topic.get('links') or [])
+  return {
+    "type": "section",
+    "text": {
+      "type": "mrkdwn",
+      "text": f"*{number}. {topic['title']}*",
+    },
+    "fields": [
+      {"type": "mrkdwn", "text": f"*Priority*\n{PRIORITY_LABELS.get(topic['priority'], '')}"},
+      {"type": "mrkdwn", "text": f"*Current Status*\n{mention_user_ids(topic['current_status'])}"},
+      {"type": "mrkdwn", "text": f"*Summary*\n{mention_user_ids(topic['summary'])}"},
+      {"type": "mrkdwn", "text": f"*Action Items*\n{action_items_text}"},
+      {"type": "mrkdwn", "text": f"*Links*\n{links_text}"},
+      {"type": "mrkdwn", "text": f"*Source*\n<#{topic['channel_id']}>"},
+    ],
+  }
+
+
+def render_digest(json_data: dict, date) -> list:
+  """
+  Blocks of a digest in the `actionables` / `to_catch_up_on` JSON format.
+  """
+  blocks = [
+    DIGEST_HEADER,
+    {
+      "type": "context",
+      "elements": [
+        {
+          "text": f"*{date.strftime('%B %d, %Y')}* | What happened yesterday",
+          "type": "mrkdwn"
+        }
+      ]
+    },
+    DIVIDER,
+    ACTIONABLES_HEADER,
+  ]
+  for index, topic in enumerate(json_data["actionables"]):
+    blocks.append(render_topic(index + 1, topic))
+    blocks.append(DIVIDER)
+  blocks.append(CATCH_UP_HEADER)
+  for index, topic in enumerate(json_data["to_catch_up_on"]):
+    blocks.append(render_topic(index + 1, topic))
+    blocks.append(DIVIDER)
+  return blocks
+
+
+def render_digest_json(blocks: list) -> str:
+  return json.dumps(blocks, ensure_ascii=False, separators=(',', ':'))
@@ -0,0 +1,379 @@
+"""
+Static Slack views of the app, built and serialized once at import.
+
+Slack accepts a view as a JSON-encoded string, so handlers send the cached
+`*_JSON` strings instead of rebuilding and re-encoding the literals on every event.
+"""
+import json
+
+SETTINGS_MODAL_VIEW = {
+  "title": {
+    "type": "plain_text",
+    "text": "Ketchup Settings"
+  },
+  "submit": {
+    "type": "plain_text",
+    "text": "Submit",
+  },
+  "type": "modal",
+  "close": {
+    "type": "plain_text",
+    "text": "Cancel",
+  },
+  "blocks": [
+    {
+      "type": "input",
+      "block_id": "main_settings",
+      "element": {
+        "type": "checkboxes",
+        "initial_options": [
+          {
+            "text": {
+              "type": "plain_text",
+              "text": "The Direct Messages that I am in",
+            },
+            "value": "direct_messages"
+          },
+          {
+            "text": {
+              "type": "plain_text",
+              "text": "Messages that I am directly mentioned in",
+            },
+            "value": "direct_mentions"
+          },
+          {
+            "text": {
+              "type": "plain_text",
+              "text": "Messages that I am mentioned in via a User Group",
+            },
+            "value": "user_group_mentions"
+          }
+        ],
+        "options": [
+          {
+            "text": {
+              "type": "plain_text",
+              "text": "The Direct Messages that I am in",
+            },
+            "value": "direct_messages"
+          },
+          {
+            "text": {
+              "type": "plain_text",
+              "text": "Messages that I am directly mentioned in",
+            },
+            "value": "direct_mentions"
+          },
+          {
+            "text": {
+              "type": "plain_text",
+              "text": "Messages that I am mentioned in via a User Group",
+            },
+            "value": "user_group_mentions"
+          }
+        ]
+      },
+      "label": {
+        "type": "plain_text",
+        "text": "Tick the checkboxes on what you want to get a summary of:",
+      }
+    },
+    {
+      "type": "section",
+      "block_id": "followed_channels",
+      "text": {
+        "type": "mrkdwn",
+        "text": ":speech_balloon: *Channels I want to follow*"
+      },
+      "accessory": {
+        "type": "multi_channels_select",
+        "max_selected_items": 10,
+        "placeholder": {
+          "type": "plain_text",
+          "text": "Select channels"
+        }
+      }
+    },
+    {
+      "type": "section",
+      "block_id": "followed_users",
+      "text": {
+        "type": "mrkdwn",
+        "text": ":busts_in_silhouette: *People I want to follow*"
+      },
+      "accessory": {
+        "type": "multi_users_select",
+        "max_selected_items": 5,
+        "placeholder": {
+          "type": "plain_text",
+          "text": "Select users"
+        }
+      }
+    },
+    {
+      "type": "divider"
+    },
+    {
+      "type": "section",
+      "block_id": "days_to_send",
+      "text": {
+        "type": "mrkdwn",
+        "text": ":timer_clock: *How often and when would you like to receive the summary?*"
+      },
+      "accessory": {
+        "type": "multi_static_select",
+        "placeholder": {
+          "type": "plain_text",
+          "text": "Select days"
+        },
+        "initial_options": [
+          {
+            "text": {
+              "type": "plain_text",
+              "text": "Monday",
+            },
+            "value": "monday"
+          },
+          {
+            "text": {
+              "type": "plain_text",
+              "text": "Tuesday"
+            },
+            "value": "tuesday"
+          },
+          {
+            "text": {
+              "type": "plain_text",
+              "text": "Wednesday"
+            },
+            "value": "wednesday"
+          },
+          {
+            "text": {
+              "type": "plain_text",
+              "text": "Thursday"
+            },
+            "value": "thursday"
+          },
+          {
+            "text": {
+              "type": "plain_text",
+              "text": "Friday"
+            },
+            "value": "friday"
+          }
+        ],
+        "options": [
+          {
+            "text": {
+              "type": "plain_text",
+              "text": "Monday",
+            },
+            "value": "monday"
+          },
+          {
+            "text": {
+              "type": "plain_text",
+              "text": "Tuesday"
+            },
+            "value": "tuesday"
+          },
+          {
+            "text": {
+              "type": "plain_text",
+              "text": "Wednesday"
+            },
+            "value": "wednesday"
+          },
+          {
+            "text": {
+              "type": "plain_text",
+              "text": "Thursday"
+            },
+            "value": "thursday"
+          },
+          {
+            "text": {
+              "type": "plain_text",
+              "text": "Friday"
+            },
+            "value": "friday"
+          }
+        ]
+      }
+    },
+    {
+      "type": "section",
+      "block_id": "time_to_send",
+      "text": {
+        "type": "mrkdwn",
+        "text": "Time"
+      },
+      "accessory": {
+        "type": "timepicker",
+        "timezone": "America/Los_Angeles",
+        "action_id": "timepicker123",
+        "initial_time": "09:00",
+        "placeholder": {
+          "type": "plain_text",
+          "text": "Select a time"
+        }
+      }
+    }
+  ]
+}
+
+# the settings part of the home tab, below the latest digest
+HOME_SETTINGS_BLOCKS = [
+  {
+    "type": "header",
+    "text": {
+      "type": "plain_text",
+      "text": ":wave: Welcome to Ketchup!"
+    }
+  },
+  {
+    "type": "section",
+    "text": {
+      "type": "plain_text",
+      "text": "Lorem Ipsum is simply dummy text of the printing and typesetting industry. Lorem Ipsum has been the industry's standard dummy text ever since the 1500s, when an unknown printer took a galley of type and scrambled it to make a type specimen book. It has survived not only five centuries, but also the leap into electronic typesetting, remaining essentially unchanged. It was popularised in the 1960s with the release of Letraset sheets containing Lorem Ipsum passages, and more recently with desktop publishing software like Aldus PageMaker including versions of Lorem Ipsum"
+    }
+  },
+  {
+    "type": "header",
+    "text": {
+      "type": "plain_text",
+      "text": "Your Current Settings"
+    }
+  },
+  {
+    "type": "divider"
+  },
+  {
+    "type": "section",
+    "text": {
+      "type": "plain_text",
+      "text": ":white_tick: I want to summarize my Direct messages."
+    }
+  },
+  {
+    "type": "section",
+    "text": {
+      "type": "plain_text",
+      "text": ":white_tick: I want to summarize the messages and threads that I am directly mentioned in."
+    }
+  },
+  {
+    "type": "section",
+    "text": {
+      "type": "plain_text",
+      "text": ":white_tick: I want to summarize the messages and threads that I indirectly mentioned via user groups."
+    }
+  },
+  {
+    "type": "section",
+    "text": {
+      "type": "plain_text",
+      "text": ":white_tick: I want to follow the following channels: #product, #engineering…"
+    }
+  },
+  {
+    "type": "section",
+    "text": {
+      "type": "plain_text",
+      "text": ":white_tick: I want to follow the following teammates: @abc"
+    }
+  },
+  {
+    "type": "section",
+    "text": {
+      "type": "plain_text",
+      "text": ":timer: I will receive the summaries via DM on: \nMonday, Tuesday, Wednesday, Thursday, Friday @ 9:00AM"
+    }
+  },
+  {
+    "type": "actions",
+    "elements": [
+      {
+        "type": "button",
+        "text": {
+          "type": "plain_text",
+          "text": ":gear: Change Settings",
+        },
+        "action_id": "change_settings_open_modal"
+      }
+    ]
+  },
+  {
+    "type": "header",
+    "text": {
+      "type": "plain_text",
+      "text": "Other actions"
+    }
+  },
+  {
+    "type": "actions",
+    "elements": [
+      {
+        "type": "button",
+        "text": {
+          "type": "plain_text",
+          "text": ":heavy_plus_symbol: Invite Teammates",
+        },
+        "action_id": "invite_teammates_open_modal"
+      },
+      {
+        "type": "button",
+        "text": {
+          "type": "plain_text",
+          "text": ":question: Give us Feedback",
+        },
+        "action_id": "give-feedback"
+      }
+    ]
+  }
+]
+
+SETTINGS_MODAL_VIEW_JSON = json.dumps(SETTINGS_MODAL_VIEW)
+HOME_SETTINGS_BLOCKS_JSON = json.dumps(HOME_SETTINGS_BLOCKS)
+HOME_VIEW_JSON = json.dumps({"type": "home", "blocks": HOME_SETTINGS_BLOCKS})
+
+# a home view holds at most 100 blocks, the settings part of it takes the rest
+HOME_TAB_MAX_SUMMARY_BLOCKS = 80
+
+
+def latest_summary_blocks(summary) -> list:
+  """
+  Home tab blocks of the latest stored digest, within Slack's limit of blocks per view.
+  """
+  if summary is None or not summary.blocks:
+    return []
+  blocks = [
+    {
+      "type": "header",
+      "text": {
+        "type": "plain_text",
+        "text": "Your Latest Summary"
+      }
+    },
+    {
+      "type": "context",
+      "elements": [
+        {
+          "type": "mrkdwn",
+          "text": summary.title or summary.created_at.strftime('%B %d, %Y')
+        }
+      ]
+    },
+  ]
+  return blocks + summary.blocks[:HOME_TAB_MAX_SUMMARY_BLOCKS - len(blocks)]
+
+
+def home_view_json(latest_summary=None) -> str:
+  """
+  The home tab view as a JSON string: the latest digest, if any, above the cached settings blocks.
+  """
+  summary_blocks = latest_summary_blocks(latest_summary)
+  if not summary_blocks:
+    return HOME_VIEW_JSON
+  return f'{{"type": "home", "blocks": [{json.dumps(summary_blocks)[1:-1]}, {HOME_SETTINGS_BLOCKS_JSON[1:-1]}]}}'
@@ -0,0 +1,119 @@
+import asyncio
+
+from slack_sdk.errors import SlackApiError
+
+from backend.app.summarizer.slack_rate_limiter import slack_rate_limiter
+from backend.app.summarizer.slack_transport import get_slack_client
+
+MAX_CONCURRENCY = 10
+
+
+class AsyncSlackClient:
+  """
+  `AsyncWebClient` based counterpart of the read methods of `SlackClient`.
+
+  At most `max_concurrency` Slack requests are in flight at once, so callers can
+  gather hundreds of thread and history fetches without flooding the API.
+  Requests go over the pooled connections of the shared Slack transport; run the
+  coroutines with `slack_transport.run_sync`.
+  """
+
+  def __init__(self, user_token, max_concurrency=MAX_CONCURRENCY, base_url=None):
+    self.user_client = get_slack_client(user_token, base_url)
+    self.max_concurrency = max_concurrency
+    self._semaphores = {}
+
+  def _semaphore(self) -> asyncio.Semaphore:
+    # a semaphore is bound to the event loop it is first used on
+    loop = asyncio.get_running_loop()
+    if loop not in self._semaphores:
+      self._semaphores = {loop: asyncio.Semaphore(self.max_concurrency)}
+    return self._semaphores[loop]
+
+  async def _call(self, method, **kwargs):
+    async with self._semaphore():
+      return await slack_rate_limiter.call_async(self.user_client, method, **kwargs)
+
+  async def _iter_pages(self, method, result_key, **kwargs):
+    """
+    Async-iterate over the `result_key` list of every page of a cursor-paginated method.
+    """
+    cursor = None
+
+    while True:
+      if cursor:
+        response = await self._call(method, cursor=cursor, **kwargs)
+      else:
+        response = await self._call(method, **kwargs)
+
+      yield response[result_key]
+
+      if response.get('response_metadata') and response['response_metadata'].get('next_cursor'):
+        cursor = response['response_metadata']['next_cursor']
+      else:
+        break
+
+  async def fetch_recent_messages(self, channel_id, oldest_timestamp):
+    all_messages = []
+    async for page in self._iter_pages('conversations_history', 'messages', channel=channel_id, oldest=oldest_timestamp, limit=1000):
+      all_messages.extend(page)
+    return all_messages
+
+  async def fetch_thread_messages(self, channel_id, thread_ts, oldest=None):
+    kwargs = {'oldest': oldest} if oldest else {}
+    all_messages = []
+    try:
+      async for page in self._iter_pages('conversations_replies', 'messages', channel=channel_id, ts=thread_ts, **kwargs):
+        all_messages.extend(page)
+    except SlackApiError as e:
+      print(f"Error fetching thread messages: {e.response['error']}")
+    return all_messages
+
+  async def get_thread_ts_of_message(self, channel_id, thread_ts):
+    try:
+      response = await self._call('conversations_replies', channel=channel_id, ts=thread_ts)
+    except SlackApiError as e:
+      print(f"Error fetching thread messages: {e.response['error']}")
+      return None
+
+    if len(response['messages']) > 0:
+      return response['messages'][0].get('thread_ts')
+    return None
+
+  async def search_pages(self, query, pages, query_limit=100) -> list:
+    """
+    Fetch several pages of the same search.messages query at once, in page order.
+    """
+    return await asyncio.gather(*[
+      self._call('search_messages', query=query, sort='timestamp', count=query_limit, page=page) for page in pages
+    ])
+
+  async def get_many_thread_ts(self, targets) -> list:
+    """
+    Resolve the thread roots of several (channel_id, ts) pairs at once.
+    """
+    return await asyncio.gather(*[
+      self.get_thread_ts_of_message(channel_id, ts) for channel_id, ts in targets
+    ])
+
+  async def fetch_many_recent_messages(self, channel_ids, oldest_timestamp) -> dict:
+    """
+    Fetch the history of several channels at once, keyed by channel_id.
+    """
+    channel_ids = list(dict.fromkeys(channel_ids))
+    results = await asyncio.gather(*[
+      self.fetch_recent_messages(channel_id, oldest_timestamp) for channel_id in channel_ids
+    ])
+    return dict(zip(channel_ids, results))
+
+  async def fetch_many_thread_messages(self, targets, oldest_by_target=None) -> dict:
+    """
+    Fetch several threads at once, keyed by (channel_id, thread_ts).
+    """
+    targets = list(dict.fromkeys(targets))
+    oldest_by_target = oldest_by_target or {}
+    results = await asyncio.gather(*[
+      self.fetch_thread_messages(channel_id, thread_ts, oldest_by_target.get((channel_id, thread_ts)))
+      for channel_id, thread_ts in targets
+    ])
+    return dict(zip(targets, results))
@@ -0,0 +1,157 @@
+import re
+
+import numpy as np
+
+SIMHASH_BITS = 64
+# fingerprints this many bits apart or closer are near-duplicates
+MAX_HAMMING_DISTANCE = 3
+# the fingerprint is split into MAX_HAMMING_DISTANCE + 1 bands, one of which must match exactly
+SIMHASH_BANDS = MAX_HAMMING_DISTANCE + 1
+SHINGLE_SIZE = 3
+# shorter messages ("ok", "thanks!") are never collapsed
+MIN_DEDUP_WORDS = 4
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# alerts repeat with different numbers, ids and timestamps
+NUMBER_PATTERN = re.compile(r"\d+")
+# numbers of collapsed messages listed next to the kept one
+MAX_NOTED_VALUES = 10
+
+BIT_SHIFTS = np.arange(SIMHASH_BITS, dtype=np.uint64)
+BAND_MASK = (1 << (SIMHASH_BITS // SIMHASH_BANDS)) - 1
+
+
+def shingles(text: str) -> set:
+  words = TOKEN_PATTERN.findall(NUMBER_PATTERN.sub('0', text.lower()))
+  if len(words) < MIN_DEDUP_WORDS:
+    return set()
+  return {" ".join(words[index:index + SHINGLE_SIZE]) for index in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def simhashes(texts) -> list:
+  """
+  64-bit SimHash of the word shingles of each text, or None for texts too short to compare.
+
+  The bits of the shingle hashes of all texts are counted in one batch.
+  """
+  text_shingles = [shingles(text) for text in texts]
+  counts = np.array([len(shingle_set) for shingle_set in text_shingles])
+  # fingerprints only live for one run, so the process-seeded str hash is stable enough
+  hashes = np.array([hash(shingle) for shingle_set in text_shingles for shingle in shingle_set], dtype=np.int64).view(np.uint64)
+  if not len(hashes):
+    return [None] * len(text_shingles)
+  # a bit is set when most of the text's shingle hashes have it set
+  bits = ((hashes[:, None] >> BIT_SHIFTS) & np.uint64(1)).astype(np.uint8)
+  starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+  has_shingles = counts > 0
+  ones = np.add.reduceat(bits, starts[has_shingles], axis=0, dtype=np.int32)
+  fingerprints = np.packbits(ones * 2 > counts[has_shingles, None], axis=1, bitorder='little').view('<u8')[:, 0]
+  result = [None] * len(text_shingles)
+  for index, fingerprint in zip(np.flatnonzero(has_shingles), fingerprints):
+    result[index] = int(fingerprint)
+  return result
+
+
+def hamming_distance(a: int, b: int) -> int:
+  return (a ^ b).bit_count()
+
+
+class MessageDeduplicator:
+  """
+  SimHash-based collapsing of near-duplicate messages across one digest.
+
+  Messages of the same speaker are compared by the SimHash of their word
+  shingles, with numbers normalized, so repeated alerts, standup templates and
+  cross-posted announcements match even when a few words differ. Messages of
+  different speakers are never collapsed. Conversations are visited in prompt
+  priority order, and the first occurrence of a message is kept with a note of
+  how often it was repeated, which numbers the removed ones had instead, and in
+  which other channels it was cross-posted; every later occurrence is removed. Candidates are found through exact matches
+  of fingerprint bands, so each message is only compared with the few that
+  share a band.
+
+  The same message can be part of several conversations, e.g. a thread root in
+  its channel window and in its thread. Those copies are dropped by their
+  (channel_id, ts) before clustering and do not count as repeats.
+  """
+
+  def __init__(self, max_distance: int = MAX_HAMMING_DISTANCE):
+    self.max_distance = max_distance
+    self.collapsed = 0
+    self.duplicates = 0
+
+  def _cluster(self, fingerprints, speakers) -> list:
+    """
+    Index of the first near-duplicate of every fingerprint by the same speaker, its own index if it is the first.
+    """
+    bands = [{} for _ in range(SIMHASH_BANDS)]
+    clusters = []
+    for index, fingerprint in enumerate(fingerprints):
+      cluster = index
+      if fingerprint is not None:
+        keys = [(speakers[index], (fingerprint >> (band * (SIMHASH_BITS // SIMHASH_BANDS))) & BAND_MASK) for band in range(SIMHASH_BANDS)]
+        for band, key in zip(bands, keys):
+          for candidate in band.get(key, ()):
+            if hamming_distance(fingerprint, fingerprints[candidate]) <= self.max_distance:
+              cluster = candidate
+              break
+          if cluster != index:
+            break
+        if cluster == index:
+          for band, key in zip(bands, keys):
+            band.setdefault(key, []).append(index)
+      clusters.append(cluster)
+    return clusters
+
+  def compress(self, conversations) -> list:
+    """
+    Collapse near-duplicates in `conversations`, a list of (channel_id, priority, [(ts, formatted line)]).
+
+    Conversations with a lower priority value are visited first, so the copy that is
+    kept is the one the prompt drops last. Returns the lines of every conversation,
+    in the order of `conversations`.
+    """
+    lines = []
+    seen = set()
+    order = sorted(range(len(conversations)), key=lambda position: conversations[position][1])
+    for position in order:
+      channel_id, _, conversation_lines = conversations[position]
+      for ts, line in conversation_lines:
+        if (channel_id, ts) in seen:
+          self.duplicates += 1
+          continue
+        seen.add((channel_id, ts))
+        lines.append((position, channel_id, line))
+    # formatted lines are "speaker: text"; only the text is compared, among messages of one speaker
+    speakers, texts = zip(*(line.partition(': ')[::2] for _, _, line in lines)) if lines else ((), ())
+    clusters = self._cluster(simhashes(texts), speakers)
+
+    repeats = {}
+    other_values = {}
+    cross_posts = {}
+    for index, ((_, channel_id, _), cluster) in enumerate(zip(lines, clusters)):
+      if channel_id == lines[cluster][1]:
+        repeats[cluster] = repeats.get(cluster, 0) + 1
+      elif channel_id not in cross_posts.setdefault(cluster, []):
+        cross_posts[cluster].append(channel_id)
+      if cluster != index:
+        # numbers are normalized for matching, so keep the ones that differ from the kept message
+        kept_values = other_values.setdefault(cluster, {value: False for value in NUMBER_PATTERN.findall(texts[cluster])})
+        for value in NUMBER_PATTERN.findall(texts[index]):
+          kept_values.setdefault(value, True)
+
+    compressed = [[] for _ in conversations]
+    for index, ((position, _, line), cluster) in enumerate(zip(lines, clusters)):
+      if cluster != index:
+        self.collapsed += 1
+        continue
+      notes = []
+      if repeats[index] > 1:
+        notes.append(f"posted {repeats[index]} times with small differences")
+      values = [value for value, is_other in other_values.get(index, {}).items() if is_other]
+      if values:
+        notes.append("other values " + ", ".join(values[:MAX_NOTED_VALUES]) + (", ..." if len(values) > MAX_NOTED_VALUES else ""))
+      if cross_posts.get(index):
+        notes.append("also in " + ", ".join(f"<#{channel_id}>" for channel_id in cross_posts[index]))
+      compressed[position].append(f"{line} ({'; '.join(notes)})" if notes else line)
+    return compressed
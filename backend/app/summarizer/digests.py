@@ -0,0 +1,36 @@
+from sqlmodel import select
+
+from backend.app.models.summary import Summary
+from backend.app.models.user import User
+
+
+class DigestStore:
+  """
+  Generated digests of users, kept in the `summaries` table.
+
+  Every digest is stored with its Block Kit rendering, so re-sending it or
+  showing it on the home tab is a single read of the (user_id, created_at)
+  index instead of another Slack crawl and LLM call.
+  """
+
+  def __init__(self, db):
+    self.db = db
+
+  def save(self, slack_user_id: str, title: str, content: dict, blocks: list) -> Summary:
+    user_id = self.db.scalars(select(User.id).filter_by(slack_user_id=slack_user_id)).first()
+    if user_id is None:
+      print(f"Not storing the digest of unknown user {slack_user_id}")
+      return None
+    summary = Summary(user_id=user_id, title=title, content=content, blocks=blocks)
+    self.db.add(summary)
+    self.db.commit()
+    return summary
+
+  def latest(self, slack_user_id: str) -> Summary:
+    return self.db.scalars(
+      select(Summary)
+      .join(User, User.id == Summary.user_id)
+      .where(User.slack_user_id == slack_user_id)
+      .order_by(Summary.created_at.desc())
+      .limit(1)
+    ).first()
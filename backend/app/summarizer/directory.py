@@ -0,0 +1,103 @@
+class SlackDirectory:
+  """
+  In-memory index of the users and user groups of a Slack workspace.
+
+  Built once from the results of `users.list` and `usergroups.list` so that
+  every lookup made while summarizing is a dict or set access instead of a
+  scan over all workspace members.
+  """
+
+  def __init__(self, users: list, user_groups: list):
+    self.users = users
+    self.user_groups = user_groups
+    self._build_indexes()
+
+  def _build_indexes(self):
+    self.users_by_id = {}
+    self.users_by_name = {}
+    self.users_by_display_name = {}
+    self.bot_user_ids = set()
+    for user in self.users:
+      self._index_user(user)
+
+    self.user_groups_by_id = {}
+    self.user_groups_by_member = {}
+    for group in self.user_groups:
+      self._index_user_group(group)
+
+  def _index_user(self, user: dict):
+    user_id = user['id']
+    self.users_by_id[user_id] = user
+    # keep the first user seen for a name, as the previous linear scans did
+    if user.get('name'):
+      self.users_by_name.setdefault(user['name'], user)
+    display_name = user.get('profile', {}).get('display_name')
+    if display_name:
+      self.users_by_display_name.setdefault(display_name, user)
+    if user.get('is_bot', False):
+      self.bot_user_ids.add(user_id)
+
+  def _unindex_user(self, user: dict):
+    if self.users_by_name.get(user.get('name')) is user:
+      del self.users_by_name[user['name']]
+    display_name = user.get('profile', {}).get('display_name')
+    if self.users_by_display_name.get(display_name) is user:
+      del self.users_by_display_name[display_name]
+    self.bot_user_ids.discard(user['id'])
+
+  def _index_user_group(self, group: dict):
+    self.user_groups_by_id[group['id']] = group
+    for member_id in group.get('users', []):
+      self.user_groups_by_member.setdefault(member_id, []).append(group)
+
+  def _unindex_user_group(self, group: dict):
+    for member_id in group.get('users', []):
+      groups = self.user_groups_by_member.get(member_id, [])
+      self.user_groups_by_member[member_id] = [g for g in groups if g is not group]
+
+  def upsert_user(self, user: dict):
+    """
+    Add or replace a single user, e.g. from a `user_change` or `team_join` event.
+    """
+    previous = self.users_by_id.get(user['id'])
+    if previous is not None:
+      self._unindex_user(previous)
+      self.users[self.users.index(previous)] = user
+    else:
+      self.users.append(user)
+    self._index_user(user)
+
+  def upsert_user_group(self, group: dict):
+    """
+    Add or replace a single user group, e.g. from a `subteam_updated` event.
+    """
+    previous = self.user_groups_by_id.get(group['id'])
+    if previous is not None:
+      self._unindex_user_group(previous)
+      self.user_groups[self.user_groups.index(previous)] = group
+    else:
+      self.user_groups.append(group)
+    self._index_user_group(group)
+
+  def get_user(self, user_id: str):
+    return self.users_by_id.get(user_id)
+
+  def get_user_by_name(self, name: str):
+    return self.users_by_name.get(name)
+
+  def get_user_id_by_name(self, name: str) -> str:
+    user = self.users_by_display_name.get(name) or self.users_by_name.get(name)
+    return user['id'] if user else None
+
+  def get_user_name(self, user_id: str) -> str:
+    user = self.users_by_id.get(user_id)
+    return user['profile']['display_name_normalized'] if user else None
+
+  def is_bot_user(self, user_id: str) -> bool:
+    return user_id in self.bot_user_ids
+
+  def is_known_human(self, user_id: str) -> bool:
+    return user_id in self.users_by_id and user_id not in self.bot_user_ids
+
+  def find_user_groups_for_user(self, user_id: str) -> list:
+    return list(self.user_groups_by_member.get(user_id, []))
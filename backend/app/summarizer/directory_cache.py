@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta
+from typing import Callable
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import select
+
+from backend.app.models.slack_directory import SlackDirectoryEntry, SlackDirectorySnapshot
+from backend.app.summarizer.directory import SlackDirectory
+
+DIRECTORY_TTL = timedelta(hours=12)
+# entries changed this long before the last one seen are read again, in case clocks of processes differ
+DIRECTORY_CHANGE_OVERLAP = timedelta(minutes=1)
+
+USER_KIND = 'user'
+USER_GROUP_KIND = 'user_group'
+
+# team_id -> (SlackDirectory, fetched_at, synced_at), shared by every summary run in this process;
+# synced_at is the newest entry updated_at applied to the directory
+_team_directories = {}
+
+
+class TeamDirectoryCache:
+  """
+  Team-scoped cache of the Slack user directory, persisted in Postgres.
+
+  A full `users.list` / `usergroups.list` crawl only happens when the team has no
+  snapshot or the snapshot is older than the TTL. In between, `user_change`,
+  `team_join` and `subteam_updated` events keep the snapshot current.
+
+  Events are handled by the web process, so other processes apply the entries
+  updated since their last look to their in-process copy on every `get`, and load
+  the snapshot again once another process crawled a newer one.
+  """
+
+  def __init__(self, db, team_id: str, ttl: timedelta = DIRECTORY_TTL):
+    self.db = db
+    self.team_id = team_id
+    self.ttl = ttl
+
+  def get(self, crawl: Callable[[], SlackDirectory]) -> SlackDirectory:
+    cached = _team_directories.get(self.team_id)
+    snapshot = self.db.get(SlackDirectorySnapshot, self.team_id)
+    if cached and not self._is_expired(cached[1]) and (snapshot is None or snapshot.fetched_at <= cached[1]):
+      return self._apply_changes(*cached)
+
+    if snapshot and not self._is_expired(snapshot.fetched_at):
+      directory, synced_at = self._load(snapshot.fetched_at)
+      _team_directories[self.team_id] = (directory, snapshot.fetched_at, synced_at)
+      return directory
+
+    print(f"Directory cache miss for team {self.team_id}, crawling users and user groups")
+    directory = crawl()
+    self._save(directory)
+    return directory
+
+  def apply_user(self, user: dict):
+    self._upsert_entry(USER_KIND, user['id'], user)
+    cached = _team_directories.get(self.team_id)
+    if cached:
+      cached[0].upsert_user(user)
+
+  def apply_user_group(self, group: dict):
+    self._upsert_entry(USER_GROUP_KIND, group['id'], group)
+    cached = _team_directories.get(self.team_id)
+    if cached:
+      cached[0].upsert_user_group(group)
+
+  def _is_expired(self, fetched_at: datetime) -> bool:
+    return datetime.now() - fetched_at > self.ttl
+
+  def _load(self, fetched_at: datetime):
+    """
+    The directory of the stored entries and the newest updated_at among them and `fetched_at`.
+    """
+    statement = select(SlackDirectoryEntry).filter_by(team_id=self.team_id)
+    users = []
+    user_groups = []
+    synced_at = fetched_at
+    for entry in self.db.scalars(statement):
+      if entry.kind == USER_KIND:
+        users.append(entry.data)
+      else:
+        user_groups.append(entry.data)
+      synced_at = max(synced_at, entry.updated_at)
+    return SlackDirectory(users, user_groups), synced_at
+
+  def _apply_changes(self, directory: SlackDirectory, fetched_at: datetime, synced_at: datetime) -> SlackDirectory:
+    """
+    Apply the entries other processes updated since `synced_at` to the in-process directory.
+    """
+    statement = select(SlackDirectoryEntry).where(
+      SlackDirectoryEntry.team_id == self.team_id,
+      SlackDirectoryEntry.updated_at > synced_at - DIRECTORY_CHANGE_OVERLAP,
+    )
+    for entry in self.db.scalars(statement):
+      if entry.kind == USER_KIND:
+        directory.upsert_user(entry.data)
+      else:
+        directory.upsert_user_group(entry.data)
+      synced_at = max(synced_at, entry.updated_at)
+    _team_directories[self.team_id] = (directory, fetched_at, synced_at)
+    return directory
+
+  def _save(self, directory: SlackDirectory):
+    now = datetime.now()
+    self.db.execute(delete(SlackDirectoryEntry).where(SlackDirectoryEntry.team_id == self.team_id))
+    rows = [
+      {'team_id': self.team_id, 'kind': USER_KIND, 'entry_id': user['id'], 'data': user, 'updated_at': now}
+      for user in directory.users
+    ] + [
+      {'team_id': self.team_id, 'kind': USER_GROUP_KIND, 'entry_id': group['id'], 'data': group, 'updated_at': now}
+      for group in directory.user_groups
+    ]
+    if rows:
+      self.db.execute(insert(SlackDirectoryEntry), rows)
+    self.db.merge(SlackDirectorySnapshot(team_id=self.team_id, fetched_at=now))
+    self.db.commit()
+    _team_directories[self.team_id] = (directory, now, now)
+
+  def _upsert_entry(self, kind: str, entry_id: str, data: dict):
+    now = datetime.now()
+    statement = insert(SlackDirectoryEntry).values(
+      team_id=self.team_id, kind=kind, entry_id=entry_id, data=data, updated_at=now
+    ).on_conflict_do_update(
+      index_elements=['team_id', 'kind', 'entry_id'],
+      set_={'data': data, 'updated_at': now},
+    )
+    self.db.execute(statement)
+    self.db.commit()
@@ -0,0 +1,322 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, delete, func, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+
+from backend.app.dependencies.database import SyncSessionLocal
+from backend.app.models.slack_message import SlackChannelWatermark, SlackMessage, SlackThreadState
+from backend.app.summarizer.message_mirror import format_ts, message_row
+
+INGEST_BATCH_SIZE = 500
+# events kept for another try after failed flushes; beyond this they are dropped
+INGEST_MAX_BACKLOG = 20 * INGEST_BATCH_SIZE
+INGEST_FLUSH_INTERVAL = 2.0
+# how often quiet channels covered by the event stream are marked fresh
+INGEST_HEARTBEAT_INTERVAL = 60.0
+# a channel without an event for this long is no longer trusted to be covered by the stream
+INGEST_LIVE_WINDOW = 60 * 60.0
+# the stream keeps a watermark fresh for at most this long after conversations.history was last called
+INGEST_RESYNC_INTERVAL = timedelta(hours=24)
+
+# updated_at of an invalidated watermark: never fresh, never contiguous with any stream
+STALE_WATERMARK = datetime(1970, 1, 1)
+
+# message subtypes that are not conversation content
+IGNORED_SUBTYPES = {'channel_join', 'channel_leave', 'message_replied'}
+
+_DELETED = object()
+
+
+class MessageIngestBuffer:
+  """
+  Write-behind buffer that stores `message` events from the Events API in `slack_messages`.
+
+  Events are coalesced per (team, channel, ts) in memory and written in one batched
+  upsert by a background thread every `flush_interval` seconds, or as soon as
+  `batch_size` events are waiting, so the Bolt handler never waits on Postgres. Channel watermarks and thread states are only advanced when
+  the mirror was last synced after this process started receiving events, so no message
+  in between can have been missed. Advancing them also marks them as fresh, and the
+  summarizer then reads those channels locally instead of calling conversations.history.
+
+  Channels that delivered an event to this process within `INGEST_LIVE_WINDOW` are covered
+  by the stream, so every `INGEST_HEARTBEAT_INTERVAL` seconds their contiguous watermarks
+  are marked fresh as well. A quiet channel then stays readable from the mirror without any
+  history call. Events can stop without notice, e.g. when the app is removed from a channel,
+  so neither events nor the heartbeat keep a watermark fresh longer than
+  `INGEST_RESYNC_INTERVAL` after the mirror last synced it from conversations.history.
+
+  Events dropped after failed flushes invalidate their channels in the database: the
+  watermark is rewound before the oldest lost message and marked stale, and the thread
+  states are deleted. No process, whichever received the other events, treats those
+  channels as contiguous again until the mirror has refetched them.
+  """
+
+  def __init__(self, session_factory=SyncSessionLocal, batch_size=INGEST_BATCH_SIZE, flush_interval=INGEST_FLUSH_INTERVAL):
+    self.session_factory = session_factory
+    self.batch_size = batch_size
+    self.flush_interval = flush_interval
+    self.started_at = datetime.now()
+    self._lock = threading.Lock()
+    self._pending = 0
+    self._messages = {}
+    self._replies = {}
+    # (team_id, channel_id) -> oldest ts lost in a dropped flush, not yet invalidated in the database
+    self._lost_channels = {}
+    # (team_id, channel_id, thread_ts) of threads that lost replies
+    self._lost_threads = set()
+    # (team_id, channel_id) -> monotonic time of the last event this process received for it
+    self._live_channels = {}
+    self._heartbeat_at = time.monotonic()
+    self._flusher = None
+    self._stopped = threading.Event()
+    # set when a full batch is waiting, so the flusher thread writes it without waiting for the interval
+    self._flush_requested = threading.Event()
+    # one flush at a time, so batches are committed in the order they were taken
+    self._flush_lock = threading.Lock()
+
+  def add_event(self, team_id: str, event: dict):
+    subtype = event.get('subtype')
+    if subtype in IGNORED_SUBTYPES:
+      return
+
+    channel_id = event['channel']
+    with self._lock:
+      self._live_channels[(team_id, channel_id)] = time.monotonic()
+      if subtype == 'message_changed':
+        self._messages[(team_id, channel_id, event['message']['ts'])] = event['message']
+      elif subtype == 'message_deleted':
+        self._messages[(team_id, channel_id, event['deleted_ts'])] = _DELETED
+      else:
+        self._messages[(team_id, channel_id, event['ts'])] = event
+        thread_ts = event.get('thread_ts')
+        if thread_ts and thread_ts != event['ts']:
+          latest_reply, count = self._replies.get((team_id, channel_id, thread_ts), ('', 0))
+          self._replies[(team_id, channel_id, thread_ts)] = (max(latest_reply, event['ts']), count + 1)
+      self._pending += 1
+      should_flush = self._pending >= self.batch_size
+
+    self._ensure_flusher()
+    if should_flush:
+      self._flush_requested.set()
+
+  def flush(self):
+    with self._flush_lock:
+      self._flush()
+
+  def _flush(self):
+    if self._lost_channels or self._lost_threads:
+      self.invalidate_lost()
+    with self._lock:
+      messages, self._messages = self._messages, {}
+      replies, self._replies = self._replies, {}
+      self._pending = 0
+    if not messages and not replies:
+      return
+
+    now = datetime.now()
+    rows = []
+    deleted = []
+    newest_by_channel = {}
+    for (team_id, channel_id, ts), message in messages.items():
+      if message is _DELETED:
+        deleted.append((team_id, channel_id, ts))
+        continue
+      rows.append(message_row(team_id, channel_id, message, now))
+      key = (team_id, channel_id)
+      newest_by_channel[key] = max(newest_by_channel.get(key, ''), ts)
+
+    db = self.session_factory()
+    try:
+      if rows:
+        statement = insert(SlackMessage)
+        statement = statement.on_conflict_do_update(
+          index_elements=['team_id', 'channel_id', 'ts'],
+          set_={
+            column: statement.excluded[column]
+            for column in ('thread_ts', 'user', 'bot_id', 'subtype', 'text', 'updated_at')
+          },
+        )
+        db.execute(statement, rows)
+
+      if deleted:
+        db.execute(delete(SlackMessage).where(
+          tuple_(SlackMessage.team_id, SlackMessage.channel_id, SlackMessage.ts).in_(deleted)
+        ))
+
+      if replies:
+        messages_table = SlackMessage.__table__
+        db.execute(
+          update(messages_table).where(
+            messages_table.c.team_id == bindparam('b_team_id'),
+            messages_table.c.channel_id == bindparam('b_channel_id'),
+            messages_table.c.ts == bindparam('b_thread_ts'),
+          ).values(
+            latest_reply=func.greatest(func.coalesce(messages_table.c.latest_reply, ''), bindparam('b_latest_reply')),
+            reply_count=func.coalesce(messages_table.c.reply_count, 0) + bindparam('b_count'),
+          ),
+          [
+            {'b_team_id': team_id, 'b_channel_id': channel_id, 'b_thread_ts': thread_ts, 'b_latest_reply': latest_reply, 'b_count': count}
+            for (team_id, channel_id, thread_ts), (latest_reply, count) in replies.items()
+          ],
+        )
+        thread_states_table = SlackThreadState.__table__
+        db.execute(
+          update(thread_states_table).where(
+            thread_states_table.c.team_id == bindparam('b_team_id'),
+            thread_states_table.c.channel_id == bindparam('b_channel_id'),
+            thread_states_table.c.thread_ts == bindparam('b_thread_ts'),
+            thread_states_table.c.synced_at >= self.started_at,
+          ).values(
+            latest_reply=func.greatest(func.coalesce(thread_states_table.c.latest_reply, ''), bindparam('b_latest_reply')),
+            synced_at=now,
+          ),
+          [
+            {'b_team_id': team_id, 'b_channel_id': channel_id, 'b_thread_ts': thread_ts, 'b_latest_reply': latest_reply}
+            for (team_id, channel_id, thread_ts), (latest_reply, _) in replies.items()
+          ],
+        )
+
+      if newest_by_channel:
+        watermarks_table = SlackChannelWatermark.__table__
+        db.execute(
+          update(watermarks_table).where(
+            watermarks_table.c.team_id == bindparam('b_team_id'),
+            watermarks_table.c.channel_id == bindparam('b_channel_id'),
+            watermarks_table.c.updated_at >= self.started_at,
+            watermarks_table.c.synced_at >= now - INGEST_RESYNC_INTERVAL,
+          ).values(
+            high_water_ts=func.greatest(watermarks_table.c.high_water_ts, bindparam('b_high_water_ts')),
+            updated_at=now,
+          ),
+          [
+            {'b_team_id': team_id, 'b_channel_id': channel_id, 'b_high_water_ts': ts}
+            for (team_id, channel_id), ts in newest_by_channel.items()
+          ],
+        )
+
+      db.commit()
+    except Exception as e:
+      db.rollback()
+      print(f"Error flushing {len(messages)} ingested messages: {e}")
+      self._requeue(messages, replies)
+    finally:
+      db.close()
+
+  def _requeue(self, messages: dict, replies: dict):
+    """
+    Put the events of a failed flush back, behind any newer event for the same message.
+    """
+    with self._lock:
+      if self._pending + len(messages) > INGEST_MAX_BACKLOG:
+        print(f"Dropping {len(messages)} ingested messages after repeated flush errors")
+        for (team_id, channel_id, ts), message in messages.items():
+          key = (team_id, channel_id)
+          self._lost_channels[key] = min(self._lost_channels.get(key, ts), ts)
+          thread_ts = message.get('thread_ts') if message is not _DELETED else None
+          if thread_ts:
+            self._lost_threads.add((team_id, channel_id, thread_ts))
+        self._lost_threads.update(replies)
+        return
+      for key, message in messages.items():
+        self._messages.setdefault(key, message)
+      for key, (latest_reply, count) in replies.items():
+        newer_latest_reply, newer_count = self._replies.get(key, ('', 0))
+        self._replies[key] = (max(latest_reply, newer_latest_reply), count + newer_count)
+      self._pending += len(messages)
+
+  def invalidate_lost(self):
+    """
+    Invalidate the watermarks and thread states of dropped events, or keep them for the next flush.
+    """
+    with self._lock:
+      lost_channels, self._lost_channels = self._lost_channels, {}
+      lost_threads, self._lost_threads = self._lost_threads, set()
+
+    db = self.session_factory()
+    try:
+      if lost_channels:
+        watermarks_table = SlackChannelWatermark.__table__
+        db.execute(
+          update(watermarks_table).where(
+            watermarks_table.c.team_id == bindparam('b_team_id'),
+            watermarks_table.c.channel_id == bindparam('b_channel_id'),
+          ).values(
+            high_water_ts=func.least(watermarks_table.c.high_water_ts, bindparam('b_high_water_ts')),
+            updated_at=STALE_WATERMARK,
+          ),
+          [
+            # conversations.history excludes `oldest`, so rewind to just before the lost message
+            {'b_team_id': team_id, 'b_channel_id': channel_id, 'b_high_water_ts': format_ts(float(ts) - 0.000001)}
+            for (team_id, channel_id), ts in lost_channels.items()
+          ],
+        )
+      if lost_threads:
+        db.execute(delete(SlackThreadState).where(
+          tuple_(SlackThreadState.team_id, SlackThreadState.channel_id, SlackThreadState.thread_ts).in_(list(lost_threads))
+        ))
+      db.commit()
+    except Exception as e:
+      db.rollback()
+      print(f"Error invalidating {len(lost_channels)} channels with lost messages: {e}")
+      with self._lock:
+        for key, ts in lost_channels.items():
+          self._lost_channels[key] = min(self._lost_channels.get(key, ts), ts)
+        self._lost_threads.update(lost_threads)
+    finally:
+      db.close()
+
+  def heartbeat(self):
+    """
+    Mark the contiguous watermarks of every channel covered by the event stream as fresh.
+    """
+    live_after = time.monotonic() - INGEST_LIVE_WINDOW
+    with self._lock:
+      self._live_channels = {channel: event_at for channel, event_at in self._live_channels.items() if event_at >= live_after}
+      live_channels = list(self._live_channels)
+    if not live_channels:
+      return
+
+    now = datetime.now()
+    db = self.session_factory()
+    try:
+      db.execute(
+        update(SlackChannelWatermark).where(
+          tuple_(SlackChannelWatermark.team_id, SlackChannelWatermark.channel_id).in_(live_channels),
+          SlackChannelWatermark.updated_at >= self.started_at,
+          SlackChannelWatermark.synced_at >= now - INGEST_RESYNC_INTERVAL,
+        ).values(updated_at=now)
+      )
+      db.commit()
+    except Exception as e:
+      db.rollback()
+      print(f"Error refreshing {len(live_channels)} channel watermarks: {e}")
+    finally:
+      db.close()
+
+  def _ensure_flusher(self):
+    if self._flusher is not None:
+      return
+    with self._lock:
+      if self._flusher is None:
+        self._flusher = threading.Thread(target=self._run_flusher, name="message-ingest-flusher", daemon=True)
+        self._flusher.start()
+
+  def _run_flusher(self):
+    while not self._stopped.is_set():
+      self._flush_requested.wait(self.flush_interval)
+      self._flush_requested.clear()
+      self.flush()
+      if time.monotonic() - self._heartbeat_at >= INGEST_HEARTBEAT_INTERVAL:
+        self._heartbeat_at = time.monotonic()
+        self.heartbeat()
+
+  def close(self):
+    self._stopped.set()
+    self._flush_requested.set()
+    self.flush()
+
+
+# process-wide buffer fed by the Bolt `message` event handler
+message_ingest_buffer = MessageIngestBuffer()
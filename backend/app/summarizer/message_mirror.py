@@ -0,0 +1,250 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import select
+
+from backend.app.models.slack_message import SlackChannelWatermark, SlackMessage, SlackThreadState
+from backend.app.summarizer.slack import SlackClient
+from backend.app.summarizer.slack_transport import run_sync
+
+# a channel synced this recently is served from the mirror without asking Slack,
+# so every user of a team summarized in the same run shares one crawl
+MIRROR_FRESHNESS = timedelta(minutes=10)
+# threads whose parent did not show a newer latest_reply are still re-checked this often
+THREAD_REFRESH_INTERVAL = timedelta(hours=1)
+
+MESSAGE_FIELDS = ('user', 'bot_id', 'subtype', 'thread_ts', 'reply_count', 'latest_reply')
+
+
+def format_ts(timestamp) -> str:
+  return f"{float(timestamp):.6f}"
+
+
+def message_row(team_id: str, channel_id: str, message: dict, updated_at: datetime) -> dict:
+  thread_ts = message.get('thread_ts')
+  return {
+    'team_id': team_id,
+    'channel_id': channel_id,
+    'ts': message['ts'],
+    'thread_ts': thread_ts,
+    'is_reply': thread_ts is not None and thread_ts != message['ts'] and message.get('subtype') != 'thread_broadcast',
+    'user': message.get('user'),
+    'bot_id': message.get('bot_id'),
+    'subtype': message.get('subtype'),
+    'text': message.get('text') or '',
+    'reply_count': message.get('reply_count'),
+    'latest_reply': message.get('latest_reply'),
+    'updated_at': updated_at,
+  }
+
+
+def row_to_message(row: SlackMessage) -> dict:
+  message = {'type': 'message', 'ts': row.ts, 'text': row.text}
+  for field in MESSAGE_FIELDS:
+    value = getattr(row, field)
+    if value is not None:
+      message[field] = value
+  return message
+
+
+class ChannelHistoryMirror:
+  """
+  Local Postgres mirror of channel history in front of a `SlackClient`.
+
+  Each channel keeps a high-water `ts`, so a fetch only pulls messages newer than
+  the mark from `conversations.history` and serves the rest of the window locally.
+  Threads are only fetched again when their parent reports a newer `latest_reply`.
+  Exposes the same fetch methods as `SlackClient`, so the summarizer can use either.
+
+  The mirror is shared by the whole team, so it only serves conversations the user
+  is a member of. Everything else is fetched from Slack with the user's own token,
+  which lets Slack decide what the user may read.
+  """
+
+  def __init__(self, db, team_id: str, slack_client: SlackClient):
+    self.db = db
+    self.team_id = team_id
+    self.slack_client = slack_client
+
+  def fetch_recent_messages(self, channel_id, oldest_timestamp):
+    return self.fetch_many_recent_messages([channel_id], oldest_timestamp)[channel_id]
+
+  def fetch_many_recent_messages(self, channel_ids, oldest_timestamp) -> dict:
+    channel_ids = list(dict.fromkeys(channel_ids))
+    member_channel_ids = self.slack_client.fetch_member_channel_ids()
+    mirrored = [channel_id for channel_id in channel_ids if channel_id in member_channel_ids]
+    others = [channel_id for channel_id in channel_ids if channel_id not in member_channel_ids]
+
+    oldest = format_ts(oldest_timestamp)
+    channel_messages = {}
+    if mirrored:
+      self._sync_channels(mirrored, oldest)
+      channel_messages = {channel_id: self._load_channel(channel_id, oldest) for channel_id in mirrored}
+    if others:
+      channel_messages.update(self.slack_client.fetch_many_recent_messages(others, oldest_timestamp))
+    return {channel_id: channel_messages[channel_id] for channel_id in channel_ids}
+
+  def probe_channel_activity(self, channel_ids, oldest_timestamp) -> dict:
+    """
+    Latest known message ts of the channels whose fresh watermark covers the window, without calling Slack.
+    """
+    member_channel_ids = self.slack_client.fetch_member_channel_ids()
+    channel_ids = [channel_id for channel_id in channel_ids if channel_id in member_channel_ids]
+    if not channel_ids:
+      return {}
+    oldest = format_ts(oldest_timestamp)
+    fresh_after = datetime.now() - MIRROR_FRESHNESS
+    watermarks = self.db.scalars(select(SlackChannelWatermark).where(
+      SlackChannelWatermark.team_id == self.team_id,
+      SlackChannelWatermark.channel_id.in_(channel_ids),
+      SlackChannelWatermark.covered_from_ts <= oldest,
+      SlackChannelWatermark.updated_at >= fresh_after,
+    ))
+    return {watermark.channel_id: watermark.high_water_ts for watermark in watermarks}
+
+  def fetch_thread_messages(self, channel_id, thread_ts):
+    return self.fetch_many_thread_messages([(channel_id, thread_ts)])[(channel_id, thread_ts)]
+
+  def fetch_many_thread_messages(self, targets) -> dict:
+    targets = list(dict.fromkeys(targets))
+    member_channel_ids = self.slack_client.fetch_member_channel_ids()
+    mirrored = [target for target in targets if target[0] in member_channel_ids]
+    others = [target for target in targets if target[0] not in member_channel_ids]
+
+    thread_messages = {}
+    if mirrored:
+      self._sync_threads(mirrored)
+      thread_messages = self._load_threads(mirrored)
+    if others:
+      thread_messages.update(self.slack_client.fetch_many_thread_messages(others))
+    return {target: thread_messages[target] for target in targets}
+
+  def _sync_channels(self, channel_ids, oldest: str):
+    watermarks = {
+      watermark.channel_id: watermark
+      for watermark in self.db.scalars(select(SlackChannelWatermark).where(
+        SlackChannelWatermark.team_id == self.team_id,
+        SlackChannelWatermark.channel_id.in_(channel_ids),
+      ))
+    }
+
+    now = datetime.now()
+    fetch_from = {}
+    for channel_id in channel_ids:
+      watermark = watermarks.get(channel_id)
+      if watermark is None or watermark.covered_from_ts > oldest:
+        fetch_from[channel_id] = oldest
+      elif now - watermark.updated_at > MIRROR_FRESHNESS:
+        fetch_from[channel_id] = watermark.high_water_ts
+
+    if not fetch_from:
+      return
+
+    async_client = self.slack_client.async_client
+
+    async def fetch_all():
+      return await asyncio.gather(*[
+        async_client.fetch_recent_messages(channel_id, channel_oldest) for channel_id, channel_oldest in fetch_from.items()
+      ])
+
+    results = run_sync(fetch_all())
+    rows = []
+    for (channel_id, channel_oldest), messages in zip(fetch_from.items(), results):
+      rows.extend(message_row(self.team_id, channel_id, message, now) for message in messages)
+      watermark = watermarks.get(channel_id)
+      high_water_ts = max([channel_oldest] + [message['ts'] for message in messages])
+      if watermark is None:
+        watermark = SlackChannelWatermark(team_id=self.team_id, channel_id=channel_id, covered_from_ts=channel_oldest, high_water_ts=high_water_ts)
+      else:
+        watermark.covered_from_ts = min(watermark.covered_from_ts, channel_oldest)
+        watermark.high_water_ts = max(watermark.high_water_ts, high_water_ts)
+      watermark.updated_at = now
+      watermark.synced_at = now
+      self.db.add(watermark)
+
+    self._upsert_messages(rows)
+    self.db.commit()
+    print(f"Mirror synced {len(fetch_from)} of {len(channel_ids)} channels ({len(rows)} new messages)")
+
+  def _sync_threads(self, targets):
+    states = {
+      (state.channel_id, state.thread_ts): state
+      for state in self.db.scalars(select(SlackThreadState).where(
+        SlackThreadState.team_id == self.team_id,
+        tuple_(SlackThreadState.channel_id, SlackThreadState.thread_ts).in_(targets),
+      ))
+    }
+    parents = {
+      (parent.channel_id, parent.ts): parent
+      for parent in self.db.scalars(select(SlackMessage).where(
+        SlackMessage.team_id == self.team_id,
+        tuple_(SlackMessage.channel_id, SlackMessage.ts).in_(targets),
+      ))
+    }
+
+    now = datetime.now()
+    to_fetch = []
+    oldest_by_target = {}
+    for target in targets:
+      state = states.get(target)
+      if state is None:
+        to_fetch.append(target)
+        continue
+      parent = parents.get(target)
+      has_new_replies = parent is not None and (parent.latest_reply or '') > (state.latest_reply or '')
+      if has_new_replies or now - state.synced_at > THREAD_REFRESH_INTERVAL:
+        to_fetch.append(target)
+        if state.latest_reply:
+          oldest_by_target[target] = state.latest_reply
+
+    if not to_fetch:
+      return
+
+    thread_messages = self.slack_client.fetch_many_thread_messages(to_fetch, oldest_by_target)
+    rows = []
+    for (channel_id, thread_ts), messages in thread_messages.items():
+      rows.extend(message_row(self.team_id, channel_id, message, now) for message in messages)
+      state = states.get((channel_id, thread_ts)) or SlackThreadState(team_id=self.team_id, channel_id=channel_id, thread_ts=thread_ts)
+      state.latest_reply = max([state.latest_reply or ''] + [message['ts'] for message in messages]) or None
+      state.synced_at = now
+      self.db.add(state)
+
+    self._upsert_messages(rows)
+    self.db.commit()
+    print(f"Mirror synced {len(to_fetch)} of {len(targets)} threads")
+
+  def _upsert_messages(self, rows):
+    if not rows:
+      return
+    # the same message can come back from both history and replies in one batch
+    rows = list({(row['channel_id'], row['ts']): row for row in rows}.values())
+    statement = insert(SlackMessage)
+    statement = statement.on_conflict_do_update(
+      index_elements=['team_id', 'channel_id', 'ts'],
+      set_={
+        column: statement.excluded[column]
+        for column in ('thread_ts', 'user', 'bot_id', 'subtype', 'text', 'reply_count', 'latest_reply', 'updated_at')
+      },
+    )
+    self.db.execute(statement, rows)
+
+  def _load_channel(self, channel_id, oldest: str):
+    statement = select(SlackMessage).where(
+      SlackMessage.team_id == self.team_id,
+      SlackMessage.channel_id == channel_id,
+      SlackMessage.ts > oldest,
+      SlackMessage.is_reply == False,
+    ).order_by(SlackMessage.ts.desc())
+    return [row_to_message(row) for row in self.db.scalars(statement)]
+
+  def _load_threads(self, targets) -> dict:
+    statement = select(SlackMessage).where(
+      SlackMessage.team_id == self.team_id,
+      tuple_(SlackMessage.channel_id, SlackMessage.thread_ts).in_(targets),
+    ).order_by(SlackMessage.ts)
+    thread_messages = {target: [] for target in targets}
+    for row in self.db.scalars(statement):
+      thread_messages[(row.channel_id, row.thread_ts)].append(row_to_message(row))
+    return thread_messages
@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI
 import re
 
@@ -5,11 +6,51 @@ TEMPERATURE = 0.3
 CHAT_MODEL = "gpt-4o-mini"
 DEBUG = True
 MAX_BODY_TOKENS = 3000
+# budget of one reduce call, which only sees the topics of the partial summaries
+MAX_REDUCE_TOKENS = 12000
+# chunk summaries in flight at once
+MAP_CONCURRENCY = 8
+# bump when the conversation prompt changes, so cached conversation summaries are not reused
+CONVERSATION_PROMPT_VERSION = "2"
+
+CHAT_LOG_FORMAT = "\n".join([
+    'The chat log format consists of firstly a h1 header that represents the start of a Slack DM, Slack DM thread, Slack thread or a Slack channel followed by the chat log which consists of one line per message in the format "Speaker: Message".',
+    "The h1 header also consists of important metadata information that is to be used.",
+    'Users are represented by IDs that start with U followed by alphanumeric characters. An example is "U01L15W16EP".',
+    'Subteams are represented by IDs that start with S followed by alphanumeric characters. An example is "S03FGDTNAAV".',
+    "The `\\n` within the message represents a line break.",
+    'A line in the format "Summary: ..." replaces a longer conversation of the chat log with its summary.',
+    'In a summary, the part after "Earlier:" is context from before the newer messages; only report it where the newer messages depend on it.',
+])
+
+TOPIC_FORMAT = [
+    "Overall, please format the topics such that I have: \n",
+    "- (1) actionables - Maximum of 8 topics that I need to follow up on. \n",
+    "- (2) to_catch_up_on - Maximum of 15 interesting topic to take note of.\n",
+    "\n",
+
+    "For each topic in (1) and (2), summarize the following chat log into\n"
+    "  - `title`: title\n",
+    "  - `channel_id`: the id of the slack channel that this message is in.\n"
+    "  - `summary`: describes the background context and a summary of what was discussed, who made those points and the potential impact of what is discussed. \n",
+    "  - `current_status`: the current status of the discussion\n",
+    "  - `action_items`: a list of strings that represent action items that are planned and have been discussed and assigned to a specific user to work on. Each should describe who will do what.\n",
+    "  - `priority`: the priority and urgency of the discussion taking the values 'Low', 'Medium' or 'High'.\n",
+    "  - `links`: a list of links to documents or meetings that I need to follow up on. Each link has the keys 'link_summary' and 'url'.\n",
+    "  - `link_to_slack_message`: the link to the slack thread or message such as 'https://xendit.slack.com/archives/C06L0DLT48Z/p1721106882.879439'.\n",
+    # "  - `participants`: a list of user_ids that are very active in the discussion.\n"
+
+    "Ensure that there are no duplicates across topics in (1) and (2).\n",
+    "Finally, return the text in JSON without backticks."
+]
 
 class OpenAIClient:
-  def __init__(self, openai_key, chat_model=CHAT_MODEL, max_body_tokens=MAX_BODY_TOKENS, temperature=TEMPERATURE):
-    # self.openai_api_key = os.getenv('OPENAI_API_KEY')
+  def __init__(self, openai_key=None, chat_model=CHAT_MODEL, max_body_tokens=MAX_BODY_TOKENS, temperature=TEMPERATURE):
+    # without a key, the OpenAI client reads OPENAI_API_KEY from the environment
     self.openai = OpenAI(api_key=openai_key)
+    self.chat_model = chat_model
+    self.max_body_tokens = max_body_tokens
+    self.temperature = temperature
 
   def estimate_openai_chat_token_count(self, text: str) -> int:
     """
@@ -47,16 +88,19 @@ class OpenAIClient:
     return sum(map(counter, matches))
 
 
-  def split_messages_by_token_count(self, messages: list[str]) -> list[list[str]]:
+  def split_messages_by_token_count(self, messages: list[str], max_tokens: int = None) -> list[list[str]]:
     """
     Split a list of strings into sublists with a maximum token count.
 
     Args:
         messages (list[str]): A list of strings to be split.
+        max_tokens (int, optional): The token budget of a sublist. Defaults to max_body_tokens.
 
     Returns:
-        list[list[str]]: A list of sublists, where each sublist has a token count less than or equal to max_body_tokens.
+        list[list[str]]: A list of sublists, where each sublist has a token count less than or equal to max_tokens,
+        unless a single string alone is larger.
     """
+    max_tokens = max_tokens or self.max_body_tokens
     body_token_counts = [
       self.estimate_openai_chat_token_count(message) for message in messages
     ]
@@ -65,7 +109,7 @@ class OpenAIClient:
     current_count = 0
 
     for message, count in zip(messages, body_token_counts):
-      if current_count + count <= MAX_BODY_TOKENS:
+      if not current_sublist or current_count + count <= max_tokens:
         current_sublist.append(message)
         current_count += count
       else:
@@ -76,6 +120,170 @@ class OpenAIClient:
     result.append(current_sublist)
     return result
 
+  def split_section(self, section: str) -> list[str]:
+    """
+    Split a chat log section that is over the token budget by lines, repeating its h1 header in every part.
+    """
+    if self.estimate_openai_chat_token_count(section) <= self.max_body_tokens:
+      return [section]
+    header, *lines = section.split("\n")
+    budget = max(1, self.max_body_tokens - self.estimate_openai_chat_token_count(header))
+    return ["\n".join([header] + part) for part in self.split_messages_by_token_count(lines, budget)]
+
+  def map_concurrently(self, function, items: list) -> list:
+    if len(items) == 1:
+      return [function(items[0])]
+    with ThreadPoolExecutor(max_workers=MAP_CONCURRENCY) as executor:
+      return list(executor.map(function, items))
+
+  def summarize_all_mentions(self, sections: list[str]) -> str:
+    """
+    Summarize chat log sections into the `actionables` / `to_catch_up_on` JSON.
+
+    Sections that fit in one token budget are summarized in a single call, like
+    `summarize_all_mentions_text`. Larger inputs are split into chunks within the
+    budget, the chunks are summarized concurrently (map) and their topics merged
+    into the final JSON (reduce), so latency stays close to that of a single chunk.
+
+    Args:
+        sections (list[str]): The chat log, one h1 header and its messages per section.
+
+    Returns:
+        str: The summary as a JSON string.
+    """
+    sections = [part for section in sections for part in self.split_section(section)]
+    chunks = ["\n\n".join(chunk) for chunk in self.split_messages_by_token_count(sections)]
+    summaries = self.map_concurrently(self.summarize_all_mentions_text, chunks)
+    print(f"Summarized {len(sections)} sections in {len(chunks)} chunks")
+    return self.reduce_summaries(summaries)
+
+  def reduce_summaries(self, summaries: list[str]) -> str:
+    """
+    Merge partial summaries into one, in as many rounds as the reduce token budget requires.
+    """
+    while len(summaries) > 1:
+      groups = self.split_messages_by_token_count(summaries, MAX_REDUCE_TOKENS)
+      if len(groups) == len(summaries):
+        # every partial summary is over the budget on its own, merge them pairwise
+        groups = [summaries[index:index + 2] for index in range(0, len(summaries), 2)]
+      summaries = self.map_concurrently(self.merge_summaries, groups)
+    return summaries[0]
+
+  def merge_summaries(self, summaries: list[str]) -> str:
+    """
+    Merge the topics of several partial summaries into one summary of the same JSON format.
+    """
+    if len(summaries) == 1:
+      return summaries[0]
+
+    response = self.openai.chat.completions.create(
+        model=self.chat_model,
+        temperature=self.temperature,
+        response_format={"type": "json_object"},
+        messages=[{
+          "role": "system",
+          "content": CHAT_LOG_FORMAT,
+        }, {
+          "role": "user",
+          "content": "\n".join([
+            "My Slack messages were summarized in parts. Each part below is a JSON summary with `actionables` and `to_catch_up_on` topics.",
+            "Merge them into one summary: combine topics about the same discussion into one topic, keeping all of their action items and links, ",
+            "and keep the most important topics when there are more than allowed.",
+            *TOPIC_FORMAT,
+            "",
+            "The partial summaries are as follows:",
+            "",
+            *summaries
+          ])
+        }])
+
+    return response.choices[0].message.content
+
+  def summarize_conversation_text(self, text: str) -> str:
+    """
+    Summarize one conversation for anyone catching up on it, without reference to a particular reader.
+
+    The result only depends on the text, the model and `CONVERSATION_PROMPT_VERSION`,
+    so it can be cached and shared between the digests of different users.
+
+    Args:
+        text (str): The conversation, one line per message in the format "Speaker: Message".
+
+    Returns:
+        str: The summary as a single line.
+    """
+    response = self.openai.chat.completions.create(
+        model=self.chat_model,
+        temperature=self.temperature,
+        messages=[{
+          "role": "system",
+          "content": "\n".join([
+            'The chat log consists of one line per message in the format "Speaker: Message" within a Slack conversation.',
+            'Users are represented by IDs that start with U followed by alphanumeric characters. An example is "U01L15W16EP".',
+            "The `\\n` within the message represents a line break.",
+          ])
+        }, {
+          "role": "user",
+          "content": "\n".join([
+            "Summarize the following conversation in a few sentences for someone catching up on it.",
+            "Cover every topic discussed, who made which points, decisions, the current status, open questions, ",
+            "and action items with the user they are assigned to. Keep user IDs and links to documents or meetings exactly as they are.",
+            "Return the summary as one paragraph without line breaks.",
+            "",
+            "The chat log is as follows:",
+            "",
+            text
+          ])
+        }])
+
+    return response.choices[0].message.content.replace("\n", " ")
+
+  def update_conversation_summary(self, previous_summary: str, text: str) -> str:
+    """
+    Summarize the messages added to a conversation since it was last summarized, with the earlier summary as context.
+
+    The earlier summary is condensed into a short "Earlier:" part instead of being carried
+    along in full, so the summary of a long-running thread does not keep growing and its
+    old topics are not reported again as new.
+
+    Args:
+        previous_summary (str): The summary made by `summarize_conversation_text` or an earlier update.
+        text (str): The new messages, one line per message in the format "Speaker: Message".
+
+    Returns:
+        str: The updated summary as a single line.
+    """
+    response = self.openai.chat.completions.create(
+        model=self.chat_model,
+        temperature=self.temperature,
+        messages=[{
+          "role": "system",
+          "content": "\n".join([
+            'The chat log consists of one line per message in the format "Speaker: Message" within a Slack conversation.',
+            'Users are represented by IDs that start with U followed by alphanumeric characters. An example is "U01L15W16EP".',
+            "The `\\n` within the message represents a line break.",
+          ])
+        }, {
+          "role": "user",
+          "content": "\n".join([
+            "Below is the summary of a Slack conversation so far, followed by the messages added to it since.",
+            "Summarize the new messages: new topics, who made which points, decisions, the current status, ",
+            "open questions, and action items with the user they are assigned to.",
+            'Start with "Earlier:" and at most two sentences of the summary so far that are needed to understand the new messages, ',
+            'then continue with "New:" and the summary of the new messages. Drop questions and action items that the new messages resolved.',
+            "Keep user IDs and links to documents or meetings exactly as they are.",
+            "Return the summary as one paragraph without line breaks.",
+            "",
+            f"The summary so far: {previous_summary}",
+            "",
+            "The new messages are as follows:",
+            "",
+            text
+          ])
+        }])
+
+    return response.choices[0].message.content.replace("\n", " ")
+
   def summarize_thread_text(self, text: str, user_id):
     """
     Summarize a chat log in bullet points, in the specified language.
@@ -203,17 +411,12 @@ class OpenAIClient:
     print(f"Estimated number of tokens: {self.estimate_openai_chat_token_count(text)}")
 
     response = self.openai.chat.completions.create(
-        model=CHAT_MODEL,
-        temperature=0.3,
+        model=self.chat_model,
+        temperature=self.temperature,
+        response_format={"type": "json_object"},
         messages=[{
           "role": "system",
-          "content": "\n".join([
-              'The chat log format consists of firstly a h1 header that represents the start of a Slack DM, Slack DM thread, Slack thread or a Slack channel followed by the chat log which consists of one line per message in the format "Speaker: Message".',
-              "The h1 header also consists of important metadata information that is to be used."
-              'Users are represented by IDs that start with U followed by alphanumeric characters. An example is "U01L15W16EP".'
-              'Subteams are represented by IDs that start with S followed by alphanumeric characters. An example is "S03FGDTNAAV".'
-              "The `\\n` within the message represents a line break."
-          ])
+          "content": CHAT_LOG_FORMAT,
         }, {
           "role": "user",
           "content": "\n".join([
@@ -222,7 +425,7 @@ class OpenAIClient:
             "if I am required to follow up on them like questions I have not answered, ",
             "or someone is still waiting for me to get back to them.",
             "There might be multiple topics that are discussed in the direct messages, threads or channels.",
-            "I might also be wanting to follow people that I have indicated to follow."
+            "I might also be wanting to follow people that I have indicated to follow.",
 
             # "I am a Software Engineer. This is a non-exhaustive list of what I am interested in:\n",
             # "- Project Updates: Quick access to recent developments and changes in projects.\n",
@@ -234,24 +437,7 @@ class OpenAIClient:
             # "- Deadline Reminders: Reminders of approaching deadlines and milestones.\n",
             # "- Documentation Updates: Notices on updates or changes to project documentation.\n",
 
-            "Overall, please format the topics such that I have: \n",
-            "- (1) actionables - Maximum of 8 topics that I need to follow up on. \n",
-            "- (2) to_catch_up_on - Maximum of 15 interesting topic to take note of.\n",
-            "\n",
-
-            "For each topic in (1) and (2), summarize the following chat log into\n"
-            "  - `title`: title\n",
-            "  - `channel_id`: the id of the slack channel that this message is in.\n"
-            "  - `summary`: describes the background context and a summary of what was discussed, who made those points and the potential impact of what is discussed. \n",
-            "  - `current_status`: the current status of the discussion\n",
-            "  - `action_items`: a list of strings that represent action items that are planned and have been discussed and assigned to a specific user to work on. Each should describe who will do what.\n",
-            "  - `priority`: the priority and urgency of the discussion taking the values 'Low', 'Medium' or 'High'.\n",
-            "  - `links`: a list of links to documents or meetings that I need to follow up on. Each link has the keys 'link_summary' and 'url'.\n",
-            "  - `link_to_slack_message`: the link to the slack thread or message such as 'https://xendit.slack.com/archives/C06L0DLT48Z/p1721106882.879439'.\n",
-            # "  - `participants`: a list of user_ids that are very active in the discussion.\n"
-
-            "Ensure that there are no duplicates across topics in (1) and (2).\n",
-            "Finally, return the text in JSON without backticks."
+            *TOPIC_FORMAT,
 
             f"The chat log is as follows:",
             "",
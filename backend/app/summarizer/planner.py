@@ -0,0 +1,109 @@
+from backend.app.summarizer.records import to_records
+
+
+class FetchPlan:
+  """
+  Collect-then-fetch plan for one summary run.
+
+  Every source (DMs, mentions, group mentions, followed channels and users) first
+  registers the threads and channel windows it needs. `execute` then fetches each
+  distinct channel window and thread exactly once, including the threads started
+  inside the fetched channel windows, and hands the results back to every source
+  as message sets of `MessageRecord`s in the order the sources were added.
+
+  Before fetching, the message source is asked for the latest activity it already
+  knows per channel. Channels with nothing after the window start are skipped
+  without any history or thread fetch.
+  """
+
+  def __init__(self):
+    self.message_sets = []
+    self._threads = set()
+    self._channels = set()
+    self.requested_channel_fetches = 0
+    self.requested_thread_fetches = 0
+    self.channel_fetches = 0
+    self.thread_fetches = 0
+    self.skipped_idle_channels = 0
+
+  def add_thread(self, type: str, channel_id: str, thread_ts: str, mentioned_user_id: str = None):
+    self.requested_thread_fetches += 1
+    if (channel_id, thread_ts) in self._threads:
+      return
+    self._threads.add((channel_id, thread_ts))
+    message_set = {'type': type, 'channel_id': channel_id, 'thread_ts': thread_ts}
+    if mentioned_user_id is not None:
+      message_set['mentioned_user_id'] = mentioned_user_id
+    self.message_sets.append(message_set)
+
+  def add_channel(self, type: str, channel_id: str, mentioned_user_id: str = None):
+    self.requested_channel_fetches += 1
+    if channel_id in self._channels:
+      return
+    self._channels.add(channel_id)
+    message_set = {'type': type, 'channel_id': channel_id}
+    if mentioned_user_id is not None:
+      message_set['mentioned_user_id'] = mentioned_user_id
+    self.message_sets.append(message_set)
+
+  def execute(self, message_source, oldest_timestamp) -> list:
+    """
+    Run the single deduplicated fetch pass and return the filled message sets.
+    """
+    channel_ids = [message_set['channel_id'] for message_set in self.message_sets if 'thread_ts' not in message_set]
+    latest_activity = message_source.probe_channel_activity(channel_ids, oldest_timestamp) if channel_ids else {}
+    idle_channel_ids = {channel_id for channel_id, latest_ts in latest_activity.items() if float(latest_ts) <= float(oldest_timestamp)}
+    active_channel_ids = [channel_id for channel_id in channel_ids if channel_id not in idle_channel_ids]
+    channel_messages = {
+      channel_id: to_records(messages)
+      for channel_id, messages in message_source.fetch_many_recent_messages(active_channel_ids, oldest_timestamp).items()
+    }
+    self.channel_fetches = len(channel_messages)
+    self.skipped_idle_channels = len(idle_channel_ids)
+    channel_messages.update({channel_id: [] for channel_id in idle_channel_ids})
+
+    thread_targets = [
+      (message_set['channel_id'], message_set['thread_ts']) for message_set in self.message_sets if 'thread_ts' in message_set
+    ]
+    for channel_id in channel_ids:
+      for message in channel_messages[channel_id]:
+        if message.thread_ts:
+          self.requested_thread_fetches += 1
+          thread_targets.append((channel_id, message.thread_ts))
+    thread_targets = list(dict.fromkeys(thread_targets))
+    thread_messages = {
+      target: to_records(messages)
+      for target, messages in message_source.fetch_many_thread_messages(thread_targets).items()
+    }
+    self.thread_fetches = len(thread_targets)
+
+    for message_set in self.message_sets:
+      channel_id = message_set['channel_id']
+      if 'thread_ts' in message_set:
+        message_set['messages'] = thread_messages[(channel_id, message_set['thread_ts'])]
+        continue
+
+      # if message is a thread, add the thread messages after this message; the replies
+      # include the parent, which is left out so the thread reads the same as its thread set
+      all_messages_with_thread_messages = []
+      for message in channel_messages[channel_id]:
+        all_messages_with_thread_messages.append(message)
+        if message.thread_ts:
+          all_messages_with_thread_messages.extend(
+            reply for reply in thread_messages[(channel_id, message.thread_ts)] if reply.ts != message.ts
+          )
+      message_set['messages'] = all_messages_with_thread_messages
+
+    return self.message_sets
+
+  def report(self) -> dict:
+    requested = self.requested_channel_fetches + self.requested_thread_fetches
+    fetched = self.channel_fetches + self.thread_fetches
+    return {
+      'requested_channel_fetches': self.requested_channel_fetches,
+      'channel_fetches': self.channel_fetches,
+      'requested_thread_fetches': self.requested_thread_fetches,
+      'thread_fetches': self.thread_fetches,
+      'skipped_idle_channels': self.skipped_idle_channels,
+      'saved_calls': requested - fetched,
+    }
@@ -0,0 +1,167 @@
+import io
+import os
+
+# tokens of chat log sent to the digest summary in one run, across all map chunks
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '60000'))
+# a message set is only truncated if at least this much of its body still fits
+MIN_TRUNCATED_BODY_TOKENS = 200
+
+# h1 header of each message set type; channel sets without a mention use 'channel'
+SECTION_HEADERS = {
+  'direct_message': "# start of a direct message channel_id: {channel_id}. I am in this message into this as '{mentioned_user_id}':",
+  'direct_message_thread': "# start of a direct message thread_ts: {thread_ts}, channel_id: {channel_id}. I am tagged into this as '{mentioned_user_id}':",
+  'thread': "# start of a public or public channel thread thread_ts: {thread_ts}, channel_id: {channel_id}. I am tagged into this as '{mentioned_user_id}':",
+  'channel_mention': "# start of a public or public channel channel_id: {channel_id}. I am tagged into this as '{mentioned_user_id}':",
+  'following_user_in_thread': "# start of a direct message thread_ts: {thread_ts}, channel_id: {channel_id}. I am following the user '{mentioned_user_id}':",
+  'following_user_in_channel': "# start of a public or public channel channel_id: {channel_id}. I am following the user '{mentioned_user_id}':",
+  'channel': "# start of a public or public channel channel_id: {channel_id}.",
+}
+
+# lower is kept first when the budget runs out: followed channels go before anything addressed to me
+SOURCE_PRIORITY = {
+  'direct_message': 0,
+  'direct_message_thread': 0,
+  'thread': 1,
+  'channel_mention': 1,
+  'following_user_in_thread': 2,
+  'following_user_in_channel': 3,
+  'channel': 4,
+}
+
+
+def source_type(message_set) -> str:
+  if message_set['type'] == 'channel':
+    return 'channel_mention' if 'mentioned_user_id' in message_set else 'channel'
+  return message_set['type']
+
+
+class PromptAssembler:
+  """
+  Token-budgeted assembly of the chat log sections of one digest.
+
+  Every message set becomes one section: its h1 header followed by the bodies
+  of its conversations. Tokens are counted line by line while the sections are
+  laid out, and once `token_budget` is used up the lowest-priority sets
+  (followed channels first, DMs last) are truncated, or dropped. Truncation
+  keeps whole conversations, newest first; when not even the newest one fits,
+  a thread keeps its root and its newest replies. Kept sections are written in
+  their original order into one buffer. `report` gives the assembled size per
+  source type, including the notes on left-out messages.
+  """
+
+  def __init__(self, openai_client, token_budget: int = PROMPT_TOKEN_BUDGET):
+    self.count_tokens = openai_client.estimate_openai_chat_token_count
+    self.token_budget = token_budget
+    self.tokens = 0
+    self._sources = {}
+
+  def _source_report(self, source: str) -> dict:
+    return self._sources.setdefault(source, {'sections': 0, 'tokens': 0, 'truncated': 0, 'dropped': 0})
+
+  def _truncate(self, conversations, body_budget: int):
+    """
+    The lines of the newest `conversations` that fit `body_budget` with a note on the rest, and their tokens.
+
+    `conversations` are (newest_ts, is_thread, lines, line_tokens) in their original order.
+    """
+    total_lines = sum(len(lines) for _, _, lines, _ in conversations)
+    # the note can only get shorter than with every line left out
+    budget = body_budget - self.count_tokens(f"({total_lines} more messages left out)")
+    kept = {}
+    used = 0
+    for index in sorted(range(len(conversations)), key=lambda index: -float(conversations[index][0])):
+      _, is_thread, lines, line_tokens = conversations[index]
+      conversation_tokens = sum(line_tokens)
+      if used + conversation_tokens <= budget:
+        kept[index] = list(lines)
+        used += conversation_tokens
+        continue
+      if not kept and budget > 0:
+        # not even the newest conversation fits: keep the start of a thread and its newest replies,
+        # or the newest lines of a channel run, which come first
+        kept_positions = [0] if is_thread and line_tokens[0] <= budget else []
+        used = sum(line_tokens[position] for position in kept_positions)
+        positions = range(len(lines) - 1, 0, -1) if is_thread else range(len(lines))
+        for position in positions:
+          if used + line_tokens[position] > budget:
+            break
+          kept_positions.append(position)
+          used += line_tokens[position]
+        if kept_positions:
+          kept[index] = [lines[position] for position in sorted(kept_positions)]
+          left_out = total_lines - len(kept_positions)
+          note = f"({left_out} more messages left out)"
+          # the note goes where the messages are missing: after the root of a thread, at the end of a channel run
+          kept[index].insert(1 if is_thread and 0 in kept_positions else len(kept[index]), note)
+          return [line for index in sorted(kept) for line in kept[index]], used + self.count_tokens(note)
+      break
+
+    kept_lines = [line for index in sorted(kept) for line in kept[index]]
+    note = f"({total_lines - len(kept_lines)} more messages left out)"
+    return kept_lines + [note], used + self.count_tokens(note)
+
+  def assemble(self, message_sets, bodies) -> list:
+    """
+    The chat log sections of `message_sets`.
+
+    `bodies` has the conversations of every message set, each as (newest_ts, is_thread, body),
+    with the formatted messages of a thread oldest first and those of a channel run newest first.
+    """
+    candidates = []
+    for index, (message_set, conversations) in enumerate(zip(message_sets, bodies)):
+      source = source_type(message_set)
+      header = SECTION_HEADERS.get(source, SECTION_HEADERS['channel']).format(
+        channel_id=message_set['channel_id'],
+        thread_ts=message_set.get('thread_ts'),
+        mentioned_user_id=message_set.get('mentioned_user_id'),
+      )
+      candidates.append((SOURCE_PRIORITY.get(source, len(SOURCE_PRIORITY)), index, source, header, conversations))
+
+    # decide what is kept in priority order, then write it out in the original order
+    kept = {}
+    remaining = self.token_budget
+    for _, index, source, header, conversations in sorted(candidates, key=lambda candidate: candidate[:2]):
+      report = self._source_report(source)
+      header_tokens = self.count_tokens(header)
+      if header_tokens >= remaining:
+        report['dropped'] += 1
+        continue
+      body_budget = remaining - header_tokens
+      conversations = [
+        (newest_ts, is_thread, lines, [self.count_tokens(line) for line in lines])
+        for newest_ts, is_thread, lines in ((newest_ts, is_thread, body.split("\n")) for newest_ts, is_thread, body in conversations if body)
+      ]
+      kept_lines = [line for _, _, lines, _ in conversations for line in lines]
+      body_tokens = sum(sum(line_tokens) for _, _, _, line_tokens in conversations)
+      if body_tokens > body_budget:
+        kept_lines, body_tokens = self._truncate(conversations, body_budget)
+        if body_tokens < MIN_TRUNCATED_BODY_TOKENS or body_tokens > body_budget:
+          report['dropped'] += 1
+          continue
+        report['truncated'] += 1
+      remaining -= header_tokens + body_tokens
+      report['sections'] += 1
+      report['tokens'] += header_tokens + body_tokens
+      kept[index] = (header, kept_lines)
+
+    buffer = io.StringIO()
+    offsets = []
+    for index in sorted(kept):
+      header, lines = kept[index]
+      start = buffer.tell()
+      buffer.write(header)
+      for line in lines:
+        buffer.write("\n")
+        buffer.write(line)
+      offsets.append((start, buffer.tell()))
+    self.tokens = self.token_budget - remaining
+
+    prompt = buffer.getvalue()
+    return [prompt[start:end] for start, end in offsets]
+
+  def report(self) -> dict:
+    return {
+      'token_budget': self.token_budget,
+      'tokens': self.tokens,
+      'sources': self._sources,
+    }
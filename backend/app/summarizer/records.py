@@ -0,0 +1,47 @@
+import sys
+
+
+class MessageRecord:
+  """
+  Compact record of a Slack message, holding only what the summary pipeline reads.
+
+  Raw Slack message dicts carry blocks, attachments, reactions, files and more; a
+  run keeps thousands of them alive until the digest is built. Records are created
+  right after fetching, so the raw dicts can be freed, and share one interned
+  string per user id.
+  """
+
+  __slots__ = ('user', 'text', 'bot_id', 'ts', 'thread_ts', 'subtype', 'reply_count', 'reaction_count')
+
+  def __init__(self, user, text, bot_id, ts, thread_ts, subtype=None, reply_count=0, reaction_count=0):
+    self.user = user
+    self.text = text
+    self.bot_id = bot_id
+    self.ts = ts
+    self.thread_ts = thread_ts
+    self.subtype = subtype
+    self.reply_count = reply_count
+    self.reaction_count = reaction_count
+
+  @classmethod
+  def from_message(cls, message):
+    if isinstance(message, cls):
+      return message
+    user = message.get('user')
+    return cls(
+      sys.intern(user) if user else None,
+      message.get('text') or '',
+      message.get('bot_id'),
+      message['ts'],
+      message.get('thread_ts'),
+      message.get('subtype'),
+      message.get('reply_count') or 0,
+      sum(reaction.get('count', 0) for reaction in message.get('reactions', ())),
+    )
+
+  def __repr__(self):
+    return f"<MessageRecord(ts={self.ts}, user={self.user}, thread_ts={self.thread_ts})>"
+
+
+def to_records(messages) -> list:
+  return [MessageRecord.from_message(message) for message in messages]
@@ -0,0 +1,132 @@
+import re
+
+import numpy as np
+
+# messages kept per conversation that goes into the digest prompt verbatim
+CONVERSATION_TOP_N = 30
+# messages scoring at or below this are left out even when under the top N
+MIN_RELEVANCE_SCORE = 0.0
+# the recency signal halves every this many seconds before the end of the window
+RECENCY_HALF_LIFE = 12 * 60 * 60
+
+# message subtypes without conversation content
+LOW_SIGNAL_SUBTYPES = ['channel_join', 'channel_leave', 'channel_topic', 'channel_purpose', 'channel_name', 'bot_add', 'bot_remove', 'pinned_item', 'group_join', 'group_leave']
+
+# ":+1: :tada:" and the like: only emoji names, no words
+EMOJI_ONLY_PATTERN = re.compile(r"(?::[^:\s]+:\s*)+")
+
+WEIGHTS = {
+  'mentions_me': 5.0,
+  'mentions_my_groups': 3.0,
+  'broadcast': 1.5,
+  'followed_author': 2.0,
+  'question': 1.0,
+  'link': 1.0,
+  'reactions': 0.75,
+  'replies': 1.0,
+  'recency': 1.0,
+  'length': 0.5,
+  'low_signal': -10.0,
+}
+
+
+def is_low_signal(record) -> bool:
+  """
+  Whether a message has no conversation content: joins and other channel events, emoji-only and empty messages.
+
+  This does not depend on who the digest is for, so low-signal messages can be
+  dropped before conversations are split and cached.
+  """
+  if record.subtype in LOW_SIGNAL_SUBTYPES:
+    return True
+  text = record.text.strip()
+  return not text or EMOJI_ONLY_PATTERN.fullmatch(text) is not None
+
+
+class RelevanceScorer:
+  """
+  Local, CPU-cheap relevance scoring of messages for one digest.
+
+  Every message gets a weighted sum of signals: mentions of me or my groups,
+  questions, links, reactions, replies, recency and whether I follow its author.
+  Join messages, emoji-only replies and empty messages get a large negative
+  weight. Each signal is read into its own numpy column with np.fromiter;
+  text signals are plain substring checks per message, which avoids copying
+  the texts into fixed-width arrays. The weighted sum is computed with
+  numpy over the whole batch at once. `prune` then keeps the top `top_n`
+  messages of each conversation, in their original order.
+  """
+
+  def __init__(self, my_user_id: str, my_group_ids=(), followed_user_ids=(), now_timestamp: float = None, top_n: int = CONVERSATION_TOP_N):
+    self.my_user_id = my_user_id
+    self.my_group_ids = list(my_group_ids)
+    self.followed_user_ids = list(followed_user_ids)
+    self.now_timestamp = now_timestamp
+    self.top_n = top_n
+
+  def score(self, records) -> np.ndarray:
+    if not records:
+      return np.zeros(0)
+    my_mention = f"<@{self.my_user_id}"
+    group_mentions = [f"<!subteam^{group_id}" for group_id in self.my_group_ids]
+    count = len(records)
+    texts = [record.text for record in records]
+
+    def text_signal(contains) -> np.ndarray:
+      return np.fromiter(map(contains, texts), dtype=bool, count=count)
+
+    mentions_me = text_signal(lambda text: my_mention in text)
+    mentions_my_groups = text_signal(lambda text: any(group_mention in text for group_mention in group_mentions))
+    broadcast = text_signal(lambda text: '<!here' in text or '<!channel' in text)
+    question = text_signal(lambda text: '?' in text)
+    link = text_signal(lambda text: 'http' in text)
+    lengths = np.fromiter((len(text.strip()) for text in texts), dtype=float, count=count)
+    low_signal = np.fromiter(map(is_low_signal, records), dtype=bool, count=count)
+    authors = np.array([record.user for record in records], dtype=object)
+    followed_author = np.isin(authors, self.followed_user_ids)
+    timestamps = np.fromiter((float(record.ts) for record in records), dtype=float, count=count)
+    reactions = np.fromiter((record.reaction_count for record in records), dtype=float, count=count)
+    replies = np.fromiter((record.reply_count for record in records), dtype=float, count=count)
+
+    now = self.now_timestamp if self.now_timestamp is not None else timestamps.max()
+    recency = np.exp2(-np.clip(now - timestamps, 0, None) / RECENCY_HALF_LIFE)
+
+    return (
+      WEIGHTS['mentions_me'] * mentions_me
+      + WEIGHTS['mentions_my_groups'] * mentions_my_groups
+      + WEIGHTS['broadcast'] * broadcast
+      + WEIGHTS['followed_author'] * followed_author
+      + WEIGHTS['question'] * question
+      + WEIGHTS['link'] * link
+      + WEIGHTS['reactions'] * np.log1p(reactions)
+      + WEIGHTS['replies'] * np.log1p(replies)
+      + WEIGHTS['recency'] * recency
+      + WEIGHTS['length'] * np.log1p(lengths) / np.log1p(500)
+      + WEIGHTS['low_signal'] * low_signal
+    )
+
+  def prune(self, conversations) -> list:
+    """
+    The top `top_n` relevant messages of each conversation, a list of `MessageRecord` lists.
+
+    All conversations are scored in one batch. A thread keeps its first message
+    for context whatever its score.
+    """
+    records = [record for conversation in conversations for record in conversation]
+    scores = self.score(records)
+    pruned = []
+    start = 0
+    for conversation in conversations:
+      conversation_scores = scores[start:start + len(conversation)]
+      start += len(conversation)
+      keep = conversation_scores > MIN_RELEVANCE_SCORE
+      ranked = np.where(keep, conversation_scores, -np.inf)
+      if conversation and conversation[0].thread_ts == conversation[0].ts:
+        keep[0] = True
+        ranked[0] = np.inf
+      if keep.sum() > self.top_n:
+        # the top_n highest scores among the kept messages
+        keep = np.zeros(len(conversation), dtype=bool)
+        keep[np.argpartition(-ranked, self.top_n - 1)[:self.top_n]] = True
+      pruned.append([record for record, kept in zip(conversation, keep) if kept])
+    return pruned
@@ -1,53 +1,81 @@
-import time
-
-from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
 
+from backend.app.summarizer.async_slack import AsyncSlackClient, MAX_CONCURRENCY
+from backend.app.summarizer.directory import SlackDirectory
+from backend.app.summarizer.slack_rate_limiter import slack_rate_limiter
+from backend.app.summarizer.slack_transport import get_slack_client, run_sync
+from backend.app.summarizer.thread_roots import thread_root_cache, thread_ts_from_message
+
 
 class SlackClient:
-  def __init__(self, bot_token, user_token):
-    self.bot_client = WebClient(token=bot_token)
-    self.user_client = WebClient(token=user_token)
+  def __init__(self, bot_token, user_token, directory_cache=None, max_concurrency=MAX_CONCURRENCY, base_url=None):
+    # base_url overrides the Slack Web API endpoint, e.g. to run against a replay server
+    self.bot_client = get_slack_client(bot_token, base_url)
+    self.user_client = get_slack_client(user_token, base_url)
+    self.async_client = AsyncSlackClient(user_token, max_concurrency=max_concurrency, base_url=base_url)
+    # (channel_id, ts) -> thread_ts or None, for this run only
+    self._thread_roots = {}
+    # ids of the conversations this user is a member of, fetched on first use
+    self._member_channel_ids = None
+    if directory_cache is not None:
+      self.directory = directory_cache.get(self.fetch_directory)
+    else:
+      self.directory = self.fetch_directory()
     self.my_user_info = self.get_my_user_info()
-    self.users = self.fetch_all_users()
-    self.user_groups = self.fetch_all_user_groups()
     self.my_user_groups = self.find_user_groups_for_user(self.my_user_info['id'])
 
-  def fetch_all_users(self):
-    all_users = []
+  @property
+  def users(self):
+    return self.directory.users
+
+  @property
+  def user_groups(self):
+    return self.directory.user_groups
+
+  def _call(self, client, method, **kwargs):
+    """
+    Call a Web API method through the shared rate limit scheduler, over the pooled Slack transport.
+    """
+    return run_sync(slack_rate_limiter.call_async(client, method, **kwargs))
+
+  def fetch_directory(self) -> SlackDirectory:
+    return SlackDirectory(self.fetch_all_users(), self.fetch_all_user_groups())
+
+  def _iter_pages(self, client, method, result_key, **kwargs):
+    """
+    Yield the `result_key` list of every page of a cursor-paginated Web API method.
+    """
     cursor = None
 
     while True:
-      try:
-        if cursor:
-            response = self.user_client.users_list(cursor=cursor)
-        else:
-            response = self.user_client.users_list()
+      if cursor:
+        response = self._call(client, method, cursor=cursor, **kwargs)
+      else:
+        response = self._call(client, method, **kwargs)
 
-        all_users.extend(response['members'])
+      yield response[result_key]
 
-        if response['response_metadata']['next_cursor']:
-            cursor = response['response_metadata']['next_cursor']
-        else:
-            break
-      except SlackApiError as e:
-        if e.response['error'] == 'ratelimited':
-          retry_after = int(e.response.headers['Retry-After'])
-          print(f"Rate limited. Retrying after {retry_after} seconds...")
-          time.sleep(retry_after)
-        else:
-          raise e
+      if response.get('response_metadata') and response['response_metadata'].get('next_cursor'):
+        cursor = response['response_metadata']['next_cursor']
+      else:
+        break
 
-    return all_users
+  def fetch_all_users(self):
+    return [user for page in self._iter_pages(self.user_client, 'users_list', 'members') for user in page]
 
   def get_my_user_info(self):
     try:
       # Verify authentication and get basic user info
-      auth_response = self.user_client.auth_test()
+      auth_response = self._call(self.user_client, 'auth_test')
       user_id = auth_response['user_id']
 
+      # The directory usually already has the user, which saves a users.info call
+      user_info = self.directory.get_user(user_id)
+      if user_info:
+        return user_info
+
       # Get detailed user information
-      user_info_response = self.user_client.users_info(user=user_id)
+      user_info_response = self._call(self.user_client, 'users_info', user=user_id)
       user_info = user_info_response['user']
 
       return user_info
@@ -56,146 +84,89 @@ class SlackClient:
       raise(e)
 
   def get_user(self, user_id):
-    for user in self.users:
-      if user['id'] == user_id:
-        return user
-    return None
+    return self.directory.get_user(user_id)
 
   def get_user_by_name(self, name):
-    for user in self.users:
-      if user['name'] == name:
-        return user
-    return None
+    return self.directory.get_user_by_name(name)
 
   def get_user_id_by_name(self, name: str) -> str:
-    for user in self.users:
-      if user['profile']['display_name'] == name:
-        return user['id']
-      if user['name'] == name:
-        return user['id']
-    return None
+    return self.directory.get_user_id_by_name(name)
 
   def get_user_name(self, user_id: str) -> str:
-    matching_users = [user for user in self.users if user['id'] == user_id]
-    return matching_users[0]['profile']['display_name_normalized'] if len(matching_users) > 0 else None
+    return self.directory.get_user_name(user_id)
+
+  def is_bot_user(self, user_id: str) -> bool:
+    return self.directory.is_bot_user(user_id)
 
   def fetch_all_user_groups(self):
     all_user_groups = []
-    cursor = None
-
-    while True:
-      try:
-        if cursor:
-          response = self.user_client.usergroups_list(cursor=cursor, include_users=True)
-        else:
-          response = self.user_client.usergroups_list(include_users=True)
-
-        all_user_groups.extend(response['usergroups'])
-
-        if response['response_metadata'] and response['response_metadata']['next_cursor']:
-          cursor = response['response_metadata']['next_cursor']
-        else:
-          break
-
-      except SlackApiError as e:
-        if e.response['error'] == 'ratelimited':
-          retry_after = int(e.response.headers['Retry-After'])
-          print(f"Rate limited. Retrying after {retry_after} seconds...")
-          time.sleep(retry_after)
-        else:
-          print(f"Error fetching user groups: {e.response['error']}")
-          break
+    try:
+      for page in self._iter_pages(self.user_client, 'usergroups_list', 'usergroups', include_users=True):
+        all_user_groups.extend(page)
+    except SlackApiError as e:
+      print(f"Error fetching user groups: {e.response['error']}")
     return all_user_groups
 
   # Function to find user groups that a specific user is associated with
   def find_user_groups_for_user(self, user_id):
-    user_groups_associated = []
-    for group in self.user_groups:
-        group_id = group['id']
-        users_in_group = group['users']
-        if user_id in users_in_group:
-            user_groups_associated.append(group)
-
-    return user_groups_associated
+    return self.directory.find_user_groups_for_user(user_id)
 
   def fetch_conversations(self, types='im,mpim,private_channel,public_channel', limit=1000):
-    all_messages = []
-    cursor = None
-    response = self.user_client.conversations_list(types=types)
-
-    while True:
-      if cursor:
-        response = self.user_client.conversations_list(types=types, exclude_archived=True, limit=limit, cursor=cursor)
-      else:
-        response = self.user_client.conversations_list(types=types, exclude_archived=True, limit=limit)
-
-      all_messages.extend(response['channels'])
-      if response['response_metadata'] and response['response_metadata']['next_cursor']:
-        cursor = response['response_metadata']['next_cursor']
-      else:
-        break
-
-    return all_messages
-
+    return [
+      channel
+      for page in self._iter_pages(self.user_client, 'conversations_list', 'channels', types=types, exclude_archived=True, limit=limit)
+      for channel in page
+    ]
+
+  def fetch_member_channel_ids(self) -> set:
+    """
+    Ids of the channels, groups and DMs this user is a member of, fetched once per client.
+
+    History kept outside of Slack is only served for these, so a user never reads a
+    private conversation through data fetched with somebody else's token.
+    """
+    if self._member_channel_ids is None:
+      self._member_channel_ids = {
+        channel['id']
+        for page in self._iter_pages(self.user_client, 'users_conversations', 'channels', types='im,mpim,private_channel,public_channel', exclude_archived=True, limit=1000)
+        for channel in page
+      }
+    return self._member_channel_ids
 
   # Function to fetch messages from a conversation from oldest timestamp onwards
   def fetch_recent_messages(self, channel_id, oldest_timestamp):
-    all_messages = []
-    cursor = None
-
-    while True:
-      try:
-        if cursor:
-            response = self.user_client.conversations_history(channel=channel_id, cursor=cursor, oldest=oldest_timestamp, limit=1000)
-        else:
-            response = self.user_client.conversations_history(channel=channel_id, oldest=oldest_timestamp, limit=1000)
-
-        all_messages.extend(response['messages'])
-
-        if response['response_metadata'] and response['response_metadata']['next_cursor']:
-            cursor = response['response_metadata']['next_cursor']
-        else:
-            break
-      except SlackApiError as e:
-        if e.response['error'] == 'ratelimited':
-            retry_after = int(e.response.headers['Retry-After'])
-            print(f"Rate limited. Retrying after {retry_after} seconds...")
-            time.sleep(retry_after)
-        else:
-            raise e
-
-    return all_messages
+    return [
+      message
+      for page in self._iter_pages(self.user_client, 'conversations_history', 'messages', channel=channel_id, oldest=oldest_timestamp, limit=1000)
+      for message in page
+    ]
+
+  def search_all_pages(self, query, query_limit=100):
+    """
+    Run a search.messages query and return the matches of every page, newest first.
+
+    The first page tells us how many pages there are; the remaining pages are then
+    fetched concurrently through the rate limit scheduler instead of one by one.
+    """
+    response = self._call(self.user_client, 'search_messages', query=query, sort='timestamp', count=query_limit, page=1)
+    all_messages = list(response['messages']['matches'])
+
+    pages = response['messages'].get('paging', {}).get('pages', 1)
+    if pages > 1:
+      responses = run_sync(self.async_client.search_pages(query, range(2, pages + 1), query_limit))
+      for page_response in responses:
+        all_messages.extend(page_response['messages']['matches'])
+
+    # new messages can shift matches between pages while we fetch them
+    unique_messages = {(message['channel']['id'], message['ts']): message for message in all_messages}
+    return sorted(unique_messages.values(), key=lambda message: float(message['ts']), reverse=True)
 
   def search_recent_dm_messages(self, start_time, query_limit=100):
-    all_messages = []
-    cursor = None
-
-    while True:
-      try:
-        if cursor:
-          response = self.user_client.search_messages(query=f'is:dm after:{start_time}', cursor=cursor, sort='timestamp', count=query_limit)
-        else:
-          response = self.user_client.search_messages(query=f'is:dm after:{start_time}', sort='timestamp', count=query_limit)
-        all_messages.extend(response['messages']['matches'])
-
-        if response['messages'].get('paging', {}).get('pages', 1) > response['messages']['paging']['page']:
-          cursor = response['messages']['paging']['page'] + 1
-        else:
-          break
-
-      except SlackApiError as e:
-        if e.response['error'] == 'ratelimited':
-          retry_after = int(e.response.headers['Retry-After'])
-          print(f"Rate limited. Retrying after {retry_after} seconds...")
-          time.sleep(retry_after)
-        else:
-          #print response and params
-          print(f"Error fetching messages: {e.response['error']}")
-          print(start_time)
-          print(response)
-          print(cursor)
-          # raise e
-          break
+    try:
+      all_messages = self.search_all_pages(f'is:dm after:{start_time}', query_limit)
+    except SlackApiError as e:
+      print(f"Error fetching messages after {start_time}: {e.response['error']}")
+      all_messages = []
 
     return {
         'mentioned_handle': self.my_user_info['id'],
@@ -204,32 +175,7 @@ class SlackClient:
 
 
   def search_messages_for_user(self, user_id, start_time, query_limit=100):
-    all_messages = []
-    cursor = None
-
-    while True:
-      try:
-        if cursor:
-          response = self.user_client.search_messages(query=f'<@{user_id}> after:{start_time}', cursor=cursor, sort='timestamp', count=query_limit)
-        else:
-          response = self.user_client.search_messages(query=f'<@{user_id}> after:{start_time}', sort='timestamp', count=query_limit)
-
-        all_messages.extend(response['messages']['matches'])
-
-        if response['messages'].get('paging', {}).get('pages', 1) > response['messages']['paging']['page']:
-          cursor = response['messages']['paging']['page'] + 1
-        else:
-          break
-
-      except SlackApiError as e:
-        if e.response['error'] == 'ratelimited':
-          retry_after = int(e.response.headers['Retry-After'])
-          print(f"Rate limited. Retrying after {retry_after} seconds...")
-          time.sleep(retry_after)
-        else:
-          raise e
-
-    return all_messages
+    return self.search_all_pages(f'<@{user_id}> after:{start_time}', query_limit)
 
   def search_my_direct_mentions(self, start_time):
     user_id = self.my_user_info['id']
@@ -254,73 +200,128 @@ class SlackClient:
     return my_group_mentions
 
 
-  def get_thread_ts_of_message(self, channel_id, thread_ts):
-    try:
-      response = self.user_client.conversations_replies(channel=channel_id, ts=thread_ts)
-      if len(response['messages']) > 0:
-        if 'thread_ts' not in response['messages'][0]:
-          return None
-        return response['messages'][0]['thread_ts']
-      else:
-        return None
-
-    except SlackApiError as e:
-      if e.response['error'] == 'ratelimited':
-          retry_after = int(e.response.headers['Retry-After'])
-          print(f"Rate limited. Retrying after {retry_after} seconds...")
-          time.sleep(retry_after)
-      else:
-          print(f"Error fetching thread messages: {e.response['error']}")
+  def resolve_thread_ts(self, message):
+    """
+    Find the thread root of a search match, without an API call when the match carries it.
+    """
+    channel_id = message['channel']['id']
+    thread_ts = thread_ts_from_message(message)
+    if thread_ts is not None:
+      self._thread_roots[(channel_id, message['ts'])] = thread_ts
+      thread_root_cache.put(channel_id, message['ts'], thread_ts)
+      return thread_ts
+    return self.get_thread_ts_of_message(channel_id, message['ts'])
+
+  def resolve_many_thread_ts(self, messages) -> list:
+    """
+    Find the thread roots of many search matches, resolving the unknown ones concurrently.
+    """
+    unresolved = []
+    for message in messages:
+      channel_id = message['channel']['id']
+      thread_ts = thread_ts_from_message(message)
+      key = (channel_id, message['ts'])
+      if thread_ts is not None:
+        self._thread_roots[key] = thread_ts
+        thread_root_cache.put(channel_id, message['ts'], thread_ts)
+      elif key not in self._thread_roots:
+        cached = thread_root_cache.get(channel_id, message['ts'])
+        if cached is not None:
+          self._thread_roots[key] = cached
+        else:
+          unresolved.append(key)
 
-    return None
+    unresolved = list(dict.fromkeys(unresolved))
+    if unresolved:
+      roots = run_sync(self.async_client.get_many_thread_ts(unresolved))
+      for (channel_id, ts), root_ts in zip(unresolved, roots):
+        self._thread_roots[(channel_id, ts)] = root_ts
+        thread_root_cache.put(channel_id, ts, root_ts)
 
+    return [self._thread_roots[(message['channel']['id'], message['ts'])] for message in messages]
 
-  def fetch_thread_messages(self, channel_id, thread_ts):
-    all_messages = []
-    cursor = None
+  def get_thread_ts_of_message(self, channel_id, thread_ts):
+    key = (channel_id, thread_ts)
+    if key in self._thread_roots:
+      return self._thread_roots[key]
+    cached = thread_root_cache.get(channel_id, thread_ts)
+    if cached is not None:
+      self._thread_roots[key] = cached
+      return cached
 
-    while True:
-      try:
-        if cursor:
-          response = self.user_client.conversations_replies(channel=channel_id, ts=thread_ts, cursor=cursor)
-        else:
-          response = self.user_client.conversations_replies(channel=channel_id, ts=thread_ts)
+    try:
+      response = self._call(self.user_client, 'conversations_replies', channel=channel_id, ts=thread_ts)
+    except SlackApiError as e:
+      print(f"Error fetching thread messages: {e.response['error']}")
+      return None
 
-        all_messages.extend(response['messages'])
+    root_ts = None
+    if len(response['messages']) > 0:
+      root_ts = response['messages'][0].get('thread_ts')
+    self._thread_roots[key] = root_ts
+    thread_root_cache.put(channel_id, thread_ts, root_ts)
+    return root_ts
 
-        if 'response_metadata' in response and 'next_cursor' in response['response_metadata']:
-          cursor = response['response_metadata']['next_cursor']
-        else:
-          break
+  def _remember_thread(self, channel_id, messages):
+    for message in messages:
+      if message.get('thread_ts'):
+        self._thread_roots[(channel_id, message['ts'])] = message['thread_ts']
+    thread_root_cache.remember_thread(channel_id, messages)
 
-      except SlackApiError as e:
-        if e.response['error'] == 'ratelimited':
-          retry_after = int(e.response.headers['Retry-After'])
-          print(f"Rate limited. Retrying after {retry_after} seconds...")
-          time.sleep(retry_after)
-        else:
-          print(f"Error fetching thread messages: {e.response['error']}")
-          break
 
+  def fetch_thread_messages(self, channel_id, thread_ts, oldest=None):
+    kwargs = {'oldest': oldest} if oldest else {}
+    all_messages = []
+    try:
+      for page in self._iter_pages(self.user_client, 'conversations_replies', 'messages', channel=channel_id, ts=thread_ts, **kwargs):
+        self._remember_thread(channel_id, page)
+        all_messages.extend(page)
+    except SlackApiError as e:
+      print(f"Error fetching thread messages: {e.response['error']}")
     return all_messages
 
-  def send_dm(self, user_id: str, title, blocks: list):
+  def probe_channel_activity(self, channel_ids, oldest_timestamp) -> dict:
+    """
+    Latest known message ts per channel. Slack has no probe cheaper than the
+    conversations.history call itself, so without a local mirror nothing is known.
+    """
+    return {}
+
+  def fetch_many_recent_messages(self, channel_ids, oldest_timestamp) -> dict:
+    """
+    Concurrently fetch the history of several channels, keyed by channel_id.
+    """
+    return run_sync(self.async_client.fetch_many_recent_messages(channel_ids, oldest_timestamp))
+
+  def fetch_many_thread_messages(self, targets, oldest_by_target=None) -> dict:
+    """
+    Concurrently fetch several threads, keyed by (channel_id, thread_ts).
+
+    `oldest_by_target` optionally limits a thread to the replies after a given ts.
+    """
+    thread_messages = run_sync(self.async_client.fetch_many_thread_messages(targets, oldest_by_target))
+    for (channel_id, _), messages in thread_messages.items():
+      self._remember_thread(channel_id, messages)
+    return thread_messages
+
+  def send_dm(self, user_id: str, title, blocks) -> bool:
+    # blocks are a list or an already serialized JSON array; returns whether the DM was sent
     try:
         # Open a DM channel with the user
-        response = self.bot_client.conversations_open(users=[user_id])
+        response = self._call(self.bot_client, 'conversations_open', users=[user_id])
         channel_id = response['channel']['id']
 
-        today_date = datetime.now().strftime("%Y-%m-%d")
-
         # Send the message
-        self.bot_client.chat_postMessage(
+        self._call(
+            self.bot_client,
+            'chat_postMessage',
             channel=channel_id,
             text=title,
             blocks=blocks
         )
         print(f"Message sent to user {user_id}")
+        return True
     except SlackApiError as e:
         print(f"Error sending message: {e.response['error']}")
+        return False
 
-# test Slack Client
-slack_client = SlackClient()
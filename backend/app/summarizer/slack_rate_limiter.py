@@ -0,0 +1,162 @@
+import asyncio
+import threading
+import time
+
+from slack_sdk.errors import SlackApiError
+
+from backend.app.summarizer.slack_recorder import slack_recorder
+
+# Requests per minute for each Slack Web API rate limit tier
+# https://api.slack.com/apis/rate-limits
+TIER_LIMITS = {
+  'tier1': 1,
+  'tier2': 20,
+  'tier3': 50,
+  'tier4': 100,
+  'special': 60,
+}
+
+METHOD_TIERS = {
+  'auth.test': 'special',
+  'chat.postMessage': 'special',
+  'conversations.history': 'tier3',
+  'conversations.info': 'tier3',
+  'conversations.list': 'tier2',
+  'conversations.open': 'tier3',
+  'conversations.replies': 'tier3',
+  'search.messages': 'tier2',
+  'usergroups.list': 'tier2',
+  'users.conversations': 'tier3',
+  'users.info': 'tier4',
+  'users.list': 'tier2',
+  'views.open': 'tier4',
+  'views.publish': 'tier4',
+}
+DEFAULT_TIER = 'tier3'
+
+MAX_RETRIES = 5
+
+
+def api_method_name(method: str) -> str:
+  """
+  Map a WebClient method name such as `conversations_history` to its API name `conversations.history`.
+  """
+  return method.replace('_', '.', 1)
+
+
+class TokenBucket:
+  def __init__(self, requests_per_minute: int):
+    self.capacity = requests_per_minute
+    self.rate = requests_per_minute / 60.0
+    self.tokens = float(requests_per_minute)
+    self.updated_at = time.monotonic()
+    self.blocked_until = 0.0
+
+  def reserve(self) -> float:
+    """
+    Take one token and return how long the caller has to wait before using it.
+
+    Tokens may go negative: callers queued behind each other get increasing delays,
+    so requests are paced ahead of time instead of being rejected by Slack.
+    """
+    now = time.monotonic()
+    self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+    self.updated_at = now
+    self.tokens -= 1
+    delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+    return max(delay, self.blocked_until - now)
+
+  def penalize(self, retry_after: float):
+    """
+    Feed a 429 back into the bucket: drain it and block it for `Retry-After` seconds.
+    """
+    now = time.monotonic()
+    self.tokens = min(self.tokens, 0.0)
+    self.updated_at = now
+    self.blocked_until = max(self.blocked_until, now + retry_after)
+
+
+class SlackRateLimiter:
+  """
+  Scheduler that every Slack Web API call goes through.
+
+  Keeps one token bucket per (token, tier), paces calls before they are sent,
+  retries calls rejected with `ratelimited` and records how long calls waited.
+  """
+
+  def __init__(self, tier_limits=TIER_LIMITS, method_tiers=METHOD_TIERS):
+    self.tier_limits = tier_limits
+    self.method_tiers = method_tiers
+    self._buckets = {}
+    self._lock = threading.Lock()
+    self._stats = {}
+
+  def set_tier_limits(self, tier_limits: dict):
+    """
+    Replace the requests per minute of every tier, starting all buckets afresh.
+    """
+    with self._lock:
+      self.tier_limits = tier_limits
+      self._buckets = {}
+
+  def _bucket(self, token: str, tier: str) -> TokenBucket:
+    key = (token, tier)
+    if key not in self._buckets:
+      self._buckets[key] = TokenBucket(self.tier_limits[tier])
+    return self._buckets[key]
+
+  def tier_of(self, api_method: str) -> str:
+    return self.method_tiers.get(api_method, DEFAULT_TIER)
+
+  def reserve(self, token: str, api_method: str) -> float:
+    with self._lock:
+      return self._bucket(token, self.tier_of(api_method)).reserve()
+
+  def penalize(self, token: str, api_method: str, retry_after: float):
+    with self._lock:
+      self._bucket(token, self.tier_of(api_method)).penalize(retry_after)
+      self._method_stats(api_method)['rate_limited'] += 1
+
+  def record_wait(self, api_method: str, waited: float):
+    with self._lock:
+      stats = self._method_stats(api_method)
+      stats['calls'] += 1
+      stats['total_wait'] += waited
+      stats['max_wait'] = max(stats['max_wait'], waited)
+
+  def _method_stats(self, api_method: str) -> dict:
+    if api_method not in self._stats:
+      self._stats[api_method] = {'calls': 0, 'rate_limited': 0, 'total_wait': 0.0, 'max_wait': 0.0}
+    return self._stats[api_method]
+
+  def stats(self) -> dict:
+    """
+    Queue wait time per API method: number of calls, 429s, total, mean and max seconds waited.
+    """
+    with self._lock:
+      return {
+        api_method: {**stats, 'mean_wait': stats['total_wait'] / stats['calls'] if stats['calls'] else 0.0}
+        for api_method, stats in self._stats.items()
+      }
+
+  async def call_async(self, client, method: str, **kwargs):
+    api_method = api_method_name(method)
+    for attempt in range(MAX_RETRIES + 1):
+      delay = self.reserve(client.token, api_method)
+      if delay > 0:
+        await asyncio.sleep(delay)
+      self.record_wait(api_method, delay)
+      try:
+        response = await getattr(client, method)(**kwargs)
+        slack_recorder.record(api_method, kwargs, response)
+        return response
+      except SlackApiError as e:
+        if e.response['error'] != 'ratelimited' or attempt == MAX_RETRIES:
+          raise e
+        retry_after = int(e.response.headers.get('Retry-After', 1))
+        print(f"Rate limited on {api_method}. Retrying after {retry_after} seconds...")
+        self.penalize(client.token, api_method, retry_after)
+
+
+# process-wide scheduler shared by every Slack client
+slack_rate_limiter = SlackRateLimiter()
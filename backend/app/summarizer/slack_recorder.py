@@ -0,0 +1,51 @@
+import json
+import os
+import threading
+
+# request parameters that identify which recorded response answers a call
+MATCH_PARAMS = ('channel', 'ts', 'oldest', 'latest', 'cursor', 'query', 'page', 'user', 'users')
+
+
+def normalize_params(params: dict) -> dict:
+  """
+  The matching parameters of a call as strings, the way they arrive in an HTTP request.
+  """
+  normalized = {}
+  for name in MATCH_PARAMS:
+    value = params.get(name)
+    if value is None:
+      continue
+    if isinstance(value, (list, tuple)):
+      value = ','.join(str(item) for item in value)
+    elif isinstance(value, bool):
+      value = '1' if value else '0'
+    normalized[name] = str(value)
+  return normalized
+
+
+class SlackRecorder:
+  """
+  Appends every Slack Web API response to a JSONL file, one line per call.
+
+  Enabled by setting `SLACK_RECORD_PATH`. The recording can be served back by
+  `backend.benchmarks.slack_replay` to run the summarizer without Slack.
+  """
+
+  def __init__(self, path: str = None):
+    self.path = path
+    self._lock = threading.Lock()
+
+  @property
+  def enabled(self) -> bool:
+    return bool(self.path)
+
+  def record(self, api_method: str, params: dict, response):
+    if not self.enabled:
+      return
+    line = json.dumps({'method': api_method, 'params': normalize_params(params), 'response': response.data})
+    with self._lock:
+      with open(self.path, 'a') as f:
+        f.write(line + '\n')
+
+
+slack_recorder = SlackRecorder(os.getenv('SLACK_RECORD_PATH'))
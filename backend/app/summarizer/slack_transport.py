@@ -0,0 +1,125 @@
+import asyncio
+import os
+import threading
+
+import aiohttp
+from slack_sdk.web.async_client import AsyncWebClient
+
+POOL_SIZE = 100
+POOL_SIZE_PER_HOST = 50
+KEEPALIVE_TIMEOUT = 60
+SLACK_API_BASE_URL = os.getenv('SLACK_API_BASE_URL', AsyncWebClient.BASE_URL)
+
+
+class SlackTransport:
+  """
+  Process-wide pooled HTTP transport for the Slack Web API.
+
+  One aiohttp session with a keep-alive connection pool lives on a background
+  event loop, and every `AsyncWebClient` handed out by `client()` uses it, so
+  short calls reuse warm TLS connections instead of opening a new one each time.
+  Synchronous code runs coroutines on that loop through `run_sync`.
+  """
+
+  def __init__(self, pool_size=POOL_SIZE, pool_size_per_host=POOL_SIZE_PER_HOST, keepalive_timeout=KEEPALIVE_TIMEOUT):
+    self.pool_size = pool_size
+    self.pool_size_per_host = pool_size_per_host
+    self.keepalive_timeout = keepalive_timeout
+    self._lock = threading.Lock()
+    self._loop = None
+    self._thread = None
+    self._session = None
+    self._clients = {}
+    self._stats = {'requests': 0, 'connections_created': 0, 'connections_reused': 0}
+
+  def _start(self):
+    with self._lock:
+      if self._loop is not None:
+        return
+      loop = asyncio.new_event_loop()
+      self._thread = threading.Thread(target=loop.run_forever, name="slack-transport", daemon=True)
+      self._thread.start()
+      self._session = asyncio.run_coroutine_threadsafe(self._create_session(), loop).result()
+      self._loop = loop
+
+  async def _create_session(self) -> aiohttp.ClientSession:
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_end.append(self._on_request_end)
+    trace_config.on_connection_create_end.append(self._on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+    connector = aiohttp.TCPConnector(
+      limit=self.pool_size,
+      limit_per_host=self.pool_size_per_host,
+      keepalive_timeout=self.keepalive_timeout,
+    )
+    return aiohttp.ClientSession(connector=connector, trace_configs=[trace_config])
+
+  async def _on_request_end(self, session, context, params):
+    self._stats['requests'] += 1
+
+  async def _on_connection_create_end(self, session, context, params):
+    self._stats['connections_created'] += 1
+
+  async def _on_connection_reuseconn(self, session, context, params):
+    self._stats['connections_reused'] += 1
+
+  def client(self, token: str = None, base_url: str = None) -> AsyncWebClient:
+    """
+    The shared `AsyncWebClient` for a token, created on first use.
+
+    `base_url` points the client at another Web API endpoint, such as the replay
+    server in `backend.benchmarks.slack_replay`.
+    """
+    self._start()
+    base_url = base_url or SLACK_API_BASE_URL
+    with self._lock:
+      if (token, base_url) not in self._clients:
+        self._clients[(token, base_url)] = AsyncWebClient(token=token, base_url=base_url, session=self._session)
+      return self._clients[(token, base_url)]
+
+  def run_sync(self, coro):
+    """
+    Run a coroutine on the transport loop and wait for its result.
+    """
+    self._start()
+    if threading.current_thread() is self._thread:
+      raise RuntimeError("run_sync cannot be called from the Slack transport loop")
+    return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+  async def run_async(self, coro):
+    """
+    Await a coroutine that uses the shared clients from another event loop, e.g. a FastAPI handler.
+    """
+    self._start()
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._loop))
+
+  def stats(self) -> dict:
+    connections = self._stats['connections_created'] + self._stats['connections_reused']
+    return {
+      **self._stats,
+      'clients': len(self._clients),
+      'reuse_ratio': self._stats['connections_reused'] / connections if connections else 0.0,
+    }
+
+  def close(self):
+    with self._lock:
+      if self._loop is None:
+        return
+      asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result()
+      self._loop.call_soon_threadsafe(self._loop.stop)
+      self._thread.join()
+      self._loop.close()
+      self._loop = None
+      self._session = None
+      self._clients = {}
+
+
+slack_transport = SlackTransport()
+
+
+def get_slack_client(token: str = None, base_url: str = None) -> AsyncWebClient:
+  return slack_transport.client(token, base_url)
+
+
+def run_sync(coro):
+  return slack_transport.run_sync(coro)
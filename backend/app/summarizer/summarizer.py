@@ -1,516 +1,407 @@
-from http.client import HTTPException
 import json
-import re
+import traceback
 from datetime import datetime, timedelta
-from backend.app.oauth.v2.endpoints.callback import get_installation, get_user_by_slack_user_id
-from backend.app.summarizer.openai import OpenAIClient
+from fastapi import HTTPException
+from backend.app.rendering.digest import render_digest, render_digest_json
+from backend.app.summarizer.openai import CONVERSATION_PROMPT_VERSION, OpenAIClient
 from backend.app.summarizer.slack import SlackClient
-from backend.app.dependencies.database import get_sync_db
+from backend.app.summarizer.slack_rate_limiter import slack_rate_limiter
+from backend.app.summarizer.slack_transport import slack_transport
+from backend.app.summarizer.dedup import MessageDeduplicator
+from backend.app.summarizer.digests import DigestStore
+from backend.app.summarizer.directory_cache import TeamDirectoryCache
+from backend.app.summarizer.message_mirror import ChannelHistoryMirror
+from backend.app.summarizer.planner import FetchPlan
+from backend.app.summarizer.prompt import SOURCE_PRIORITY, PromptAssembler, source_type
+from backend.app.summarizer.records import MessageRecord
+from backend.app.summarizer.relevance import RelevanceScorer, is_low_signal
+from backend.app.summarizer.team_batch import TeamChannelHistory
+from backend.app.summarizer.summary_cache import SummaryCache, summary_cache_key
+from backend.app.summarizer.thread_summaries import ThreadSummaryStore
+from backend.app.dependencies.database import SyncSessionLocal
 from sqlmodel import select
 from backend.app.models.user import User
 
+# conversations at least this long are summarized once and shared through the summary cache
+CONVERSATION_SUMMARY_MIN_TOKENS = 400
 
-def summarize_for_slack_user(team_id: str, user_id: str):
-    # get bot_token and user_token from database
-    db = get_sync_db()
+def summary_start_time(now: datetime) -> datetime:
+  # on mondays, the digest covers the weekend
+  if now.weekday() == 0:
+    return now - timedelta(days=3)
+  return now - timedelta(days=1)
+
+def load_slack_user(db, team_id: str, user_id: str):
+    """
+    The SlackClient and settings of an installed user.
+    """
+    # imported here: the install module creates its tables on import, which tools
+    # such as the benchmarks that only import the summarizer must not need
+    from backend.app.oauth.v2.endpoints.install import installation_store
+
+    installation = installation_store.find_installation(enterprise_id=None, team_id=team_id, user_id=user_id)
+    if not installation:
+      raise HTTPException(status_code=404, detail="Installation not found")
+    user = db.scalars(select(User).filter_by(slack_user_id=user_id)).first()
+    user_settings = user.slack_installation_settings or {}
 
-    installation = get_installation(user_id, team_id)
-    user = get_user_by_slack_user_id(user_id, team_id)
-    user_settings = user.slack_installation_settings
-    
     bot_token = installation.bot_token
     user_token = installation.user_token
-    slack_client = SlackClient(bot_token, user_token)
-    openai_client = OpenAIClient()
-    summarizer = Summarizer(slack_client, openai_client)
+    slack_client = SlackClient(bot_token, user_token, directory_cache=TeamDirectoryCache(db, team_id))
+    return slack_client, user_settings
+
+def create_summarizer(db, team_id: str, slack_client: SlackClient, message_source) -> 'Summarizer':
+    return Summarizer(
+      slack_client,
+      OpenAIClient(),
+      message_source=message_source,
+      summary_cache=SummaryCache(db),
+      thread_summaries=ThreadSummaryStore(db, team_id),
+      digest_store=DigestStore(db),
+    )
+
+def summarize_for_slack_user(team_id: str, user_id: str, resend_since: datetime = None):
+    """
+    Summarize a user's messages and send the digest, or re-send a digest stored after `resend_since`.
+    """
+    # get bot_token and user_token from database
+    db = SyncSessionLocal()
+    try:
+      slack_client, user_settings = load_slack_user(db, team_id, user_id)
+      message_mirror = ChannelHistoryMirror(db, team_id, slack_client)
+      summarizer = create_summarizer(db, team_id, slack_client, message_mirror)
+      if resend_since is not None and summarizer.resend_digest(resend_since):
+        return
+      start_from = summary_start_time(datetime.now())
+      summarizer.summarize(start_from, user_settings.get('followed_channels', []), user_settings.get('followed_users', []))
+    finally:
+      db.close()
+
+def summarize_team(team_id: str, user_ids: list, before_user=None, resend_since: dict = None) -> dict:
+    """
+    Summarize several users of a team, fetching the union of their followed channels once.
 
-    now = datetime.now()
-    start_from = now - timedelta(days=1)
-    
-    if now.weekday() == 0:
-      start_from = now - timedelta(days=3)
+    `before_user(user_id)` is called before each user is summarized; the user is
+    skipped when it returns False. Users in `resend_since`, {user_id: datetime}, get
+    the digest stored for them since then re-sent instead, if there is one. Returns
+    {user_id: exception} for the users whose summary failed.
+    """
+    resend_since = resend_since or {}
+    db = SyncSessionLocal()
+    errors = {}
+    try:
+      start_from = summary_start_time(datetime.now())
+      users = {}
+      for user_id in user_ids:
+        try:
+          users[user_id] = load_slack_user(db, team_id, user_id)
+        except Exception as e:
+          traceback.print_exc()
+          errors[user_id] = e
+
+      history = TeamChannelHistory(db, team_id)
+      history.prefetch(
+        {user_id: (slack_client, user_settings.get('followed_channels', [])) for user_id, (slack_client, user_settings) in users.items()},
+        start_from.timestamp(),
+      )
 
-    summarizer.summarize(start_from, user_settings.followed_channels, user_settings.followed_users)
+      for user_id, (slack_client, user_settings) in users.items():
+        try:
+          if before_user is not None and not before_user(user_id):
+            print(f"Skipping {team_id}/{user_id}, its job is no longer held")
+            continue
+          message_source = history.source_for(ChannelHistoryMirror(db, team_id, slack_client), slack_client.fetch_member_channel_ids())
+          summarizer = create_summarizer(db, team_id, slack_client, message_source)
+          if user_id in resend_since and summarizer.resend_digest(resend_since[user_id]):
+            continue
+          summarizer.summarize(start_from, user_settings.get('followed_channels', []), user_settings.get('followed_users', []))
+        except Exception as e:
+          traceback.print_exc()
+          db.rollback()
+          errors[user_id] = e
+    finally:
+      db.close()
+    return errors
 
 class Summarizer:
-  def __init__(self, slack_client: SlackClient, openai_client: OpenAIClient):
+  def __init__(self, slack_client: SlackClient, openai_client: OpenAIClient, message_source=None, summary_cache: SummaryCache = None, thread_summaries: ThreadSummaryStore = None, digest_store: DigestStore = None):
     self.slack_client = slack_client
     self.openai_client = openai_client
+    # where channel history and threads come from: the Slack API or a ChannelHistoryMirror
+    self.message_source = message_source or slack_client
+    # without a cache, long conversations go into the digest prompt verbatim
+    self.summary_cache = summary_cache
+    # rolling thread summaries, so a thread that gained replies is not summarized from scratch
+    self.thread_summaries = thread_summaries
+    # without a store, digests are only sent as a DM
+    self.digest_store = digest_store
   
   def summarize(self, start_time, followed_channels=[], followed_users=[]):
     # format timestamps for different slack client methods
     start_timestamp = start_time.timestamp()
     start_time_date_string = start_time.strftime('%Y-%m-%d')
-    my_user_info = self.slack_client.my_user_info
+    my_user_id = self.slack_client.my_user_info['id']
 
-    # setup.
-    threads = set()
-    channels = set()
+    # collect every thread and channel window to fetch before fetching anything
+    plan = FetchPlan()
+    search_hits = []
 
     # step 1. get all messages from all my DMs
-    all_my_mentioned_messages = []
     recent_dm_messages = self.slack_client.search_recent_dm_messages(start_time_date_string)
-    for message in recent_dm_messages['messages']:
-      # skip if message is from bot
-      user = self.slack_client.get_user(message['user'])
-      if not user:
-        continue
-      if user.get('is_bot', False):
-        # print skipped message
-        print(f"Skipping message from bot {message['username']}")
-        continue
-
-      channel_id = message['channel']['id']
-      message_ts = message['ts']
-      thread_ts = self.slack_client.get_thread_ts_of_message(channel_id, message_ts)
-
-      is_slack_thread = thread_ts is not None
-      if is_slack_thread:
-        thread_ts = self.slack_client.get_thread_ts_of_message(channel_id, message_ts)
-        if thread_ts in threads:
-          continue
-
-        thread_messages = self.slack_client.fetch_thread_messages(channel_id, thread_ts)
-        all_my_mentioned_messages.append({
-          'type': 'direct_message_thread',
-          'channel_id': channel_id,
-          'thread_ts': thread_ts,
-          'messages': thread_messages,
-          'mentioned_user_id': my_user_info['id']
-        })
-        threads.add(thread_ts)
-      else:
-        if channel_id in channels:
-          continue
-        messages = self.slack_client.fetch_recent_messages(channel_id, start_timestamp)
-        all_messages_with_thread_messages = []
-        for message in messages:
-          # if message is a thread, add the thread messages after this message
-          all_messages_with_thread_messages.append(message)
-          if 'thread_ts' in message:
-              thread_messages = self.slack_client.fetch_thread_messages(channel_id, message['thread_ts'])
-              all_messages_with_thread_messages.extend(thread_messages)
-        all_my_mentioned_messages.append({
-          'type': 'direct_message',
-          'channel_id': channel_id,
-          'messages': all_messages_with_thread_messages,
-          'mentioned_user_id': my_user_info['id']
-        })
-        channels.add(channel_id)
+    search_hits.append(('direct_message_thread', 'direct_message', my_user_id, recent_dm_messages['messages']))
 
     # step 2. get all messages from all my direct mentions
     my_mentions = self.slack_client.search_my_direct_mentions(start_time_date_string)
-    for message in my_mentions['messages']:
-      # skip if message is from bot
-      user = self.slack_client.get_user(message['user'])
-      if not user:
-        continue
-      if user.get('is_bot', False):
-        # print skipped message
-        print(f"Skipping message from bot {message['username']}")
-        continue
-
-      channel_id = message['channel']['id']
-      message_ts = message['ts']
-      thread_ts = self.slack_client.get_thread_ts_of_message(channel_id, message_ts)
-
-      is_slack_thread = thread_ts is not None
-      if is_slack_thread:
-        thread_ts = self.slack_client.get_thread_ts_of_message(channel_id, message_ts)
-        if thread_ts in threads:
-          continue
-
-        thread_messages = self.slack_client.fetch_thread_messages(channel_id, thread_ts)
-        all_my_mentioned_messages.append({
-          'type': 'thread',
-          'channel_id': channel_id,
-          'thread_ts': thread_ts,
-          'messages': thread_messages,
-          'mentioned_user_id': my_user_info['id']
-        })
-        threads.add(thread_ts)
-
-      else:
-        if channel_id in channels:
-          continue
-        messages = self.slack_client.fetch_recent_messages(channel_id, start_timestamp)
-        all_messages_with_thread_messages = []
-        for message in messages:
-          # if message is a thread, add the thread messages after this message
-          all_messages_with_thread_messages.append(message)
-          if 'thread_ts' in message:
-            thread_messages = self.slack_client.fetch_thread_messages(channel_id, message['thread_ts'])
-            all_messages_with_thread_messages.extend(thread_messages)
-        all_my_mentioned_messages.append({
-          'type': 'channel',
-          'channel_id': channel_id,
-          'messages': all_messages_with_thread_messages,
-          'mentioned_user_id': my_user_info['id']
-        })
-        channels.add(channel_id)
+    search_hits.append(('thread', 'channel', my_user_id, my_mentions['messages']))
 
     # step 3. get all messages from all my group mentions
     my_group_mentions = self.slack_client.search_my_user_group_mentions(start_time_date_string)
-    all_group_mentioned_messages = []
     for mention in my_group_mentions:
-      mentioned_user_id = mention['mentioned_user_id']
-      messages = mention['messages']
-
-      for message in messages:
-        print(message)
-        try:
-          user = self.slack_client.get_user(message['user'])
-          if not user:
-            continue
-          if user.get('is_bot', False):
-            # print skipped message
-            print(f"Skipping message from bot {message['username']}")
-            continue
-        except:
-          continue
-
-        channel_id = message['channel']['id']
-        message_ts = message['ts']
-        thread_ts = self.slack_client.get_thread_ts_of_message(channel_id, message_ts)
-
-        is_slack_thread = thread_ts is not None
-        if is_slack_thread:
-          thread_ts = self.slack_client.get_thread_ts_of_message(channel_id, message_ts)
-          if thread_ts in threads:
-            continue
+      search_hits.append(('thread', 'channel', mention['mentioned_user_id'], mention['messages']))
 
-          thread_messages = self.slack_client.fetch_thread_messages(channel_id, thread_ts)
-          all_group_mentioned_messages.append({
-            'type': 'thread',
-            'channel_id': channel_id,
-            'thread_ts': thread_ts,
-            'messages': thread_messages,
-            'mentioned_user_id': mentioned_user_id
-          })
-          threads.add(thread_ts)
-        else:
-          if channel_id in channels:
-            continue
-          messages = self.slack_client.fetch_recent_messages(channel_id, start_timestamp)
-          all_messages_with_thread_messages = []
-          for message in messages:
-            # if message is a thread, add the thread messages after this message
-            all_messages_with_thread_messages.append(message)
-            if 'thread_ts' in message:
-              thread_messages = self.slack_client.fetch_thread_messages(channel_id, message['thread_ts'])
-              all_messages_with_thread_messages.extend(thread_messages)
-          all_group_mentioned_messages.append({
-            'type': 'channel',
-            'channel_id': channel_id,
-            'messages': all_messages_with_thread_messages,
-            'mentioned_user_id': mentioned_user_id
-          })
-          channels.add(channel_id)
+    self._plan_search_hits(plan, search_hits)
 
     # step 4 - summarize channels that i am following
-    channels_following_messages = []
     for channel_id in followed_channels:
-      all_followed_channel_messages = []
-      if channel_id in channels:
-        continue
-      messages = self.slack_client.fetch_recent_messages(channel_id, start_timestamp)
-      all_messages_with_thread_messages = []
-      # if message is a thread, add the thread messages after this message
-      for message in messages:
-        all_messages_with_thread_messages.append(message)
-        if 'thread_ts' in message:
-          thread_messages = self.slack_client.fetch_thread_messages(channel_id, message['thread_ts'])
-          all_messages_with_thread_messages.extend(thread_messages)
-      channels_following_messages.append({
-        'type': 'channel',
-        'channel_id': channel_id,
-        'messages': all_messages_with_thread_messages,
-      })
+      plan.add_channel('channel', channel_id)
 
     # step 5 - summarize content of people that I am following
-    all_user_mentioned_messages = []
+    search_hits = []
     for user_id in followed_users:
       user_mentioned_messages = self.slack_client.search_messages_for_user(user_id, start_time_date_string)
-      for message in user_mentioned_messages:
+      search_hits.append(('following_user_in_thread', 'following_user_in_channel', user_id, user_mentioned_messages))
+    self._plan_search_hits(plan, search_hits)
+
+    # fetch every planned thread and channel window once
+    all_message_sets = plan.execute(self.message_source, start_timestamp)
+    print(f"Fetch plan: {json.dumps(plan.report())}")
+
+    conversations = [self._split_conversations(message_set) for message_set in all_message_sets]
+    all_conversations = [conversation for set_conversations in conversations for conversation in set_conversations]
+    # the prompt drops low-priority sets first, so duplicates keep their copy in the highest-priority set
+    priorities = [
+      SOURCE_PRIORITY.get(source_type(message_set), len(SOURCE_PRIORITY))
+      for message_set, set_conversations in zip(all_message_sets, conversations) for _ in set_conversations
+    ]
+    # a thread can be in its own thread set and in a channel window; both copies share its summary
+    thread_summaries = self._summarize_threads([conversation for conversation in all_conversations if conversation[1] is not None])
+    text_summaries = self._summarize_long_conversations([
+      text for channel_id, thread_ts, _, text in all_conversations if (channel_id, thread_ts) not in thread_summaries
+    ])
+    conversation_summaries = [
+      thread_summaries.get((channel_id, thread_ts)) or text_summaries.get(text)
+      for channel_id, thread_ts, _, text in all_conversations
+    ]
+    # conversations going into the prompt verbatim keep only their most relevant messages
+    scorer = RelevanceScorer(
+      my_user_id,
+      [group['id'] for group in self.slack_client.my_user_groups],
+      followed_users,
+      datetime.now().timestamp(),
+    )
+    verbatim = [index for index, summary in enumerate(conversation_summaries) if summary is None]
+    pruned = scorer.prune([all_conversations[index][2] for index in verbatim])
+    # near-duplicates, within a conversation or cross-posted to other channels, go in once
+    deduplicator = MessageDeduplicator()
+    deduplicated = deduplicator.compress([
+      (all_conversations[index][0], priorities[index], [(message.ts, line) for message in messages for line in self._format_messages((message,))])
+      for index, messages in zip(verbatim, pruned)
+    ])
+    conversation_bodies = [f"Summary: {summary}" if summary is not None else None for summary in conversation_summaries]
+    for index, lines in zip(verbatim, deduplicated):
+      conversation_bodies[index] = "\n".join(lines)
+    print(
+      f"Relevance pruning kept {sum(map(len, pruned))} of {sum(len(all_conversations[index][2]) for index in verbatim)} messages, "
+      f"{deduplicator.collapsed} near-duplicates collapsed, {deduplicator.duplicates} repeated messages dropped"
+    )
+    remaining_bodies = iter(conversation_bodies)
+    bodies = [
+      [(max((message.ts for message in messages), key=float), thread_ts is not None, next(remaining_bodies)) for _, thread_ts, messages, _ in set_conversations]
+      for set_conversations in conversations
+    ]
+    prompt = PromptAssembler(self.openai_client)
+    sections = prompt.assemble(all_message_sets, bodies)
+    print(f"Prompt: {json.dumps(prompt.report())}")
+
+    summary = self.openai_client.summarize_all_mentions(sections)
+    json_data = json.loads(summary)
+    print(json.dumps(json_data, indent=2))
+
+    title = f":newspaper: Your Daily Ketchup Summary for {datetime.now().strftime('%B %d, %Y')} :newspaper:"
+    summary_in_slack_blocks = render_digest(json_data, datetime.now())
+    summary_blocks_json = render_digest_json(summary_in_slack_blocks)
+    print(f"Digest blocks: {len(summary_in_slack_blocks)} blocks, {len(summary_blocks_json)} bytes")
+
+    user_id = self.slack_client.my_user_info['id']  # Replace with the actual user ID
+    # stored before sending, so a failed DM can be re-sent without summarizing again
+    if self.digest_store is not None:
+      self.digest_store.save(user_id, title, json_data, summary_in_slack_blocks)
+    if not self.slack_client.send_dm(user_id, title, summary_blocks_json):
+      raise RuntimeError(f"Could not send the digest to {user_id}")
+    print(f"Slack API queue wait per method: {json.dumps(slack_rate_limiter.stats(), indent=2)}")
+    print(f"Slack transport connection reuse: {slack_transport.stats()}")
+
+  def resend_digest(self, since: datetime) -> bool:
+    """
+    Send the latest stored digest again if it was made after `since`, without another crawl or LLM call.
+
+    Returns False when there is no such digest and the user has to be summarized.
+    """
+    if self.digest_store is None:
+      return False
+    user_id = self.slack_client.my_user_info['id']
+    summary = self.digest_store.latest(user_id)
+    if summary is None or summary.created_at < since or not summary.blocks:
+      return False
+    print(f"Re-sending the digest stored at {summary.created_at} to {user_id}")
+    if not self.slack_client.send_dm(user_id, summary.title, summary.blocks):
+      raise RuntimeError(f"Could not send the digest to {user_id}")
+    return True
+
+  def _plan_search_hits(self, plan: FetchPlan, search_hits):
+    """
+    Add the thread or channel of every human search match to the plan.
+
+    `search_hits` is a list of (thread_type, channel_type, mentioned_user_id, messages).
+    """
+    planned = []
+    for thread_type, channel_type, mentioned_user_id, messages in search_hits:
+      for message in messages:
         # skip if message is from bot
-        user = self.slack_client.get_user(message['user'])
+        user = self.slack_client.get_user(message.get('user'))
         if not user:
           continue
-        if user.get('is_bot', False):
-          # print skipped message
-          print(f"Skipping message from bot {message['username']}")
+        if self.slack_client.is_bot_user(user['id']):
+          print(f"Skipping message from bot {message.get('username')}")
           continue
+        planned.append((thread_type, channel_type, mentioned_user_id, message))
 
-        channel_id = message['channel']['id']
-        message_ts = message['ts']
-        thread_ts = self.slack_client.get_thread_ts_of_message(channel_id, message_ts)
-
-        is_slack_thread = thread_ts is not None
-        if is_slack_thread:
-          thread_ts = self.slack_client.get_thread_ts_of_message(channel_id, message_ts)
-          if thread_ts in threads:
-            continue
+    thread_roots = self.slack_client.resolve_many_thread_ts([message for _, _, _, message in planned])
+    for (thread_type, channel_type, mentioned_user_id, message), thread_ts in zip(planned, thread_roots):
+      channel_id = message['channel']['id']
+      if thread_ts is not None:
+        plan.add_thread(thread_type, channel_id, thread_ts, mentioned_user_id)
+      else:
+        plan.add_channel(channel_type, channel_id, mentioned_user_id)
 
-          thread_messages = self.slack_client.fetch_thread_messages(channel_id, thread_ts)
-          all_user_mentioned_messages.append({
-            'type': 'following_user_in_thread',
-            'channel_id': channel_id,
-            'thread_ts': thread_ts,
-            'messages': thread_messages,
-            'mentioned_user_id': user_id
-          })
-          threads.add(thread_ts)
-        else:
-          if channel_id in channels:
-            continue
-          messages = self.slack_client.fetch_recent_messages(channel_id, start_timestamp)
-          all_messages_with_thread_messages = []
-          for message in messages:
-            # if message is a thread, add the thread messages after this message
-            all_messages_with_thread_messages.append(message)
-            if 'thread_ts' in message:
-                thread_messages = self.slack_client.fetch_thread_messages(channel_id, message['thread_ts'])
-                all_messages_with_thread_messages.extend(thread_messages)
-          all_user_mentioned_messages.append({
-            'type': 'following_user_in_channel',
-            'channel_id': channel_id,
-            'messages': all_messages_with_thread_messages,
-            'mentioned_user_id': user_id
-          })
-          channels.add(channel_id)
-
-    all_message_sets = all_my_mentioned_messages + all_group_mentioned_messages + channels_following_messages + all_user_mentioned_messages
-    combined_text = self._combine_text_for_parsing(all_message_sets)
-    print(combined_text)
-
-    summary = self.openai_client.summarize_all_mentions_text(combined_text)
-    json_data = json.loads(summary)
-    print(json.dumps(json_data, indent=2))
+  def _split_conversations(self, message_set) -> list:
+    """
+    Every conversation of a message set: each thread, and each run of messages outside threads.
 
-    title = f":newspaper: Your Daily Ketchup Summary for {datetime.now().strftime('%B %d, %Y')} :newspaper:"
-    summary_in_slack_blocks = self._create_slack_blocks(json_data)
-    print(json.dumps(summary_in_slack_blocks, indent=2))
+    Returns (channel_id, thread_ts, messages, text) tuples, with thread_ts None
+    outside threads. The text does not depend on who the digest is for, so the
+    same thread in the digests of different users has the same cache key. Joins,
+    emoji-only and empty messages are left out before that, except for thread roots.
+    """
+    conversations = []
+    current_thread_ts = None
+    for message in message_set['messages']:
+      message = MessageRecord.from_message(message)
+      if message.thread_ts != message.ts and is_low_signal(message):
+        continue
+      if not conversations or message.thread_ts != current_thread_ts:
+        conversations.append([])
+        current_thread_ts = message.thread_ts
+      conversations[-1].append(message)
+    return [
+      (message_set['channel_id'], conversation[0].thread_ts, conversation, "\n".join(self._format_messages(conversation)))
+      for conversation in conversations
+    ]
+
+  def _summarize_threads(self, conversations) -> dict:
+    """
+    Rolling summaries of the threads among `conversations`, keyed by (channel_id, thread_ts).
+
+    A thread whose stored summary covers its newest reply costs no tokens. A thread
+    that gained replies sends only the previous summary and the new replies, and gets
+    a summary of the new replies with the earlier ones condensed to an "Earlier:" part,
+    so a long-running thread neither grows its summary nor repeats old topics. Threads
+    without a stored summary are summarized in full once they reach
+    `CONVERSATION_SUMMARY_MIN_TOKENS`; shorter ones are left out and go verbatim.
+    """
+    if self.thread_summaries is None or not conversations:
+      return {}
+    model = self.openai_client.chat_model
+    # of several copies of a thread, the most complete one is summarized
+    threads = {}
+    for channel_id, thread_ts, messages, text in conversations:
+      target = (channel_id, thread_ts)
+      if target not in threads or len(messages) > len(threads[target][0]):
+        threads[target] = (messages, text)
+    stored = self.thread_summaries.get_many(threads.keys(), CONVERSATION_PROMPT_VERSION, model)
+
+    summaries = {}
+    # (target, text, last_reply_ts, previous_summary or None, text to summarize)
+    jobs = []
+    for target, (messages, text) in threads.items():
+      last_reply_ts = max((message.ts for message in messages), key=float)
+      state = stored.get(target)
+      if state is not None and float(state.last_reply_ts) >= float(last_reply_ts):
+        summaries[target] = state.summary
+      elif state is not None:
+        new_messages = [message for message in messages if float(message.ts) > float(state.last_reply_ts)]
+        jobs.append((target, text, last_reply_ts, state.summary, "\n".join(self._format_messages(new_messages))))
+      elif self.openai_client.estimate_openai_chat_token_count(text) >= CONVERSATION_SUMMARY_MIN_TOKENS:
+        jobs.append((target, text, last_reply_ts, None, text))
+
+    def run(job):
+      _, _, _, previous_summary, job_text = job
+      if previous_summary is None:
+        return self.openai_client.summarize_conversation_text(job_text)
+      if not job_text:
+        # only bot or empty messages were added
+        return previous_summary
+      return self.openai_client.update_conversation_summary(previous_summary, job_text)
+
+    results = self.openai_client.map_concurrently(run, jobs) if jobs else []
+    for (target, _, _, _, _), summary in zip(jobs, results):
+      summaries[target] = summary
+    self.thread_summaries.put_many(
+      {target: (summary, last_reply_ts) for (target, _, last_reply_ts, _, _), summary in zip(jobs, results)},
+      CONVERSATION_PROMPT_VERSION,
+      model,
+    )
+    updated = sum(1 for job in jobs if job[3] is not None)
+    print(f"Thread summaries: {len(summaries) - len(jobs)} unchanged, {updated} updated, {len(jobs) - updated} new")
+    return summaries
+
+  def _summarize_long_conversations(self, texts) -> dict:
+    """
+    Summaries of the conversations over `CONVERSATION_SUMMARY_MIN_TOKENS`, keyed by their text.
 
-    user_id = self.slack_client.my_user_info['id']  # Replace with the actual user ID
-    self.slack_client.send_dm(user_id, title, summary_in_slack_blocks)
-
-  def _combine_text_for_parsing(self, message_sets):
-    text = ""
-    for message_set in message_sets:
-        if message_set['type'] == 'following_user_in_thread':
-            text += f"# start of a direct message thread_ts: {message_set['thread_ts']}, channel_id: {message_set['channel_id']}. I am following the user '{message_set['mentioned_user_id']}':\n"
-            text += "\n".join(self._format_messages(message_set['messages']))
-            text += "\n\n"
-        elif message_set['type'] == 'following_user_in_channel':
-            text += f"# start of a public or public channel channel_id: {message_set['channel_id']}."
-            text += f"I am following the user '{message_set['mentioned_user_id']}':\n"
-            text += "\n".join(self._format_messages(message_set['messages']))
-            text += "\n\n"
-        elif message_set['type'] == 'direct_message':
-            text += f"# start of a direct message channel_id: {message_set['channel_id']}. I am in this message into this as '{message_set['mentioned_user_id']}':\n"
-            text += "\n".join(self._format_messages(message_set['messages']))
-            text += "\n\n"
-        elif message_set['type'] == 'direct_message_thread':
-            text += f"# start of a direct message thread_ts: {message_set['thread_ts']}, channel_id: {message_set['channel_id']}. I am tagged into this as '{message_set['mentioned_user_id']}':\n"
-            text += "\n".join(self._format_messages(message_set['messages']))
-            text += "\n\n"
-        elif message_set['type'] == 'thread':
-            text += f"# start of a public or public channel thread thread_ts: {message_set['thread_ts']}, channel_id: {message_set['channel_id']}. I am tagged into this as {message_set['mentioned_user_id']}':\n"
-            text += "\n".join(self._format_messages(message_set['messages']))
-            text += "\n\n"
-        else:
-            text += f"# start of a public or public channel channel_id: {message_set['channel_id']}."
-            text += f"I am tagged into this as '{message_set['mentioned_user_id']}':\n" if 'mentioned_user_id' in message_set else "\n"
-            text += "\n".join(self._format_messages(message_set['messages']))
-            text += "\n\n"
-    return text
-
-
-  def _replace_user_id_with_mentions(self, body_text: str) -> str:
-    """ Replace user IDs in a chat message text with user names.
-
-    Args:
-        body_text (str): The text of a chat message.
-        users (list): A list of user information dictionaries.
-            Each dictionary must have 'id' and 'name' keys.
-
-    Returns:
-        str: The text of the chat message with user IDs replaced with user names.
-
-    Examples:
-        >>> users = [{'id': 'U1234', 'name': 'Alice'}, {'id': 'U5678', 'name': 'Bob'}]
-        >>> body_text = "Hi <@U1234>, how are you?"
-        >>> replace_user_id_with_name(body_text, users)
-        "Hi @Alice, how are you?"
+    Summaries come from the shared summary cache; only the missing ones are sent
+    to OpenAI, concurrently, and stored for the next digest that contains them.
     """
-    pattern = r"(U[A-Z0-9]+)"
-    for match in re.finditer(pattern, body_text):
-        user_id = match.group(1)
-        body_text = body_text.replace(match.group(0), f"<@{user_id}>")
-    return body_text
-
-  def _add_priority_emoji(self, priority_text):
-    if priority_text == 'Low':
-      return ':large_green_circle: Low'
-    elif priority_text == 'Medium':
-      return ':large_yellow_circle: Medium'
-    elif priority_text == 'High':
-      return ':red_circle: High'
-    else:
-      return ''
+    if self.summary_cache is None:
+      return {}
+    long_texts = {text for text in texts if self.openai_client.estimate_openai_chat_token_count(text) >= CONVERSATION_SUMMARY_MIN_TOKENS}
+    if not long_texts:
+      return {}
+
+    model = self.openai_client.chat_model
+    keys = {text: summary_cache_key(text, CONVERSATION_PROMPT_VERSION, model) for text in long_texts}
+    cached = self.summary_cache.get_many(keys.values())
+    missing = [text for text in long_texts if keys[text] not in cached]
+    fresh = dict(zip(missing, self.openai_client.map_concurrently(self.openai_client.summarize_conversation_text, missing))) if missing else {}
+    self.summary_cache.put_many({keys[text]: summary for text, summary in fresh.items()}, CONVERSATION_PROMPT_VERSION, model)
+    print(f"Conversation summaries: {len(long_texts) - len(missing)} from cache, {len(missing)} new")
+    return {text: cached.get(keys[text]) or fresh[text] for text in long_texts}
 
   def _format_messages(self, messages):
     """
     Format thread messages to be easily parsed into LLM
+
+    `messages` can be any iterable of Slack message dicts or `MessageRecord`s.
+    Yields one line per message that is not from a bot and not empty.
     """
-    messages_text = []
-    for message in messages[::]:
+    for message in messages:
+        message = MessageRecord.from_message(message)
         # Ignore bot messages and empty messages
-        if "bot_id" in message or len(message["text"].strip()) == 0:
+        if message.bot_id is not None or len(message.text.strip()) == 0:
             continue
 
-        # Get message body from result dict.
-        body_text = message["text"].replace("\n", "\\n")
+        # Get message body from the record.
+        body_text = message.text.replace("\n", "\\n")
 
         # messages_text.append(f"{speaker_name}: {body_text}")
-        messages_text.append(f"{message['user']}: {body_text}")
-
-    if len(messages_text) == 0:
-        return []
-    else:
-        return messages_text
-
-  def _create_slack_blocks(self, json_data):
-    blocks = []
-
-    # Create initial
-    blocks.append({
-			"type": "header",
-			"text": {
-				"type": "plain_text",
-				"text": ":newspaper:  Your Daily Ketchup Summary :newspaper:"
-			}
-		})
-
-    blocks.append({
-			"type": "context",
-			"elements": [
-				{
-					"text": f"*{datetime.now().strftime('%B %d, %Y')}* | What happened yesterday",
-					"type": "mrkdwn"
-				}
-			]
-		})
-
-    blocks.append({"type": "divider"})
-
-    # Add follow-up topics header
-    blocks.append({
-      "type": "header",
-      "text": {
-          "type": "plain_text",
-          "text": ":dart: Actionables"
-      }
-    })
-
-    for idx, topic in enumerate(json_data["actionables"]):
-      action_items_text = 'None'
-      if 'action_items' in topic and len(topic['action_items']) > 0:
-          action_items_text = "\n".join([f"• {self._replace_user_id_with_mentions(action_item)}" for action_item in topic['action_items']])
-
-      links_text = f"• <{topic['link_to_slack_message']}|Original message>\n"
-      if 'links' in topic and len(topic['links']) > 0:
-        links_text += "\n".join([f"• <{link['url']}|{link['link_summary']}>" for link in topic['links']])
-
-      blocks.append(
-        {
-          "type": "section",
-          "text": {
-              "type": "mrkdwn",
-              "text": f"*{idx+1}. {topic['title']}*",
-          },
-          "fields": [
-            {
-              "type": "mrkdwn",
-              "text": f"*Priority*\n{self._add_priority_emoji(topic['priority'])}"
-            },
-            {
-              "type": "mrkdwn",
-              "text": f"*Current Status*\n{self._replace_user_id_with_mentions(topic['current_status'])}"
-            },
-            {
-              "type": "mrkdwn",
-              "text": f"*Summary*\n{self._replace_user_id_with_mentions(topic['summary'])}"
-            },
-            {
-              "type": "mrkdwn",
-              "text": f"*Action Items*\n{action_items_text}"
-            },
-            {
-              "type": "mrkdwn",
-              "text": f"*Links*\n{links_text}"
-            },
-            {
-              "type": "mrkdwn",
-              "text": f"*Source*\n<#{topic['channel_id']}>"
-            }
-          ],
-        }
-      )
-      blocks.append({"type": "divider"})
-
-    # Add interesting topics header
-    blocks.append({
-        "type": "header",
-        "text": {
-            "type": "plain_text",
-            "text": ":bee: To catch up on"
-        }
-    })
-
-    for idx, topic in enumerate(json_data["to_catch_up_on"]):
-      action_items_text = 'None'
-      if 'action_items' in topic and len(topic['action_items']) > 0:
-        action_items_text = "\n".join([f"• {self._replace_user_id_with_mentions(action_item)}" for action_item in topic['action_items']])
-
-      links_text = f"• <{topic['link_to_slack_message']}|Original message>\n"
-      if 'links' in topic and len(topic['links']) > 0:
-        links_text += "\n".join([f"• <{link['url']}|{link['link_summary']}>" for link in topic['links']])
-
-      blocks.append({
-          "type": "section",
-          "text": {
-              "type": "mrkdwn",
-              "text": f"*{idx+1}. {topic['title']}*",
-          },
-          "fields": [
-            {
-            "type": "mrkdwn",
-            "text": f"*Priority*\n{self._add_priority_emoji(topic['priority'])}"
-            },
-            {
-              "type": "mrkdwn",
-              "text": f"*Current Status*\n{self._replace_user_id_with_mentions(topic['current_status'])}"
-            },
-            {
-              "type": "mrkdwn",
-              "text": f"*Summary*\n{self._replace_user_id_with_mentions(topic['summary'])}"
-            },
-            {
-              "type": "mrkdwn",
-              "text": f"*Action Items*\n{action_items_text}"
-            },
-            {
-              "type": "mrkdwn",
-              "text": f"*Links*\n{links_text}"
-            },
-            {
-              "type": "mrkdwn",
-              "text": f"*Source*\n<#{topic['channel_id']}>"
-            }
-          ],
-      })
-      blocks.append({"type": "divider"})
-    print(blocks)
-
-    return blocks
\ No newline at end of file
+        yield f"{message.user}: {body_text}"
@@ -0,0 +1,79 @@
+import hashlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import select
+
+from backend.app.models.llm_summary_cache import LLMSummaryCacheEntry
+
+SUMMARY_CACHE_TTL = timedelta(days=3)
+SUMMARY_CACHE_MAX_ENTRIES = 200000
+
+
+def summary_cache_key(text: str, prompt_version: str, model: str) -> str:
+  return hashlib.sha256(f"{prompt_version}\0{model}\0{text}".encode()).hexdigest()
+
+
+class SummaryCache:
+  """
+  Content-addressed Postgres cache of per-conversation LLM summaries.
+
+  Entries are keyed by the hash of the conversation text, the prompt version and
+  the model, so every user whose digest contains the same thread reuses the same
+  summary, and a changed prompt or model never serves a stale one. Entries expire
+  after `ttl` and the least recently used are evicted beyond `max_entries`.
+  """
+
+  def __init__(self, db, ttl=SUMMARY_CACHE_TTL, max_entries=SUMMARY_CACHE_MAX_ENTRIES):
+    self.db = db
+    self.ttl = ttl
+    self.max_entries = max_entries
+
+  def get_many(self, keys) -> dict:
+    keys = list(set(keys))
+    if not keys:
+      return {}
+    now = datetime.now()
+    entries = self.db.scalars(select(LLMSummaryCacheEntry).where(
+      LLMSummaryCacheEntry.key.in_(keys),
+      LLMSummaryCacheEntry.created_at >= now - self.ttl,
+    )).all()
+    summaries = {entry.key: entry.summary for entry in entries}
+    if summaries:
+      self.db.execute(
+        update(LLMSummaryCacheEntry).where(LLMSummaryCacheEntry.key.in_(list(summaries))).values(
+          last_used_at=now,
+          hits=LLMSummaryCacheEntry.hits + 1,
+        )
+      )
+      self.db.commit()
+    return summaries
+
+  def put_many(self, summaries: dict, prompt_version: str, model: str):
+    """
+    Store {key: summary} pairs, then evict expired and least recently used entries.
+    """
+    if not summaries:
+      return
+    now = datetime.now()
+    statement = insert(LLMSummaryCacheEntry)
+    statement = statement.on_conflict_do_update(
+      index_elements=['key'],
+      set_={column: statement.excluded[column] for column in ('summary', 'created_at', 'last_used_at')},
+    )
+    self.db.execute(statement, [
+      {'key': key, 'model': model, 'prompt_version': prompt_version, 'summary': summary, 'created_at': now, 'last_used_at': now, 'hits': 0}
+      for key, summary in summaries.items()
+    ])
+    self.evict(now)
+    self.db.commit()
+
+  def evict(self, now: datetime = None):
+    now = now or datetime.now()
+    self.db.execute(delete(LLMSummaryCacheEntry).where(LLMSummaryCacheEntry.created_at < now - self.ttl))
+    # last_used_at of the newest entry that no longer fits
+    cutoff = select(LLMSummaryCacheEntry.last_used_at).order_by(
+      LLMSummaryCacheEntry.last_used_at.desc()
+    ).offset(self.max_entries).limit(1).scalar_subquery()
+    self.db.execute(delete(LLMSummaryCacheEntry).where(LLMSummaryCacheEntry.last_used_at <= cutoff))
@@ -0,0 +1,110 @@
+from backend.app.summarizer.message_mirror import ChannelHistoryMirror
+from backend.app.summarizer.records import to_records
+
+
+class TeamChannelHistory:
+  """
+  Channel history of one team, fetched once for every user summarized in a batch.
+
+  Followed channels overlap heavily between the users of a team. `prefetch` takes
+  the union of their channels and fetches each one, with the threads started in
+  it, once through the mirror with the token of a user who follows it. The
+  results are kept as tuples of `MessageRecord`s and handed to every user's
+  summarizer unchanged, so history calls grow with channels instead of
+  channels x users. A channel is only fetched with, and served to, users who
+  are members of it.
+  """
+
+  def __init__(self, db, team_id: str):
+    self.db = db
+    self.team_id = team_id
+    self.oldest_timestamp = None
+    # channel_id -> tuple of records
+    self.channel_messages = {}
+    # (channel_id, thread_ts) -> tuple of records
+    self.thread_messages = {}
+
+  def prefetch(self, followed_channels: dict, oldest_timestamp):
+    """
+    Fetch the union of `followed_channels`, {user_id: (slack_client, channel_ids)}.
+    """
+    self.oldest_timestamp = oldest_timestamp
+    # every channel is fetched with the client of its first follower who is a member
+    channels_by_user = {}
+    for user_id, (slack_client, channel_ids) in followed_channels.items():
+      member_channel_ids = slack_client.fetch_member_channel_ids()
+      for channel_id in channel_ids:
+        if channel_id in member_channel_ids and channel_id not in self.channel_messages:
+          self.channel_messages[channel_id] = ()
+          channels_by_user.setdefault(user_id, (slack_client, []))[1].append(channel_id)
+
+    for slack_client, channel_ids in channels_by_user.values():
+      mirror = ChannelHistoryMirror(self.db, self.team_id, slack_client)
+      channel_messages = mirror.fetch_many_recent_messages(channel_ids, oldest_timestamp)
+      thread_targets = [
+        (channel_id, message['thread_ts'])
+        for channel_id, messages in channel_messages.items() for message in messages if message.get('thread_ts')
+      ]
+      for channel_id, messages in channel_messages.items():
+        self.channel_messages[channel_id] = tuple(to_records(messages))
+      for target, messages in mirror.fetch_many_thread_messages(thread_targets).items():
+        self.thread_messages[target] = tuple(to_records(messages))
+
+    requested = sum(len(channel_ids) for _, channel_ids in followed_channels.values())
+    print(f"Team batch fetched {len(self.channel_messages)} channels and {len(self.thread_messages)} threads once for {len(followed_channels)} users ({requested} followed channels)")
+
+  def source_for(self, message_source, member_channel_ids) -> 'SharedMessageSource':
+    return SharedMessageSource(self, message_source, member_channel_ids)
+
+
+class SharedMessageSource:
+  """
+  Message source of one user in a team batch.
+
+  Channels and threads prefetched by the `TeamChannelHistory` are served from it
+  when the user is a member of the channel; everything else, such as the user's DMs
+  and mention threads, goes to the user's own message source.
+  """
+
+  def __init__(self, history: TeamChannelHistory, message_source, member_channel_ids):
+    self.history = history
+    self.message_source = message_source
+    self.member_channel_ids = member_channel_ids
+
+  def _is_shared(self, oldest_timestamp) -> bool:
+    return self.history.oldest_timestamp is not None and float(oldest_timestamp) == float(self.history.oldest_timestamp)
+
+  def _has_channel(self, channel_id) -> bool:
+    return channel_id in self.member_channel_ids and channel_id in self.history.channel_messages
+
+  def probe_channel_activity(self, channel_ids, oldest_timestamp) -> dict:
+    if self._is_shared(oldest_timestamp):
+      channel_ids = [channel_id for channel_id in channel_ids if not self._has_channel(channel_id)]
+    return self.message_source.probe_channel_activity(channel_ids, oldest_timestamp) if channel_ids else {}
+
+  def fetch_recent_messages(self, channel_id, oldest_timestamp):
+    return self.fetch_many_recent_messages([channel_id], oldest_timestamp)[channel_id]
+
+  def fetch_many_recent_messages(self, channel_ids, oldest_timestamp) -> dict:
+    channel_messages = {}
+    if self._is_shared(oldest_timestamp):
+      channel_messages = {
+        channel_id: self.history.channel_messages[channel_id] for channel_id in channel_ids if self._has_channel(channel_id)
+      }
+    missing = [channel_id for channel_id in channel_ids if channel_id not in channel_messages]
+    if missing:
+      channel_messages.update(self.message_source.fetch_many_recent_messages(missing, oldest_timestamp))
+    return channel_messages
+
+  def fetch_thread_messages(self, channel_id, thread_ts):
+    return self.fetch_many_thread_messages([(channel_id, thread_ts)])[(channel_id, thread_ts)]
+
+  def fetch_many_thread_messages(self, targets) -> dict:
+    thread_messages = {
+      target: self.history.thread_messages[target]
+      for target in targets if target[0] in self.member_channel_ids and target in self.history.thread_messages
+    }
+    missing = [target for target in targets if target not in thread_messages]
+    if missing:
+      thread_messages.update(self.message_source.fetch_many_thread_messages(missing))
+    return thread_messages
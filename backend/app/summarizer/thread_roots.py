@@ -0,0 +1,68 @@
+import threading
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlparse
+
+THREAD_ROOT_CACHE_SIZE = 100000
+
+
+def thread_ts_from_message(message: dict):
+  """
+  Derive the thread root of a message without calling Slack, if the message tells us.
+
+  Replies carry `thread_ts`, and the permalink of a search match points at the thread
+  with a `thread_ts` query parameter. Returns None when the message alone is not enough.
+  """
+  if message.get('thread_ts'):
+    return message['thread_ts']
+
+  permalink = message.get('permalink')
+  if permalink:
+    thread_ts = parse_qs(urlparse(permalink).query).get('thread_ts')
+    if thread_ts:
+      return thread_ts[0]
+
+  return None
+
+
+class ThreadRootCache:
+  """
+  Bounded LRU of (channel_id, ts) -> thread_ts shared across summary runs.
+
+  Only positive results are stored: a message that is not in a thread today can
+  become a thread root tomorrow, but a reply never moves to another thread.
+  """
+
+  def __init__(self, max_size=THREAD_ROOT_CACHE_SIZE):
+    self.max_size = max_size
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+
+  def get(self, channel_id: str, ts: str):
+    key = (channel_id, ts)
+    with self._lock:
+      thread_ts = self._entries.get(key)
+      if thread_ts is not None:
+        self._entries.move_to_end(key)
+      return thread_ts
+
+  def put(self, channel_id: str, ts: str, thread_ts: str):
+    if thread_ts is None:
+      return
+    key = (channel_id, ts)
+    with self._lock:
+      self._entries[key] = thread_ts
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_size:
+        self._entries.popitem(last=False)
+
+  def remember_thread(self, channel_id: str, messages: list):
+    """
+    Every message of a fetched thread resolves to the same root.
+    """
+    for message in messages:
+      if message.get('thread_ts'):
+        self.put(channel_id, message['ts'], message['thread_ts'])
+
+
+# process-wide cache shared by every summary run
+thread_root_cache = ThreadRootCache()
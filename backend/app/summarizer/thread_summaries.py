@@ -0,0 +1,60 @@
+from datetime import datetime
+
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import select
+
+from backend.app.models.thread_summary import SlackThreadSummary
+
+
+class ThreadSummaryStore:
+  """
+  Rolling summaries of Slack threads, one per (channel_id, thread_ts) of a team.
+
+  Each summary remembers the newest reply it covers, so a thread that gained a
+  few replies is summarized again from its previous summary and those replies
+  only. Summaries made with another model or prompt version are ignored.
+  """
+
+  def __init__(self, db, team_id: str):
+    self.db = db
+    self.team_id = team_id
+
+  def get_many(self, targets, prompt_version: str, model: str) -> dict:
+    targets = list(dict.fromkeys(targets))
+    if not targets:
+      return {}
+    summaries = self.db.scalars(select(SlackThreadSummary).where(
+      SlackThreadSummary.team_id == self.team_id,
+      tuple_(SlackThreadSummary.channel_id, SlackThreadSummary.thread_ts).in_(targets),
+      SlackThreadSummary.prompt_version == prompt_version,
+      SlackThreadSummary.model == model,
+    ))
+    return {(summary.channel_id, summary.thread_ts): summary for summary in summaries}
+
+  def put_many(self, summaries: dict, prompt_version: str, model: str):
+    """
+    Store {(channel_id, thread_ts): (summary, last_reply_ts)}.
+    """
+    if not summaries:
+      return
+    now = datetime.now()
+    statement = insert(SlackThreadSummary)
+    statement = statement.on_conflict_do_update(
+      index_elements=['team_id', 'channel_id', 'thread_ts'],
+      set_={column: statement.excluded[column] for column in ('summary', 'last_reply_ts', 'model', 'prompt_version', 'updated_at')},
+    )
+    self.db.execute(statement, [
+      {
+        'team_id': self.team_id,
+        'channel_id': channel_id,
+        'thread_ts': thread_ts,
+        'summary': summary,
+        'last_reply_ts': last_reply_ts,
+        'model': model,
+        'prompt_version': prompt_version,
+        'updated_at': now,
+      }
+      for (channel_id, thread_ts), (summary, last_reply_ts) in summaries.items()
+    ])
+    self.db.commit()
@@ -0,0 +1,90 @@
+"""
+Time rendering a digest into Block Kit JSON, and the user id substitution it runs on every field.
+
+Run with `python -m backend.benchmarks.block_rendering [topic_count] [--repeat 200]`. The digest
+is split evenly between actionables and topics to catch up on.
+"""
+import argparse
+import random
+import re
+import time
+from datetime import datetime
+
+from backend.app.rendering.digest import mention_user_ids, render_digest, render_digest_json
+from backend.app.rendering.views import home_view_json
+
+USER_COUNT = 40
+
+
+def legacy_replace_user_id_with_mentions(body_text: str) -> str:
+  """
+  The substitution the summarizer used before: one `str.replace` over the whole text per match.
+  """
+  for match in re.finditer(r"(U[A-Z0-9]+)", body_text):
+    body_text = body_text.replace(match.group(0), f"<@{match.group(1)}>")
+  return body_text
+
+
+def fake_topic(index: int, users: list) -> dict:
+  def sentence(words: int) -> str:
+    return " ".join(random.choice(users) if random.random() < 0.15 else random.choice(["deploy", "review", "the", "PR", "is", "blocked", "on", "today"]) for _ in range(words))
+
+  return {
+    'title': f"Topic {index}: {sentence(6)}",
+    'channel_id': f"C{index:010d}",
+    'summary': sentence(120),
+    'current_status': sentence(30),
+    'action_items': [sentence(15) for _ in range(4)],
+    'priority': random.choice(['Low', 'Medium', 'High']),
+    'links': [{'link_summary': 'Design doc', 'url': f"https://example.com/doc/{index}"}],
+    'link_to_slack_message': f"https://example.slack.com/archives/C{index:010d}/p1721106882879439",
+  }
+
+
+def fake_digest(topic_count: int) -> dict:
+  random.seed(7)
+  users = [f"U{index:010d}" for index in range(USER_COUNT)]
+  topics = [fake_topic(index, users) for index in range(topic_count)]
+  return {'actionables': topics[:topic_count // 2], 'to_catch_up_on': topics[topic_count // 2:]}
+
+
+def timed(function, repeat: int) -> float:
+  started = time.perf_counter()
+  for _ in range(repeat):
+    function()
+  return (time.perf_counter() - started) / repeat
+
+
+def run(args):
+  digest = fake_digest(args.topics)
+  texts = [topic['summary'] for topics in digest.values() for topic in topics]
+  now = datetime.now()
+  blocks = render_digest(digest, now)
+  blocks_json = render_digest_json(blocks)
+
+  legacy = timed(lambda: [legacy_replace_user_id_with_mentions(text) for text in texts], args.repeat)
+  compiled = timed(lambda: [mention_user_ids(text) for text in texts], args.repeat)
+  render = timed(lambda: render_digest_json(render_digest(digest, now)), args.repeat)
+
+  class StoredSummary:
+    title = "Your Daily Ketchup Summary"
+    created_at = now
+
+  StoredSummary.blocks = blocks
+  home = timed(lambda: home_view_json(StoredSummary), args.repeat)
+  print(f"topics:                    {args.topics} ({len(blocks)} blocks, {len(blocks_json)} bytes)")
+  print(f"user ids, legacy:          {legacy * 1000:8.3f} ms per digest")
+  print(f"user ids, compiled regex:  {compiled * 1000:8.3f} ms per digest")
+  print(f"render and serialize:      {render * 1000:8.3f} ms per digest")
+  print(f"home tab with the digest:  {home * 1000:8.3f} ms per view")
+
+
+def parse_args():
+  parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+  parser.add_argument('topics', type=int, nargs='?', default=50)
+  parser.add_argument('--repeat', type=int, default=200)
+  return parser.parse_args()
+
+
+if __name__ == "__main__":
+  run(parse_args())
@@ -0,0 +1,76 @@
+"""
+Memory held by the messages of one summary run: raw Slack dicts vs. MessageRecords.
+
+Run with `python -m backend.benchmarks.message_records [message_count]`.
+"""
+import gc
+import random
+import sys
+import tracemalloc
+
+from backend.app.summarizer.records import to_records
+
+USER_COUNT = 200
+
+
+def fake_slack_message(index: int, users: list) -> dict:
+  """
+  A conversations.history message shaped like the ones Slack returns, with blocks and reactions.
+  """
+  # ids come from JSON parsing, so every message holds its own copy of the strings
+  users = [''.join(user) for user in users[:4]] + [''.join(users[index % len(users)])]
+  user = users[-1]
+  ts = f"{1721106882 + index}.{index % 1000000:06d}"
+  text = " ".join(random.choice(["deploy", "review", "the", "PR", "is", "ready", "<@U01L15W16EP>", "today"]) for _ in range(25))
+  message = {
+    'type': 'message',
+    'user': user,
+    'text': text,
+    'ts': ts,
+    'client_msg_id': f"{index:08x}-1f2e-4d3c-8b7a-{index:012x}",
+    'team': 'T0123456789',
+    'blocks': [{
+      'type': 'rich_text',
+      'block_id': f"b{index}",
+      'elements': [{'type': 'rich_text_section', 'elements': [{'type': 'text', 'text': word} for word in text.split()]}],
+    }],
+    'reactions': [{'name': 'eyes', 'users': users[:3], 'count': 3}],
+  }
+  if index % 5 == 0:
+    message['thread_ts'] = ts
+    message['reply_count'] = 4
+    message['reply_users'] = users[:4]
+    message['latest_reply'] = ts
+  if index % 7 == 0:
+    message['attachments'] = [{'fallback': 'link preview', 'title': 'Design doc', 'title_link': 'https://example.com/doc', 'text': text}]
+  if index % 11 == 0:
+    message['files'] = [{'id': f"F{index}", 'name': 'screenshot.png', 'mimetype': 'image/png', 'size': 120000}]
+  return message
+
+
+def measure(message_count: int):
+  random.seed(7)
+  users = [f"U{index:010d}" for index in range(USER_COUNT)]
+
+  gc.collect()
+  tracemalloc.start()
+  messages = [fake_slack_message(index, users) for index in range(message_count)]
+  gc.collect()
+  raw_bytes = tracemalloc.get_traced_memory()[0]
+
+  records = to_records(messages)
+  del messages
+  gc.collect()
+  record_bytes = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+
+  return raw_bytes, record_bytes, len(records)
+
+
+if __name__ == "__main__":
+  message_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+  raw_bytes, record_bytes, count = measure(message_count)
+  print(f"messages:        {count}")
+  print(f"raw Slack dicts: {raw_bytes / 1024 / 1024:8.2f} MiB ({raw_bytes / count:7.0f} B/message)")
+  print(f"MessageRecords:  {record_bytes / 1024 / 1024:8.2f} MiB ({record_bytes / count:7.0f} B/message)")
+  print(f"reduction:       {100 * (1 - record_bytes / raw_bytes):8.1f} %")
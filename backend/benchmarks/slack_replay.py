@@ -0,0 +1,163 @@
+"""
+Local stand-in for the Slack Web API that replays a recording made with `SLACK_RECORD_PATH`.
+
+Run with `python -m backend.benchmarks.slack_replay recording.jsonl [--port 8765] [--latency 0.05] [--rate-limit-every 20]`
+and point `SlackClient(..., base_url="http://127.0.0.1:8765/api/")` or `SLACK_API_BASE_URL` at it.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import threading
+from collections import Counter
+
+from aiohttp import web
+
+from backend.app.summarizer.slack_recorder import normalize_params
+
+# parameters derived from the current time, ignored when no exact match was recorded
+TIME_PARAMS = ('oldest', 'latest')
+# date modifiers of search queries such as `after:2024-07-16`
+SEARCH_DATE_PATTERN = re.compile(r'\s*\b(after|before|on|during):\S+')
+
+
+def untimed_params(params: dict) -> dict:
+  untimed = {name: value for name, value in params.items() if name not in TIME_PARAMS}
+  if 'query' in untimed:
+    untimed['query'] = SEARCH_DATE_PATTERN.sub('', untimed['query'])
+  return untimed
+
+
+def load_recording(path: str) -> dict:
+  """
+  Recorded responses keyed by (method, params), with fallbacks keyed by fewer params.
+  """
+  responses = {}
+  with open(path) as f:
+    for line in f:
+      if not line.strip():
+        continue
+      entry = json.loads(line)
+      method, params = entry['method'], entry['params']
+      untimed = untimed_params(params)
+      for key in ((method, tuple(sorted(params.items()))), (method, tuple(sorted(untimed.items()))), (method, None)):
+        responses.setdefault(key, entry['response'])
+  return responses
+
+
+class SlackReplayServer:
+  """
+  Serves recorded Slack responses with a fixed latency and optional injected 429s.
+
+  Every `rate_limit_every`-th call is answered with `ratelimited` and a `Retry-After`
+  header, which exercises the retry path of `slack_rate_limiter`. Calls per method are
+  counted in `stats()`.
+  """
+
+  def __init__(self, recording_path: str, latency: float = 0.0, latency_jitter: float = 0.0, rate_limit_every: int = 0, retry_after: int = 1, seed: int = 0):
+    self.responses = load_recording(recording_path)
+    self.latency = latency
+    self.latency_jitter = latency_jitter
+    self.rate_limit_every = rate_limit_every
+    self.retry_after = retry_after
+    self.random = random.Random(seed)
+    self.calls = Counter()
+    self.rate_limited = Counter()
+    self.unmatched = Counter()
+    self.base_url = None
+    self._runner = None
+    self._loop = None
+    self._thread = None
+
+  def find_response(self, method: str, params: dict) -> dict:
+    params = normalize_params(params)
+    untimed = untimed_params(params)
+    for key in ((method, tuple(sorted(params.items()))), (method, tuple(sorted(untimed.items())))):
+      if key in self.responses:
+        return self.responses[key]
+    self.unmatched[method] += 1
+    return self.responses.get((method, None), {'ok': True})
+
+  async def handle(self, request: web.Request) -> web.Response:
+    method = request.match_info['method']
+    params = dict(request.query)
+    if request.content_type == 'application/json':
+      params.update(await request.json())
+    else:
+      params.update(await request.post())
+
+    self.calls[method] += 1
+    if self.latency or self.latency_jitter:
+      await asyncio.sleep(self.latency + self.random.uniform(0, self.latency_jitter))
+
+    if self.rate_limit_every and sum(self.calls.values()) % self.rate_limit_every == 0:
+      self.rate_limited[method] += 1
+      return web.json_response({'ok': False, 'error': 'ratelimited'}, status=429, headers={'Retry-After': str(self.retry_after)})
+
+    return web.json_response(self.find_response(method, params))
+
+  async def handle_stats(self, request: web.Request) -> web.Response:
+    return web.json_response(self.stats())
+
+  async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+    app = web.Application()
+    app.router.add_get('/_stats', self.handle_stats)
+    app.router.add_route('*', '/api/{method}', self.handle)
+    self._runner = web.AppRunner(app, access_log=None)
+    await self._runner.setup()
+    await web.TCPSite(self._runner, host, port).start()
+    host, port = self._runner.addresses[0][:2]
+    self.base_url = f"http://{host}:{port}/api/"
+    return self.base_url
+
+  async def stop(self):
+    await self._runner.cleanup()
+
+  def start_in_thread(self, host: str = '127.0.0.1', port: int = 0) -> str:
+    """
+    Serve from a background event loop, so the benchmarked client keeps its own loop to itself.
+    """
+    self._loop = asyncio.new_event_loop()
+    self._thread = threading.Thread(target=self._loop.run_forever, name="slack-replay", daemon=True)
+    self._thread.start()
+    return asyncio.run_coroutine_threadsafe(self.start(host, port), self._loop).result()
+
+  def stop_thread(self):
+    asyncio.run_coroutine_threadsafe(self.stop(), self._loop).result()
+    self._loop.call_soon_threadsafe(self._loop.stop)
+    self._thread.join()
+    self._loop.close()
+
+  def stats(self) -> dict:
+    return {
+      'calls': sum(self.calls.values()),
+      'calls_per_method': dict(self.calls),
+      'rate_limited': dict(self.rate_limited),
+      'unmatched': dict(self.unmatched),
+    }
+
+
+def parse_args():
+  parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+  parser.add_argument('recording')
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=8765)
+  parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+  parser.add_argument('--latency-jitter', type=float, default=0.0, help="random extra latency of up to this many seconds")
+  parser.add_argument('--rate-limit-every', type=int, default=0, help="answer every n-th call with a 429")
+  parser.add_argument('--retry-after', type=int, default=1)
+  return parser.parse_args()
+
+
+async def serve(args):
+  server = SlackReplayServer(args.recording, args.latency, args.latency_jitter, args.rate_limit_every, args.retry_after)
+  print(f"Replaying {args.recording} at {await server.start(args.host, args.port)}")
+  try:
+    await asyncio.Event().wait()
+  finally:
+    await server.stop()
+
+
+if __name__ == "__main__":
+  asyncio.run(serve(parse_args()))
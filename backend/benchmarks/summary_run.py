@@ -0,0 +1,124 @@
+"""
+Time a full `Summarizer.summarize` run against the Slack replay server, without network access.
+
+Run with `python -m backend.benchmarks.summary_run [recording.jsonl] [--latency 0.05] [--rate-limit-every 20]`.
+Without a recording, a synthetic workspace is generated. The app settings need a `DATABASE_URL`
+to be set, but nothing connects to it: the run only talks to the replay server, and Slack's rate
+limit tiers are lifted so the timings do not depend on the pacing of the real limits.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from backend.app.summarizer.openai import CHAT_MODEL, MAX_BODY_TOKENS, TEMPERATURE, OpenAIClient
+from backend.app.summarizer.slack import SlackClient
+from backend.app.summarizer.slack_rate_limiter import TIER_LIMITS, slack_rate_limiter
+from backend.app.summarizer.slack_transport import slack_transport
+from backend.app.summarizer.summarizer import Summarizer
+from backend.benchmarks.slack_replay import SlackReplayServer
+
+MY_USER_ID = 'U0000000000'
+# the replay server has no rate limit tiers; 429s only come from --rate-limit-every
+REPLAY_REQUESTS_PER_MINUTE = 1_000_000
+
+
+class CannedOpenAIClient(OpenAIClient):
+  """
+  Answers the summary prompt with an empty digest, so only the Slack side is timed.
+  """
+
+  def __init__(self):
+    # no OpenAI client, so no API key is needed
+    self.chat_model = CHAT_MODEL
+    self.max_body_tokens = MAX_BODY_TOKENS
+    self.temperature = TEMPERATURE
+
+  def summarize_all_mentions(self, sections: list[str]):
+    return json.dumps({'actionables': [], 'to_catch_up_on': []})
+
+
+def write_synthetic_recording(path: str, channel_count: int = 20, messages_per_channel: int = 50, replies_per_thread: int = 5):
+  """
+  A recording of a workspace where every channel mentions the benchmark user and every fifth message starts a thread.
+  """
+  now = time.time()
+  users = [{'id': MY_USER_ID, 'name': 'me', 'profile': {'display_name': 'me'}}] + [
+    {'id': f"U{index:010d}", 'name': f"user{index}", 'profile': {'display_name': f"user{index}"}} for index in range(1, 50)
+  ]
+  entries = [
+    ('auth.test', {}, {'ok': True, 'user_id': MY_USER_ID, 'bot_id': 'B0000000000'}),
+    ('users.list', {}, {'ok': True, 'members': users}),
+    ('usergroups.list', {}, {'ok': True, 'usergroups': []}),
+    ('conversations.open', {}, {'ok': True, 'channel': {'id': 'D0000000000'}}),
+    ('chat.postMessage', {}, {'ok': True}),
+  ]
+
+  matches = []
+  for channel_index in range(channel_count):
+    channel_id = f"C{channel_index:010d}"
+    history = []
+    for message_index in range(messages_per_channel):
+      ts = f"{now - 60 * (message_index + 1):.6f}"
+      message = {'type': 'message', 'user': users[1 + message_index % 49]['id'], 'text': f"update {message_index} for <@{MY_USER_ID}>", 'ts': ts}
+      if message_index % 5 == 0:
+        replies = [
+          {'type': 'message', 'user': users[1 + reply_index]['id'], 'text': f"reply {reply_index}", 'ts': f"{float(ts) + reply_index + 1:.6f}", 'thread_ts': ts}
+          for reply_index in range(replies_per_thread)
+        ]
+        message.update(thread_ts=ts, reply_count=replies_per_thread, latest_reply=replies[-1]['ts'])
+      else:
+        replies = []
+      entries.append(('conversations.replies', {'channel': channel_id, 'ts': ts}, {'ok': True, 'messages': [dict(message)] + replies}))
+      history.append(message)
+    entries.append(('conversations.history', {'channel': channel_id}, {'ok': True, 'messages': history}))
+    matches.extend(dict(message, channel={'id': channel_id}, permalink=f"https://example.slack.com/archives/{channel_id}/p{message['ts'].replace('.', '')}") for message in history[:5])
+
+  entries.append(('search.messages', {'query': f"<@{MY_USER_ID}>", 'page': '1'}, {'ok': True, 'messages': {'matches': matches, 'paging': {'pages': 1}}}))
+  entries.append(('search.messages', {'query': 'is:dm', 'page': '1'}, {'ok': True, 'messages': {'matches': [], 'paging': {'pages': 1}}}))
+
+  with open(path, 'w') as f:
+    for method, params, response in entries:
+      f.write(json.dumps({'method': method, 'params': params, 'response': response}) + '\n')
+
+
+def parse_args():
+  parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+  parser.add_argument('recording', nargs='?', help="recording made with SLACK_RECORD_PATH; synthetic when omitted")
+  parser.add_argument('--latency', type=float, default=0.05, help="seconds added to every Slack response")
+  parser.add_argument('--rate-limit-every', type=int, default=0, help="answer every n-th call with a 429")
+  parser.add_argument('--channels', type=int, default=20, help="channels in the synthetic workspace")
+  parser.add_argument('--followed-channels', nargs='*', default=[])
+  return parser.parse_args()
+
+
+def run(args):
+  recording = args.recording
+  if recording is None:
+    recording = os.path.join(tempfile.mkdtemp(), 'synthetic.jsonl')
+    write_synthetic_recording(recording, channel_count=args.channels)
+
+  slack_rate_limiter.set_tier_limits({tier: REPLAY_REQUESTS_PER_MINUTE for tier in TIER_LIMITS})
+  server = SlackReplayServer(recording, latency=args.latency, rate_limit_every=args.rate_limit_every)
+  base_url = server.start_in_thread()
+  try:
+    started_at = time.perf_counter()
+    slack_client = SlackClient('xoxb-replay', 'xoxp-replay', base_url=base_url)
+    summarizer = Summarizer(slack_client, CannedOpenAIClient())
+    summarizer.summarize(datetime.now() - timedelta(days=1), args.followed_channels)
+    elapsed = time.perf_counter() - started_at
+    transport_stats = slack_transport.stats()
+  finally:
+    server.stop_thread()
+    slack_transport.close()
+
+  print(f"summary run:       {elapsed:8.2f} s")
+  print(f"Slack API calls:   {json.dumps(server.stats(), indent=2)}")
+  print(f"queue wait:        {json.dumps(slack_rate_limiter.stats(), indent=2)}")
+  print(f"connection reuse:  {transport_stats}")
+
+
+if __name__ == "__main__":
+  run(parse_args())
@@ -0,0 +1,8 @@
+from fastapi import HTTPException, Request
+
+def require_authenticated_session(request: Request):
+  """
+  Dependency for routes that, like the docs, are only open to a session logged in through /login.
+  """
+  if not request.session.get('authenticated'):
+    raise HTTPException(status_code=401, detail="Not authenticated")